@@ -6,6 +6,10 @@ from app.extensions import mail, jwt_manager
 from app.extensions import scheduler
 import logging
 from app.extensions import qrcode
+from app.exceptions import OTSUnavailableError
+from app.metrics import init_metrics, init_scheduler_metrics
+from app.query_profiler import init_query_profiler
+from app.cli import init_cli
 
 def create_app():
     # create and configure the app
@@ -31,7 +35,17 @@ def create_app():
         # if you don't wanna use a config, you can set options here:
         scheduler.api_enabled = True
         scheduler.init_app(app)
+        # Register the scheduled jobs defined in app/jobs.py
+        from app import jobs  # noqa: F401
+        if app.config.get('METRICS_ENABLED', True):
+            init_scheduler_metrics(scheduler)
     jwt_manager.init_app(app)
+    # Prometheus /metrics and request instrumentation
+    init_metrics(app)
+    # Per-request query counts and N+1 detection (development only)
+    init_query_profiler(app)
+    # flask seed ... commands
+    init_cli(app)
 
     # JWT error handlers
     @jwt_manager.invalid_token_loader
@@ -172,6 +186,11 @@ def unprocessable_entity(e):
     app.logger.error(f"422 Error: {str(e)}")
     return jsonify(error=str(e)), 422
 
+@app.errorhandler(OTSUnavailableError)
+def ots_unavailable(e):
+    app.logger.warning(f"Failing fast, OTS unavailable: {str(e)}")
+    return jsonify(error="TAK server is temporarily unavailable. Please try again later.", code="OTS_UNAVAILABLE"), 503, {'Retry-After': str(e.retry_after or 30)}
+
 @app.errorhandler(500)
 def internal_server_error(e):
     app.logger.error(f"500 Error: {str(e)}")
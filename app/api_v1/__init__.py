@@ -9,4 +9,4 @@ from flask import Blueprint
 api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
 
 # Import all route modules to register them
-from app.api_v1 import auth, users, roles, onboarding_codes, tak_profiles, meshtastic, meshtastic_groups, radios, settings, qr, pending_registrations, version, announcements, api_keys, approvals, logo, oidc, kiosk, magic_link, groups
+from app.api_v1 import auth, users, roles, onboarding_codes, tak_profiles, meshtastic, meshtastic_groups, radios, settings, qr, pending_registrations, version, announcements, api_keys, approvals, logo, oidc, kiosk, magic_link, groups, health
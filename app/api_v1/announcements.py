@@ -7,8 +7,13 @@ from flask import request, jsonify, current_app, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.api_v1 import api_v1
 from app.notifications import get_frontend_url_safe
-from app.models import AnnouncementModel, AnnouncementReadModel, UserModel, UserRoleModel, db
+from app.models import (
+    AnnouncementModel, AnnouncementReadModel, UserModel, UserRoleModel, announcement_role_association,
+    announcement_user_association, db, user_role_association
+)
 from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
 
 
 def require_admin_role():
@@ -42,6 +47,44 @@ def _get_total_targeted(announcement):
     return 0
 
 
+def _announcement_counts(announcements):
+    """{announcement id: (read count, total targeted)} for a list of announcements in a constant number of queries"""
+    ids = [a.id for a in announcements]
+    if not ids:
+        return {}
+    reads = dict(db.session.execute(
+        select(AnnouncementReadModel.announcement_id, func.count()).where(
+            AnnouncementReadModel.announcement_id.in_(ids)
+        ).group_by(AnnouncementReadModel.announcement_id)
+    ).all())
+    by_roles = dict(db.session.execute(
+        select(announcement_role_association.c.announcement_id, func.count(func.distinct(user_role_association.c.user_id))).join(
+            user_role_association, user_role_association.c.role_id == announcement_role_association.c.role_id
+        ).where(announcement_role_association.c.announcement_id.in_(ids)).group_by(
+            announcement_role_association.c.announcement_id
+        )
+    ).all())
+    by_users = dict(db.session.execute(
+        select(announcement_user_association.c.announcement_id, func.count()).where(
+            announcement_user_association.c.announcement_id.in_(ids)
+        ).group_by(announcement_user_association.c.announcement_id)
+    ).all())
+    all_users = UserModel.query.count() if any(a.target_type == 'all' for a in announcements) else 0
+
+    counts = {}
+    for a in announcements:
+        if a.target_type == 'all':
+            targeted = all_users
+        elif a.target_type == 'roles':
+            targeted = by_roles.get(a.id, 0)
+        elif a.target_type == 'users':
+            targeted = by_users.get(a.id, 0)
+        else:
+            targeted = 0
+        counts[a.id] = (reads.get(a.id, 0), targeted)
+    return counts
+
+
 def _get_targeted_users(announcement):
     """Get list of users targeted by announcement"""
     if announcement.target_type == 'all':
@@ -101,7 +144,12 @@ def get_all_announcements():
     if error:
         return error
 
-    announcements = AnnouncementModel.get_all()
+    announcements = AnnouncementModel.query.options(
+        joinedload(AnnouncementModel.creator),
+        selectinload(AnnouncementModel.target_roles),
+        selectinload(AnnouncementModel.target_users)
+    ).order_by(AnnouncementModel.created_at.desc()).all()
+    counts = _announcement_counts(announcements)
 
     return jsonify({
         'announcements': [{
@@ -120,8 +168,8 @@ def get_all_announcements():
             } if a.creator else None,
             'targetRoles': [{'id': r.id, 'name': r.name, 'displayName': r.display_name} for r in a.target_roles],
             'targetUsers': [{'id': u.id, 'username': u.username} for u in a.target_users],
-            'readCount': len(a.reads),
-            'totalTargeted': _get_total_targeted(a)
+            'readCount': counts[a.id][0],
+            'totalTargeted': counts[a.id][1]
         } for a in announcements]
     }), 200
 
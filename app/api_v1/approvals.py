@@ -7,23 +7,38 @@ from flask import request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.api_v1 import api_v1
 from app.api_v1.auth import get_frontend_url
-from app.models import PendingRegistrationModel, OnboardingCodeModel, UserModel, UserRoleModel, db
+from app.models import PendingRegistrationModel, OnboardingCodeModel, UserModel, UserRoleModel, user_role_association, db
+from sqlalchemy.orm import contains_eager, joinedload
 from datetime import datetime
 
 
+def _user_role_ids(user_id):
+    """Subquery of the role ids held by a user"""
+    return db.select(user_role_association.c.role_id).where(user_role_association.c.user_id == user_id)
+
+
 def get_user_approver_roles(user):
     """Get list of onboarding codes where user's roles are set as approver roles"""
-    approver_codes = []
-    for role in user.roles:
-        # Find onboarding codes where this role is the approver role
-        codes = OnboardingCodeModel.query.filter_by(
-            approverRoleId=role.id,
-            requireApproval=True
-        ).all()
-        for code in codes:
-            if code not in approver_codes:
-                approver_codes.append(code)
-    return approver_codes
+    return OnboardingCodeModel.query.options(
+        joinedload(OnboardingCodeModel.approverRole)
+    ).filter(
+        OnboardingCodeModel.requireApproval.is_(True),
+        OnboardingCodeModel.approverRoleId.in_(_user_role_ids(user.id))
+    ).order_by(OnboardingCodeModel.id).all()
+
+
+def pending_approvals_query(user_id):
+    """
+    Registrations awaiting approval by any of the user's roles, resolved in
+    one query from the user's roles through the approver codes.
+    """
+    return PendingRegistrationModel.query.join(
+        OnboardingCodeModel, PendingRegistrationModel.onboarding_code_id == OnboardingCodeModel.id
+    ).filter(
+        PendingRegistrationModel.approval_status == 'pending_approval',
+        OnboardingCodeModel.requireApproval.is_(True),
+        OnboardingCodeModel.approverRoleId.in_(_user_role_ids(user_id))
+    )
 
 
 @api_v1.route('/approvals', methods=['GET'])
@@ -48,11 +63,10 @@ def get_my_approvals():
             }), 200
 
         # Get pending registrations for these codes that are pending_approval
-        code_ids = [code.id for code in approver_codes]
-        pending = PendingRegistrationModel.query.filter(
-            PendingRegistrationModel.onboarding_code_id.in_(code_ids),
-            PendingRegistrationModel.approval_status == 'pending_approval'
-        ).all()
+        pending = pending_approvals_query(user.id).options(
+            contains_eager(PendingRegistrationModel.onboarding_code).joinedload(OnboardingCodeModel.approverRole)
+        ).order_by(PendingRegistrationModel.created_at).all()
+        now = datetime.now()
 
         return jsonify({
             'pending_approvals': [{
@@ -74,7 +88,7 @@ def get_my_approvals():
                 } if p.onboarding_code and p.onboarding_code.approverRole else None,
                 'created_at': p.created_at.isoformat() if p.created_at else None,
                 'expires_at': p.expires_at.isoformat() if p.expires_at else None,
-                'is_expired': p.expires_at < datetime.now() if p.expires_at else False
+                'is_expired': p.expires_at < now if p.expires_at else False
             } for p in pending],
             'is_approver': True,
             'approver_for_codes': [{
@@ -363,13 +377,7 @@ def check_approver_status():
         approver_codes = get_user_approver_roles(user)
 
         # Count pending approvals
-        pending_count = 0
-        if approver_codes:
-            code_ids = [code.id for code in approver_codes]
-            pending_count = PendingRegistrationModel.query.filter(
-                PendingRegistrationModel.onboarding_code_id.in_(code_ids),
-                PendingRegistrationModel.approval_status == 'pending_approval'
-            ).count()
+        pending_count = pending_approvals_query(user.id).count() if approver_codes else 0
 
         return jsonify({
             'is_approver': len(approver_codes) > 0,
@@ -383,3 +391,20 @@ def check_approver_status():
     except Exception as e:
         current_app.logger.error(f"Failed to check approver status: {str(e)}")
         return jsonify({'error': f'Failed to check approver status: {str(e)}'}), 400
+
+
+@api_v1.route('/approvals/count', methods=['GET'])
+@jwt_required()
+def count_my_approvals():
+    """
+    Number of registrations waiting for the current user's approval.
+    Count-only variant of /approvals/check for badge polling - a single
+    COUNT query from the JWT identity, without loading the user.
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        return jsonify({'pending_count': pending_approvals_query(current_user_id).count()}), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Failed to count approvals: {str(e)}")
+        return jsonify({'error': f'Failed to count approvals: {str(e)}'}), 400
@@ -277,37 +277,14 @@ def add_group_member(group_id):
         return jsonify({'error': 'username or userId is required'}), 400
 
     try:
-        from app.ots import otsClient
-        from app.models import GroupUserAssociation
-
-        new_dirs = set(['IN', 'OUT'] if direction == 'BOTH' else [direction])
+        from app.services.group_membership import GroupMembershipService
 
-        # Determine old directions to find what to remove
-        old_dir = None
+        changes = GroupMembershipService.reconcile(username, {group.id: direction}, user=user, remove_missing=False)
+        # Failing to remove a direction no longer wanted is only logged
+        failed_adds = changes.failed('add')
+        if failed_adds:
+            raise failed_adds[0][1]
         if user:
-            existing = GroupUserAssociation.query.filter_by(group_id=group.id, user_id=user.id).first()
-            if existing:
-                old_dir = existing.direction
-        old_dirs = set(['IN', 'OUT'] if old_dir == 'BOTH' else [old_dir]) if old_dir else set()
-
-        # Add new directions
-        for d in new_dirs - old_dirs:
-            otsClient.add_user_to_group(username, group.name, direction=d)
-
-        # Remove directions no longer wanted
-        for d in old_dirs - new_dirs:
-            try:
-                otsClient.remove_user_from_group(username, group.name, direction=d)
-            except Exception as e:
-                current_app.logger.warning(f"Failed to remove {username} from OTS group {group.name} {d}: {e}")
-
-        # Track locally
-        if user:
-            if existing:
-                existing.direction = direction
-            else:
-                assoc = GroupUserAssociation(group_id=group.id, user_id=user.id, direction=direction)
-                db.session.add(assoc)
             db.session.commit()
 
         current_app.logger.info(f"Set user {username} in group '{group.name}' direction={direction}")
@@ -375,64 +352,36 @@ def remove_group_member(group_id, username):
 @api_v1.route('/groups/sync', methods=['POST'])
 @jwt_required()
 def sync_groups_from_ots():
-    """Sync groups from OTS server to local database"""
+    """
+    Sync groups from OTS server to local database
+
+    Query Parameters:
+    - dryRun: Set to "true" to return the diff without applying it
+    """
     error = require_admin_role()
     if error:
         return error
 
+    dry_run = request.args.get('dryRun', '').lower() == 'true'
+
     try:
-        from app.ots import otsClient
+        from app.services.ots_group_sync import ots_group_sync
 
         current_app.logger.info("Starting OTS group sync")
-        ots_response = otsClient.get_groups()
-
-        ots_groups = ots_response.get('response', {})
-        if isinstance(ots_groups, dict):
-            ots_groups = ots_groups.get('results', ots_groups.get('groups', ots_groups.get('response', [])))
-        if not isinstance(ots_groups, list):
-            ots_groups = []
+        stats = ots_group_sync.sync(dry_run=dry_run)
+        synced = stats['created'] + stats['updated'] + stats['unchanged']
 
-        synced = 0
-        created = 0
-        updated = 0
-
-        for ots_group in ots_groups:
-            group_name = ots_group.get('name') if isinstance(ots_group, dict) else str(ots_group)
-            if not group_name:
-                continue
-
-            description = ots_group.get('description', '') if isinstance(ots_group, dict) else ''
-            active = ots_group.get('active', True) if isinstance(ots_group, dict) else True
-
-            existing = OTSGroupModel.get_by_name(group_name)
-            if existing:
-                if description:
-                    existing.description = description
-                existing.active = active
-                existing.synced_at = datetime.datetime.utcnow()
-                updated += 1
-            else:
-                group = OTSGroupModel(
-                    name=group_name,
-                    display_name=group_name.replace('_', ' ').title(),
-                    description=description,
-                    active=active,
-                    synced_at=datetime.datetime.utcnow()
-                )
-                db.session.add(group)
-                created += 1
-
-            synced += 1
-
-        db.session.commit()
-
-        current_app.logger.info(f"OTS group sync complete: {synced} synced, {created} created, {updated} updated")
+        if dry_run:
+            message = (f"Dry run: {stats['created']} to create, {stats['updated']} to update, "
+                       f"{stats['deactivated']} to deactivate")
+        else:
+            message = (f"Synced {synced} groups from OTS ({stats['created']} new, {stats['updated']} updated, "
+                       f"{stats['deactivated']} deactivated)")
 
         return jsonify({
-            'message': f'Synced {synced} groups from OTS ({created} new, {updated} updated)',
+            'message': message,
             'synced': synced,
-            'created': created,
-            'updated': updated
+            **stats
         }), 200
 
     except ConnectionError as e:
@@ -442,3 +391,20 @@ def sync_groups_from_ots():
         current_app.logger.error(f"OTS group sync failed: {str(e)}")
         db.session.rollback()
         return jsonify({'error': f'Failed to sync groups: {str(e)}'}), 400
+
+
+@api_v1.route('/groups/sync/status', methods=['GET'])
+@jwt_required()
+def get_group_sync_status():
+    """Get the time and statistics of the last successful OTS group sync"""
+    error = require_view_role()
+    if error:
+        return error
+
+    from app.services.ots_group_sync import ots_group_sync
+    watermark, stats = ots_group_sync.get_last_sync()
+
+    return jsonify({
+        'lastSyncedAt': watermark,
+        'stats': stats
+    }), 200
@@ -0,0 +1,78 @@
+"""
+Health API endpoints
+Reports whether the portal can currently reach OpenTAK Server and how the
+background maintenance jobs are doing
+"""
+
+from flask import jsonify
+from flask_jwt_extended import jwt_required
+from app.api_v1 import api_v1
+
+
+@api_v1.route('/health', methods=['GET'])
+def get_health():
+    """
+    Get portal health
+
+    Does not contact OTS - reports the state of the OTS circuit breaker so
+    that load balancers and the frontend can detect a degraded portal cheaply.
+
+    Response:
+    {
+        "status": "ok" | "degraded",
+        "ots": {
+            "state": "closed" | "open" | "half_open",
+            "retry_in": float or null
+        }
+    }
+    """
+    from app.ots import otsClient, get_breaker
+
+    breaker = get_breaker(otsClient.base_url).status()
+
+    return jsonify({
+        'status': 'ok' if breaker['state'] == 'closed' else 'degraded',
+        'ots': {
+            'state': breaker['state'],
+            'retry_in': breaker['retry_in']
+        }
+    }), 200
+
+
+@api_v1.route('/admin/ots-status', methods=['GET'])
+@jwt_required()
+def get_ots_status():
+    """
+    Get detailed OTS connection status (settings admins)
+
+    Returns circuit breaker state and per-endpoint latency histograms,
+    percentiles and the current adaptive read timeout.
+    """
+    from app.rbac import has_any_role
+    if not has_any_role(['administrator', 'settings_admin', 'settings_readonly']):
+        return jsonify({'error': 'Settings admin or readonly access required'}), 403
+
+    from app.ots import otsClient, get_breaker, ots_call_metrics
+
+    return jsonify({
+        'breaker': get_breaker(otsClient.base_url).status(),
+        'endpoints': ots_call_metrics.snapshot()
+    }), 200
+
+
+@api_v1.route('/admin/cleanup-status', methods=['GET'])
+@jwt_required()
+def get_cleanup_status():
+    """
+    Get expired-record cleanup metrics (settings admins)
+
+    Returns per-table run counts, rows deleted and durations of the
+    scheduled cleanup of tokens, kiosk sessions and pending registrations.
+    """
+    from app.rbac import has_any_role
+    if not has_any_role(['administrator', 'settings_admin', 'settings_readonly']):
+        return jsonify({'error': 'Settings admin or readonly access required'}), 403
+
+    from app.services.cleanup import cleanup_metrics
+
+    return jsonify({'tables': cleanup_metrics.snapshot()}), 200
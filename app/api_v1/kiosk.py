@@ -14,8 +14,12 @@ from datetime import timedelta, datetime
 from app.api_v1 import api_v1
 from app.models import db, UserModel, KioskSessionModel, SystemSettingsModel
 from app.api_v1.auth import get_frontend_url
+from app.services.kiosk_events import kiosk_events
 import secrets
 
+# Seconds a kiosk should wait before polling again after a "pending" answer that did not long-poll
+POLL_RETRY_SECONDS = 3
+
 
 @api_v1.route('/kiosk/session', methods=['POST'])
 def create_kiosk_session():
@@ -28,9 +32,7 @@ def create_kiosk_session():
         return jsonify({'error': 'Kiosk enrollment is disabled'}), 403
 
     try:
-        # Clean up old expired sessions
-        KioskSessionModel.cleanup_expired()
-
+        # Expired sessions are removed by the cleanup_expired_records job
         session_id = secrets.token_urlsafe(32)
         expires_at = datetime.utcnow() + timedelta(minutes=10)
 
@@ -56,25 +58,16 @@ def create_kiosk_session():
         return jsonify({'error': 'Failed to create kiosk session'}), 500
 
 
-@api_v1.route('/kiosk/session/<session_id>/status', methods=['GET'])
-def get_kiosk_session_status(session_id):
+def _session_status(session):
     """
-    Poll kiosk session status (public, no auth required).
-    Returns current status and tokens when authenticated (one-time read).
+    Build the status response for a kiosk session, marking expired pending
+    sessions and clearing tokens after they are handed out (one-time read).
     """
-    enabled = SystemSettingsModel.get_setting('kiosk_enrollment_enabled', False)
-    if enabled not in [True, 'true', 'True']:
-        return jsonify({'error': 'Kiosk enrollment is disabled'}), 403
-
-    session = KioskSessionModel.get_by_session_id(session_id)
-    if not session:
-        return jsonify({'error': 'Session not found'}), 404
-
     # Check if pending session has expired
     if session.status == 'pending' and session.expires_at < datetime.utcnow():
         session.status = 'expired'
         db.session.commit()
-        return jsonify({'status': 'expired'}), 200
+        return {'status': 'expired'}
 
     if session.status == 'authenticated':
         # Build response with tokens (one-time read)
@@ -96,12 +89,59 @@ def get_kiosk_session_status(session_id):
         session.refresh_token = None
         db.session.commit()
 
-        return jsonify(response), 200
+        return response
 
     if session.status == 'expired':
-        return jsonify({'status': 'expired'}), 200
+        return {'status': 'expired'}
+
+    return {'status': 'pending'}
+
+
+@api_v1.route('/kiosk/session/<session_id>/status', methods=['GET'])
+def get_kiosk_session_status(session_id):
+    """
+    Poll kiosk session status (public, no auth required).
+    Returns current status and tokens when authenticated (one-time read).
 
-    return jsonify({'status': 'pending'}), 200
+    With ?wait=<seconds> the request is held open while the session is
+    pending (long-poll) and returns as soon as the session is authenticated,
+    up to KIOSK_LONG_POLL_SECONDS. A "pending" answer given without waiting
+    (long-polling disabled, or too many kiosks waiting already) carries
+    retryAfter, the seconds to wait before polling again.
+    """
+    enabled = SystemSettingsModel.get_setting('kiosk_enrollment_enabled', False)
+    if enabled not in [True, 'true', 'True']:
+        return jsonify({'error': 'Kiosk enrollment is disabled'}), 403
+
+    wait = request.args.get('wait', 0, type=float) or 0
+    wait = max(0.0, min(wait, float(current_app.config.get('KIOSK_LONG_POLL_SECONDS', 25))))
+
+    # Read the version before the session so a publish in between is not lost
+    version = kiosk_events.version(session_id)
+    session = KioskSessionModel.get_by_session_id(session_id)
+    if not session:
+        return jsonify({'error': 'Session not found'}), 404
+
+    response = _session_status(session)
+    if response['status'] != 'pending':
+        return jsonify(response), 200
+    if wait <= 0:
+        return jsonify({**response, 'retryAfter': POLL_RETRY_SECONDS}), 200
+
+    until_expiry = (session.expires_at - datetime.utcnow()).total_seconds()
+    with kiosk_events.waiter_slot() as admitted:
+        if not admitted:
+            # Every waiter holds a server thread; past the limit answer now and let the kiosk poll again later
+            return jsonify({**response, 'retryAfter': POLL_RETRY_SECONDS}), 200
+        # Don't hold a database connection while waiting
+        db.session.close()
+        kiosk_events.wait(session_id, version, max(0.0, min(wait, until_expiry)))
+
+    # Woken by an authentication in this process, or timed out
+    session = KioskSessionModel.get_by_session_id(session_id)
+    if not session:
+        return jsonify({'error': 'Session not found'}), 404
+    return jsonify(_session_status(session)), 200
 
 
 @api_v1.route('/kiosk/session/<session_id>/authenticate', methods=['POST'])
@@ -162,4 +202,7 @@ def authenticate_kiosk_session(session_id):
     session.refresh_token = refresh_token
     db.session.commit()
 
+    # Wake any kiosk long-polling this session
+    kiosk_events.publish(session_id)
+
     return jsonify({'message': 'Session authenticated successfully'}), 200
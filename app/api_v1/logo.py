@@ -8,9 +8,10 @@ from flask_jwt_extended import jwt_required
 from app.api_v1 import api_v1
 from app.models import SystemSettingsModel
 from app import db
+from app.services import logo_variants
 from werkzeug.utils import secure_filename
+import json
 import os
-import uuid
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 MAX_FILE_SIZE = 2 * 1024 * 1024  # 2MB
@@ -22,6 +23,21 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def remove_legacy_logo(logo_path, upload_folder):
+    """Delete a logo stored as a single file by earlier versions"""
+    # Handle both old path format (/static/img/custom/) and new format (/api/v1/uploads/)
+    old_filename = os.path.basename(logo_path)
+    # Try new location first (instance/uploads)
+    old_file = os.path.join(upload_folder, old_filename)
+    if os.path.exists(old_file):
+        os.remove(old_file)
+    else:
+        # Try old location (static/img/custom)
+        old_static_path = os.path.join(current_app.root_path, 'static', 'img', 'custom', old_filename)
+        if os.path.exists(old_static_path):
+            os.remove(old_static_path)
+
+
 def get_logo_upload_folder():
     """Get the path to the logo upload folder (in instance folder for persistence)"""
     instance_path = current_app.instance_path
@@ -47,7 +63,7 @@ def upload_logo():
         in: formData
         type: file
         required: true
-        description: Logo image file (PNG, JPG, JPEG, GIF, max 2MB)
+        description: Logo image file (PNG, JPG, JPEG, GIF, max 2MB). Resized favicon, header and email variants are generated as WebP and PNG
     responses:
       200:
         description: Logo uploaded successfully
@@ -79,36 +95,30 @@ def upload_logo():
     if size > MAX_FILE_SIZE:
         return jsonify({'error': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB'}), 400
 
+    upload_folder = get_logo_upload_folder()
     try:
-        # Generate unique filename to avoid caching issues
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"logo_{uuid.uuid4().hex[:8]}.{ext}"
-        filename = secure_filename(filename)
-
-        upload_folder = get_logo_upload_folder()
-        os.makedirs(upload_folder, exist_ok=True)
+        manifest = logo_variants.generate_variants(file.read(), upload_folder)
+    except logo_variants.InvalidImageError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error generating logo variants: {str(e)}")
+        return jsonify({'error': 'Failed to upload logo'}), 500
 
-        # Delete old custom logo if exists
+    try:
+        # Delete the previous logo, unless the same image was uploaded again
+        old_manifest = logo_variants.get_manifest()
+        if old_manifest != manifest:
+            logo_variants.remove_variants(old_manifest, upload_folder)
         old_logo_path = SystemSettingsModel.get_setting('custom_logo_path')
-        if old_logo_path:
-            # Handle both old path format (/static/img/custom/) and new format (/api/v1/uploads/)
-            old_filename = os.path.basename(old_logo_path)
-            # Try new location first (instance/uploads)
-            old_file = os.path.join(upload_folder, old_filename)
-            if os.path.exists(old_file):
-                os.remove(old_file)
-            else:
-                # Try old location (static/img/custom)
-                old_static_path = os.path.join(current_app.root_path, 'static', 'img', 'custom', old_filename)
-                if os.path.exists(old_static_path):
-                    os.remove(old_static_path)
-
-        # Save new file
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
-
-        # Update settings - use API route to serve from instance folder
-        logo_url = f'/api/v1/uploads/{filename}'
+        if old_logo_path and not logo_variants.is_hashed_filename(os.path.basename(old_logo_path)):
+            remove_legacy_logo(old_logo_path, upload_folder)
+
+        # The header variant is what the portal shows; it is negotiated to WebP when accepted
+        logo_url = logo_variants.URL_PREFIX + manifest['header']['png']
+        SystemSettingsModel.set_setting(
+            logo_variants.VARIANTS_SETTING, json.dumps(manifest), category='branding',
+            description='Generated sizes of the custom logo'
+        )
 
         # Update or create settings
         logo_enabled_setting = SystemSettingsModel.query.filter_by(key='custom_logo_enabled').first()
@@ -141,7 +151,8 @@ def upload_logo():
 
         return jsonify({
             'message': 'Logo uploaded successfully',
-            'logo_path': logo_url
+            'logo_path': logo_url,
+            'variants': logo_variants.variant_urls(manifest)
         }), 200
 
     except Exception as e:
@@ -173,19 +184,11 @@ def delete_logo():
         return jsonify({'error': 'Settings admin access required'}), 403
 
     try:
+        upload_folder = get_logo_upload_folder()
+        logo_variants.remove_variants(logo_variants.get_manifest(), upload_folder)
         logo_path = SystemSettingsModel.get_setting('custom_logo_path')
         if logo_path:
-            upload_folder = get_logo_upload_folder()
-            old_filename = os.path.basename(logo_path)
-            # Try new location first (instance/uploads)
-            old_file = os.path.join(upload_folder, old_filename)
-            if os.path.exists(old_file):
-                os.remove(old_file)
-            else:
-                # Try old location (static/img/custom)
-                old_static_path = os.path.join(current_app.root_path, 'static', 'img', 'custom', old_filename)
-                if os.path.exists(old_static_path):
-                    os.remove(old_static_path)
+            remove_legacy_logo(logo_path, upload_folder)
 
         # Update settings
         logo_enabled_setting = SystemSettingsModel.query.filter_by(key='custom_logo_enabled').first()
@@ -196,6 +199,10 @@ def delete_logo():
         if logo_path_setting:
             logo_path_setting.value = ''
 
+        variants_setting = SystemSettingsModel.query.filter_by(key=logo_variants.VARIANTS_SETTING).first()
+        if variants_setting:
+            variants_setting.value = ''
+
         db.session.commit()
 
         current_app.logger.info("Logo reset to default")
@@ -230,6 +237,9 @@ def get_logo_settings():
               type: string
             logo_display_mode:
               type: string
+            custom_logo_variants:
+              type: object
+              description: URL per generated size (favicon-32, favicon-180, favicon-192, header, email)
             default_logo_path:
               type: string
       403:
@@ -246,6 +256,7 @@ def get_logo_settings():
         'custom_logo_enabled': custom_logo_enabled,
         'custom_logo_path': SystemSettingsModel.get_setting('custom_logo_path') or '',
         'logo_display_mode': SystemSettingsModel.get_setting('logo_display_mode') or 'logo_and_text',
+        'custom_logo_variants': logo_variants.variant_urls(),
         'default_logo_path': '/static/img/logo.png'
     }), 200
 
@@ -255,6 +266,9 @@ def serve_upload(filename):
     """
     Serve uploaded files (logos, etc.) from the instance folder
     This ensures files persist across container restarts
+
+    Logo variants are named by content hash and cached as immutable. A PNG
+    variant is answered with its WebP sibling when the client accepts image/webp.
     """
     # Sanitize filename to prevent directory traversal
     filename = secure_filename(filename)
@@ -263,4 +277,15 @@ def serve_upload(filename):
     if not os.path.exists(os.path.join(upload_folder, filename)):
         return jsonify({'error': 'File not found'}), 404
 
-    return send_from_directory(upload_folder, filename)
+    served = filename
+    webp = logo_variants.webp_sibling(filename)
+    if webp and 'image/webp' in request.headers.get('Accept', '') and \
+            os.path.exists(os.path.join(upload_folder, webp)):
+        served = webp
+
+    response = send_from_directory(upload_folder, served)
+    if logo_variants.is_hashed_filename(filename):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    if webp:
+        response.vary.add('Accept')
+    return response
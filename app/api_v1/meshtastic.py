@@ -11,6 +11,7 @@ from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from app.api_v1 import api_v1
 from app.models import MeshtasticModel, UserRoleModel, UserModel, db
 from app.services.meshtastic_sync import MeshtasticSyncService
+from app.services.entitlements import entitlements
 import yaml
 
 
@@ -35,36 +36,12 @@ def require_view_role():
 def get_meshtastic_configs():
     """Get all Meshtastic configs (filter by user access via roles only)"""
     current_user_id = int(get_jwt_identity())
-    user = UserModel.get_user_by_id(current_user_id)
-    user_role_ids = [r.id for r in user.roles] if user else []
 
-    # Get configs based on access (admin status does NOT grant automatic access):
+    # Configs visible to the user (admin status does NOT grant automatic access):
     # 1. Directly assigned to user
     # 2. Assigned to one of user's roles
-    # 3. Public configs
-    user_configs = user.meshtastic if user else []
-    public_configs = MeshtasticModel.query.filter_by(isPublic=True).all()
-
-    # Get configs assigned to user's roles
-    role_configs = []
-    if user_role_ids:
-        all_configs = MeshtasticModel.query.all()
-        for config in all_configs:
-            config_role_ids = [r.id for r in config.roles]
-            if any(rid in user_role_ids for rid in config_role_ids):
-                role_configs.append(config)
-
-    # Combine and deduplicate
-    configs_dict = {c.id: c for c in user_configs}
-    for c in role_configs:
-        if c.id not in configs_dict:
-            configs_dict[c.id] = c
-    for c in public_configs:
-        if c.id not in configs_dict:
-            if not c.roles and not c.users:
-                configs_dict[c.id] = c
-
-    configs = list(configs_dict.values())
+    # 3. Public configs with no role or user restrictions
+    configs = entitlements.visible_query(current_user_id, 'meshtastic').all()
 
     return jsonify({
         'configs': [{
@@ -356,22 +333,35 @@ def delete_meshtastic_config(config_id):
 @api_v1.route('/meshtastic/sync', methods=['POST'])
 @jwt_required()
 def sync_meshtastic_from_ots():
-    """Sync Meshtastic configs from OTS (admin only)"""
+    """
+    Sync Meshtastic configs from OTS (admin only)
+
+    Query Parameters:
+    - dryRun: Set to "true" to return the planned changes without applying them
+    """
     error = require_admin_role()
     if error:
         return error
 
+    dry_run = request.args.get('dryRun', '').lower() == 'true'
+
     try:
-        created, updated, errors = MeshtasticSyncService.sync_from_ots()
+        result = MeshtasticSyncService.sync_channels_from_ots(dry_run=dry_run)
 
         response = {
-            'message': 'Sync completed',
-            'created': created,
-            'updated': updated
+            'message': 'Dry run completed' if dry_run else 'Sync completed',
+            'created': result['created'],
+            'updated': result['updated'],
+            'unchanged': result['unchanged'],
+            'pages': result['pages']
         }
 
-        if errors:
-            response['errors'] = errors
+        if dry_run:
+            response['diff'] = result['diff']
+
+        if result['errors']:
+            response['errors'] = result['errors']
+            response['channelErrors'] = result['channel_errors']
 
         return jsonify(response), 200
 
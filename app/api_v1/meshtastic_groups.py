@@ -8,6 +8,8 @@ from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from app.api_v1 import api_v1
 from app.models import MeshtasticChannelGroup, MeshtasticModel, UserRoleModel, UserModel, ChannelGroupMembership, db
 from app.utils.meshtastic_url import update_group_combined_url
+from app.services.entitlements import entitlements
+from sqlalchemy.orm import selectinload
 
 
 def require_admin_role():
@@ -23,35 +25,14 @@ def require_admin_role():
 def get_meshtastic_groups():
     """Get all Meshtastic channel groups (filter by user access via roles only)"""
     current_user_id = int(get_jwt_identity())
-    user = UserModel.get_user_by_id(current_user_id)
-    user_role_ids = [r.id for r in user.roles] if user else []
 
-    # Get groups based on access (admin status does NOT grant automatic access):
+    # Groups visible to the user (admin status does NOT grant automatic access):
     # 1. Directly assigned to user
     # 2. Assigned to one of user's roles
     # 3. Public groups
-    user_groups = user.meshtastic_groups if user else []
-    public_groups = MeshtasticChannelGroup.query.filter_by(isPublic=True).all()
-
-    # Get groups assigned to user's roles
-    role_groups = []
-    if user_role_ids:
-        all_groups = MeshtasticChannelGroup.query.all()
-        for group in all_groups:
-            group_role_ids = [r.id for r in group.roles]
-            if any(rid in user_role_ids for rid in group_role_ids):
-                role_groups.append(group)
-
-    # Combine and deduplicate
-    groups_dict = {g.id: g for g in user_groups}
-    for g in role_groups:
-        if g.id not in groups_dict:
-            groups_dict[g.id] = g
-    for g in public_groups:
-        if g.id not in groups_dict:
-            groups_dict[g.id] = g
-
-    groups = list(groups_dict.values())
+    groups = entitlements.visible_query(current_user_id, 'meshtastic_group').options(
+        selectinload(MeshtasticChannelGroup.channel_memberships).joinedload(ChannelGroupMembership.channel)
+    ).all()
 
     return jsonify({
         'groups': [{
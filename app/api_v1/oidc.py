@@ -3,6 +3,7 @@ OIDC (OpenID Connect) authentication endpoints.
 Supports multiple OIDC providers with per-provider branding and role mapping.
 """
 
+import base64
 import json
 import os
 import uuid
@@ -18,11 +19,12 @@ from flask_jwt_extended import (
 )
 from datetime import timedelta
 from authlib.integrations.requests_client import OAuth2Session
-from authlib.jose import jwt as jose_jwt, JsonWebKey
+from authlib.jose import jwt as jose_jwt
 
 from app.api_v1 import api_v1
 from app.models import db, UserModel, UserRoleModel, OIDCProviderModel, SystemSettingsModel
 from app.rbac import require_role
+from app.services.oidc_metadata import oidc_metadata
 
 
 def _get_frontend_url():
@@ -37,14 +39,13 @@ def _get_frontend_url():
     return f"{proto}://{host}"
 
 
-def _fetch_discovery(discovery_url):
-    """Fetch and cache OIDC discovery document"""
+def _token_kid(token):
+    """Return the key id from a JWT header, or None"""
     try:
-        resp = http_requests.get(discovery_url, timeout=10)
-        resp.raise_for_status()
-        return resp.json()
-    except Exception as e:
-        current_app.logger.error(f"OIDC discovery fetch failed for {discovery_url}: {e}")
+        header = token.split('.')[0]
+        header += '=' * (-len(header) % 4)
+        return json.loads(base64.urlsafe_b64decode(header)).get('kid')
+    except Exception:
         return None
 
 
@@ -109,7 +110,7 @@ def oidc_authorize(provider_id):
     if not provider or not provider.enabled:
         return jsonify({'error': 'OIDC provider not found or disabled'}), 404
 
-    discovery = _fetch_discovery(provider.discovery_url)
+    discovery = oidc_metadata.get_discovery(provider.discovery_url)
     if not discovery:
         return jsonify({'error': 'Failed to fetch OIDC provider configuration'}), 502
 
@@ -169,7 +170,7 @@ def oidc_callback(provider_id):
     if not provider or not provider.enabled:
         return redirect(f"{frontend_url}/login?oidc_error=OIDC+provider+not+found+or+disabled")
 
-    discovery = _fetch_discovery(provider.discovery_url)
+    discovery = oidc_metadata.get_discovery(provider.discovery_url)
     if not discovery:
         return redirect(f"{frontend_url}/login?oidc_error=Failed+to+contact+OIDC+provider")
 
@@ -225,10 +226,10 @@ def oidc_callback(provider_id):
         # Also decode the id_token for claims
         id_token_claims = {}
         if 'id_token' in token:
-            # Fetch JWKS for token verification
-            jwks_resp = http_requests.get(discovery['jwks_uri'], timeout=10)
-            jwks = jwks_resp.json()
-            key_set = JsonWebKey.import_key_set(jwks)
+            # Cached JWKS for token verification, refetched if the key id is new
+            key_set = oidc_metadata.get_key_set(discovery['jwks_uri'], kid=_token_kid(token['id_token']))
+            if key_set is None:
+                return redirect(f"{frontend_url}/login?oidc_error=Failed+to+contact+OIDC+provider")
 
             claims = jose_jwt.decode(
                 token['id_token'],
@@ -401,7 +402,7 @@ def create_oidc_provider():
         return jsonify({'error': f'Provider with name "{data["name"]}" already exists'}), 400
 
     # Validate discovery URL is reachable
-    discovery = _fetch_discovery(data['discovery_url'])
+    discovery = oidc_metadata.get_discovery(data['discovery_url'], strict=True)
     if not discovery:
         return jsonify({'error': 'Could not fetch OIDC discovery document from the provided URL'}), 400
 
@@ -438,6 +439,7 @@ def update_oidc_provider(provider_id):
         return jsonify({'error': 'Provider not found'}), 404
 
     data = request.get_json()
+    oidc_metadata.invalidate_provider(provider)
 
     if 'name' in data and data['name'] != provider.name:
         existing = OIDCProviderModel.query.filter_by(name=data['name']).first()
@@ -490,6 +492,7 @@ def delete_oidc_provider(provider_id):
             os.remove(old_file)
 
     name = provider.name
+    oidc_metadata.invalidate_provider(provider)
     db.session.delete(provider)
     db.session.commit()
 
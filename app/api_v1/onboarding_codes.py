@@ -7,6 +7,7 @@ from flask import request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
 from app.api_v1 import api_v1
 from app.models import OnboardingCodeModel, UserModel, UserRoleModel, OTSGroupModel, GroupOnboardingCodeAssociation, db
+from app.utils.pagination import get_pagination_args, paginate, is_compact
 from datetime import datetime
 
 
@@ -29,15 +30,34 @@ def require_view_role():
 @api_v1.route('/onboarding-codes', methods=['GET'])
 @jwt_required()
 def get_onboarding_codes():
-    """Get all onboarding codes (admin only)"""
+    """
+    Get onboarding codes (admin only)
+
+    Query parameters:
+    - search: match name or code
+    - page, per_page: paginate the results (everything is returned if neither is given)
+    - compact: true to leave out roles and groups
+    """
     error = require_view_role()
     if error:
         return error
 
-    codes = OnboardingCodeModel.get_all_onboarding_codes()
+    compact = is_compact()
+    query = OnboardingCodeModel.listing_query(include_details=not compact)
 
-    return jsonify({
-        'codes': [{
+    search = request.args.get('search', '')
+    if search:
+        search_filter = f'%{search}%'
+        query = query.filter(
+            (OnboardingCodeModel.name.ilike(search_filter)) |
+            (OnboardingCodeModel.onboardingCode.ilike(search_filter))
+        )
+
+    codes, meta = paginate(query, get_pagination_args())
+
+    results = []
+    for code in codes:
+        item = {
             'id': code.id,
             'name': code.name,
             'description': code.description,
@@ -57,10 +77,13 @@ def get_onboarding_codes():
             } if code.onboardContact else None,
             'expiryDate': code.expiryDate.isoformat() if code.expiryDate else None,
             'userExpiryDate': code.userExpiryDate.isoformat() if code.userExpiryDate else None,
-            'roles': [{'id': r.id, 'name': r.name, 'displayName': r.display_name} for r in code.roles],
-            'groups': [{'id': a.group.id, 'name': a.group.name, 'displayName': a.group.display_name, 'direction': a.direction} for a in code.group_associations]
-        } for code in codes]
-    }), 200
+        }
+        if not compact:
+            item['roles'] = [{'id': r.id, 'name': r.name, 'displayName': r.display_name} for r in code.roles]
+            item['groups'] = [{'id': a.group.id, 'name': a.group.name, 'displayName': a.group.display_name, 'direction': a.direction} for a in code.group_associations]
+        results.append(item)
+
+    return jsonify({'codes': results, **meta}), 200
 
 
 @api_v1.route('/onboarding-codes/<int:code_id>', methods=['GET'])
@@ -8,6 +8,7 @@ from flask_jwt_extended import jwt_required, get_jwt
 from app.api_v1 import api_v1
 from app.api_v1.auth import get_frontend_url
 from app.models import PendingRegistrationModel, OnboardingCodeModel, UserModel
+from app.utils.pagination import get_pagination_args, paginate, is_compact
 from datetime import datetime, timedelta
 import secrets
 import re
@@ -32,17 +33,32 @@ def require_view_role():
 @api_v1.route('/pending-registrations', methods=['GET'])
 @jwt_required()
 def get_pending_registrations():
-    """Get all pending registrations (admin only)"""
+    """
+    Get pending registrations (admin only)
+
+    Query parameters:
+    - status: approval status (pending_verification, pending_approval, approved, rejected)
+    - code: onboarding code id or code string
+    - page, per_page: paginate the results (everything is returned if neither is given)
+    - compact: true to leave out the nested onboarding code and approver objects
+    """
     error = require_view_role()
     if error:
         return error
 
     try:
-        # Get all pending registrations
-        pending = PendingRegistrationModel.query.all()
+        compact = is_compact()
+        query = PendingRegistrationModel.listing_query(
+            status=request.args.get('status'),
+            onboarding_code=request.args.get('code'),
+            include_details=not compact
+        )
+        pending, meta = paginate(query, get_pagination_args())
+        now = datetime.now()
 
-        return jsonify({
-            'pending_registrations': [{
+        results = []
+        for p in pending:
+            item = {
                 'id': p.id,
                 'username': p.username,
                 'email': p.email,
@@ -50,7 +66,14 @@ def get_pending_registrations():
                 'lastName': p.lastName,
                 'callsign': p.callsign,
                 'onboarding_code_id': p.onboarding_code_id,
-                'onboarding_code': {
+                'created_at': p.created_at.isoformat() if p.created_at else None,
+                'expires_at': p.expires_at.isoformat() if p.expires_at else None,
+                'is_expired': p.expires_at < now if p.expires_at else False,
+                'approval_status': p.approval_status,
+                'approved_at': p.approved_at.isoformat() if p.approved_at else None,
+            }
+            if not compact:
+                item['onboarding_code'] = {
                     'id': p.onboarding_code.id,
                     'name': p.onboarding_code.name,
                     'code': p.onboarding_code.onboardingCode,
@@ -60,20 +83,18 @@ def get_pending_registrations():
                         'name': p.onboarding_code.approverRole.name,
                         'displayName': p.onboarding_code.approverRole.display_name
                     } if p.onboarding_code.approverRole else None
-                } if p.onboarding_code else None,
-                'created_at': p.created_at.isoformat() if p.created_at else None,
-                'expires_at': p.expires_at.isoformat() if p.expires_at else None,
-                'is_expired': p.expires_at < datetime.now() if p.expires_at else False,
-                'approval_status': p.approval_status,
-                'approved_at': p.approved_at.isoformat() if p.approved_at else None,
-                'approved_by': {
+                } if p.onboarding_code else None
+                item['approved_by'] = {
                     'id': p.approver.id,
                     'username': p.approver.username,
                     'firstName': p.approver.firstName,
                     'lastName': p.approver.lastName
                 } if p.approver else None
-            } for p in pending]
-        }), 200
+            else:
+                item['approved_by_id'] = p.approved_by
+            results.append(item)
+
+        return jsonify({'pending_registrations': results, **meta}), 200
 
     except Exception as e:
         current_app.logger.error(f"Failed to get pending registrations: {str(e)}")
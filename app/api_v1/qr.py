@@ -8,6 +8,7 @@ from flask import request, Response, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.api_v1 import api_v1
 from app.ots import otsClient
+from app.services.qr_token_cache import qr_token_cache, settings_fingerprint
 import qrcode
 import io
 import time
@@ -15,35 +16,30 @@ import time
 # Default token configuration (can be overridden by settings)
 DEFAULT_TOKEN_EXPIRY_MINUTES = 60
 DEFAULT_TOKEN_MAX_USES = 1
+DEFAULT_USAGE_TTL_SECONDS = 15
 
-# Simple in-memory cache for QR strings
-# Key: "username:token_type", Value: {"qr_string": str, "exp": int}
-_qr_cache = {}
 
-
-def get_cached_qr_string(username, token_type):
+def get_cached_qr_string(username, token_type, fingerprint=None):
     """Get cached QR string for a user if not expired"""
-    key = f"{username}:{token_type}"
-    cached = _qr_cache.get(key)
-    if cached:
-        # Check if cached entry is expired
-        if cached.get('exp') and cached['exp'] < time.time():
-            del _qr_cache[key]
-            return None
-        return cached.get('qr_string')
-    return None
+    cached = qr_token_cache.get(qr_token_cache.make_key(username, token_type), fingerprint)
+    return cached.get('qr_string') if cached else None
 
 
-def set_cached_qr_string(username, token_type, qr_string, exp=None):
-    """Cache QR string for a user"""
-    key = f"{username}:{token_type}"
-    _qr_cache[key] = {'qr_string': qr_string, 'exp': exp}
+def set_cached_qr_string(username, token_type, qr_string, exp=None, fingerprint=None, max_uses=None, total_uses=0):
+    """Cache QR string for a user until the token expires"""
+    qr_token_cache.set(
+        qr_token_cache.make_key(username, token_type),
+        qr_string,
+        exp,
+        fingerprint,
+        max_uses=max_uses,
+        total_uses=total_uses
+    )
 
 
 def clear_cached_qr_string(username, token_type):
     """Clear cached QR string for a user"""
-    key = f"{username}:{token_type}"
-    _qr_cache.pop(key, None)
+    qr_token_cache.delete(qr_token_cache.make_key(username, token_type))
 
 
 def get_token_settings():
@@ -138,22 +134,56 @@ def is_token_exhausted(qr_data):
     return False
 
 
+def _token_response(qr_string, expires_at, max_uses, total_uses):
+    return {
+        'qr_string': qr_string,
+        'expires_at': expires_at,
+        'max_uses': max_uses,
+        'total_uses': total_uses
+    }
+
+
 def get_or_create_atak_token(username, force_refresh=False):
     """
     Get existing ATAK token or create a fresh one if needed.
 
+    Cached tokens are served without contacting OTS while their usage counts
+    are younger than QR_USAGE_TTL_SECONDS; older entries are looked up in OTS
+    again so total_uses (and an exhausted token) is noticed. On a miss,
+    generation is serialized per user so concurrent requests (or other
+    workers, with the database cache backend) reuse the first token instead
+    of each deleting and re-creating it in OTS.
+
     Returns:
         dict: {qr_string, expires_at, max_uses, total_uses} or None
     """
     expiry_seconds, max_uses = get_token_settings()
+    fingerprint = settings_fingerprint(expiry_seconds, max_uses)
+    cache_key = qr_token_cache.make_key(username, 'atak')
+    requested_at = time.time()
+    # Entries cached before this have usage counts too old to serve
+    usage_cutoff = requested_at - int(current_app.config.get('QR_USAGE_TTL_SECONDS', DEFAULT_USAGE_TTL_SECONDS))
+
+    if not force_refresh:
+        cached = qr_token_cache.get(cache_key, fingerprint)
+        if cached and (cached.get('cached_at') or 0) >= usage_cutoff:
+            return _token_response(cached['qr_string'], cached['expires_at'], cached['max_uses'], cached['total_uses'])
 
+    with qr_token_cache.single_flight(cache_key):
+        # Another request may have produced a token while we waited for the lock.
+        # A forced refresh only accepts one generated after it was requested.
+        cached = qr_token_cache.get(cache_key, fingerprint)
+        if cached and (cached.get('cached_at') or 0) >= (requested_at if force_refresh else usage_cutoff):
+            return _token_response(cached['qr_string'], cached['expires_at'], cached['max_uses'], cached['total_uses'])
+
+        return _fetch_or_create_atak_token(username, force_refresh, expiry_seconds, max_uses, fingerprint)
+
+
+def _fetch_or_create_atak_token(username, force_refresh, expiry_seconds, max_uses, fingerprint):
+    """Look up the user's token in OTS, creating a new one if missing or expired"""
     # If force refresh, delete existing token first and create new one
     if force_refresh:
         clear_cached_qr_string(username, 'atak')
-        try:
-            otsClient.delete_atak_qr_string(username)
-        except Exception:
-            pass  # Ignore delete errors
     else:
         # Try to get existing token from OTS
         try:
@@ -163,41 +193,21 @@ def get_or_create_atak_token(username, force_refresh=False):
             if qr_data:
                 qr_string = qr_data.get('qr_string')
                 exp = qr_data.get('exp')
-                token_max = qr_data.get('max')
+                token_max = qr_data.get('max') if qr_data.get('max') is not None else max_uses
                 total_uses = qr_data.get('total_uses', 0)
 
                 # Check if token is expired
                 if exp and exp < time.time():
                     clear_cached_qr_string(username, 'atak')
-                else:
-                    # Token is valid - return it
-                    if qr_string:
-                        set_cached_qr_string(username, 'atak', qr_string, exp)
-                        return {
-                            'qr_string': qr_string,
-                            'expires_at': exp,
-                            'max_uses': token_max if token_max is not None else max_uses,
-                            'total_uses': total_uses
-                        }
-                    # Try cached value
-                    cached_qr = get_cached_qr_string(username, 'atak')
-                    if cached_qr:
-                        return {
-                            'qr_string': cached_qr,
-                            'expires_at': exp,
-                            'max_uses': token_max if token_max is not None else max_uses,
-                            'total_uses': total_uses
-                        }
+                elif qr_string:
+                    # Token is valid - cache and return it
+                    set_cached_qr_string(username, 'atak', qr_string, exp, fingerprint, token_max, total_uses)
+                    return _token_response(qr_string, exp, token_max, total_uses)
         except Exception:
-            # Try cached value on error
+            # Try cached value on error, regardless of settings fingerprint
             cached_qr = get_cached_qr_string(username, 'atak')
             if cached_qr:
-                return {
-                    'qr_string': cached_qr,
-                    'expires_at': None,
-                    'max_uses': max_uses,
-                    'total_uses': 0
-                }
+                return _token_response(cached_qr, None, max_uses, 0)
 
     # Delete existing token before creating new one
     try:
@@ -216,13 +226,11 @@ def get_or_create_atak_token(username, force_refresh=False):
         qr_data = extract_qr_data(qr_response)
 
         if qr_data and qr_data.get('qr_string'):
-            set_cached_qr_string(username, 'atak', qr_data['qr_string'], qr_data.get('exp', exp_time))
-            return {
-                'qr_string': qr_data['qr_string'],
-                'expires_at': qr_data.get('exp', exp_time),
-                'max_uses': qr_data.get('max', max_uses),
-                'total_uses': qr_data.get('total_uses', 0)
-            }
+            exp = qr_data.get('exp') or exp_time
+            token_max = qr_data.get('max') if qr_data.get('max') is not None else max_uses
+            total_uses = qr_data.get('total_uses', 0)
+            set_cached_qr_string(username, 'atak', qr_data['qr_string'], exp, fingerprint, token_max, total_uses)
+            return _token_response(qr_data['qr_string'], exp, token_max, total_uses)
     except Exception as e:
         current_app.logger.error(f"Failed to create ATAK token: {e}")
 
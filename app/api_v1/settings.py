@@ -7,9 +7,18 @@ from flask import jsonify, current_app, request
 from flask_jwt_extended import jwt_required, get_jwt
 from app.api_v1 import api_v1
 from app.models import SystemSettingsModel
+from app.services.logo_variants import variant_urls as logo_variant_urls
 from app import db
 
 
+def _invalidate_setting_caches(key):
+    """Drop cached data that was derived from the given setting"""
+    from app.services.qr_token_cache import qr_token_cache, QR_TOKEN_SETTING_KEYS
+    if key in QR_TOKEN_SETTING_KEYS:
+        qr_token_cache.clear()
+        current_app.logger.info(f"Cleared QR token cache after '{key}' changed")
+
+
 @api_v1.route('/settings', methods=['GET'])
 def get_settings():
     """
@@ -78,6 +87,7 @@ def get_settings():
         # Logo settings
         'custom_logo_enabled': get_bool_setting('custom_logo_enabled', False),
         'custom_logo_path': get_str_setting('custom_logo_path', ''),
+        'custom_logo_variants': logo_variant_urls() if get_bool_setting('custom_logo_enabled', False) else {},
         'logo_display_mode': get_str_setting('logo_display_mode', 'logo_and_text'),
         'default_logo_path': '/static/img/logo.png',
         # Radio settings
@@ -262,6 +272,8 @@ def update_admin_setting(setting_id):
 
         current_app.logger.info(f"Setting '{setting.key}' updated to '{setting.value}'")
 
+        _invalidate_setting_caches(setting.key)
+
         return jsonify({
             'message': 'Setting updated successfully',
             'setting': {
@@ -354,6 +366,8 @@ def update_admin_setting_by_key(key):
 
         current_app.logger.info(f"Setting '{setting.key}' updated to '{setting.value}'")
 
+        _invalidate_setting_caches(setting.key)
+
         return jsonify({
             'message': 'Setting updated successfully',
             'setting': {
@@ -368,3 +382,32 @@ def update_admin_setting_by_key(key):
         db.session.rollback()
         current_app.logger.error(f"Error updating setting: {str(e)}")
         return jsonify({'error': 'Failed to update setting'}), 500
+
+
+@api_v1.route('/admin/ots-cache', methods=['GET'])
+@jwt_required()
+def get_ots_cache_stats():
+    """
+    Get OTS response cache statistics (hits, misses, stale hits and
+    background refreshes per endpoint)
+    """
+    from app.rbac import has_any_role
+    if not has_any_role(['administrator', 'settings_admin', 'settings_readonly']):
+        return jsonify({'error': 'Settings admin or readonly access required'}), 403
+
+    from app.ots import otsClient
+    return jsonify(otsClient.cache.stats()), 200
+
+
+@api_v1.route('/admin/ots-cache', methods=['DELETE'])
+@jwt_required()
+def clear_ots_cache():
+    """Drop all cached OTS responses"""
+    from app.rbac import has_any_role
+    if not has_any_role(['administrator', 'settings_admin']):
+        return jsonify({'error': 'Settings admin access required'}), 403
+
+    from app.ots import otsClient
+    otsClient.cache.clear()
+    current_app.logger.info("OTS response cache cleared")
+    return jsonify({'message': 'OTS response cache cleared'}), 200
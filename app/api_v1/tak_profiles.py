@@ -3,15 +3,22 @@ TAK Profiles API endpoints
 CRUD operations and download for TAK profile management
 """
 
-from flask import request, jsonify, send_file, g
+from flask import request, jsonify, make_response, send_file, g
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity, verify_jwt_in_request, decode_token
 from app.api_v1 import api_v1
-from app.models import TakProfileModel, UserRoleModel, UserModel, OneTimeTokenModel, db
-from werkzeug.utils import secure_filename
+from app.models import DatapackageUploadModel, TakProfileModel, UserModel, OneTimeTokenModel, db
+import hashlib
 import os
-import zipfile
 import shutil
+import zipfile
 from app.settings import DATAPACKAGE_UPLOAD_FOLDER
+from app.services.entitlements import entitlements
+from app.services.datapackage_upload import (
+    PackageError, UploadError, UploadOffsetError, datapackage_uploads, normalize_profile_options,
+    profile_options_from_form
+)
+from app.services.datapackage_store import datapackage_store, normalize_path
+from app.services.datapackage_tree import file_trees, subtree
 from functools import wraps
 
 DOWNLOAD_TEMP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tmp_downloads')
@@ -89,6 +96,29 @@ def require_view_role():
     return None
 
 
+def _inject_callsign(pref_file, callsign):
+    """Set locationCallsign in a TAK preferences file, leaving files that are not valid XML alone"""
+    import xml.etree.ElementTree as ET
+    try:
+        tree = ET.parse(pref_file)
+        root = tree.getroot()
+        found = False
+        for entry in root.iter('entry'):
+            if entry.get('key') == 'locationCallsign':
+                entry.text = callsign
+                found = True
+                break
+        if not found:
+            new_entry = ET.SubElement(root, 'entry', {
+                'key': 'locationCallsign',
+                'class': 'class java.lang.String'
+            })
+            new_entry.text = callsign
+        tree.write(pref_file, xml_declaration=True, encoding='unicode')
+    except ET.ParseError:
+        pass
+
+
 @api_v1.route('/tak-profiles', methods=['GET'])
 @jwt_required()
 def get_tak_profiles():
@@ -100,30 +130,8 @@ def get_tak_profiles():
     if is_admin:
         profiles = TakProfileModel.get_all_tak_profiles()
     else:
-        user = UserModel.get_user_by_id(current_user_id)
-        profiles_dict = {}
-
-        # Get profiles directly assigned to user
-        if user and user.takprofiles:
-            for p in user.takprofiles:
-                profiles_dict[p.id] = p
-
-        # Get profiles assigned to user's roles
-        if user and user.roles:
-            for role in user.roles:
-                if role.takprofiles:
-                    for p in role.takprofiles:
-                        if p.id not in profiles_dict:
-                            profiles_dict[p.id] = p
-
-        # Get public profiles that have no role or user restrictions
-        public_profiles = TakProfileModel.query.filter_by(isPublic=True).all()
-        for p in public_profiles:
-            if p.id not in profiles_dict:
-                if not p.roles and not p.users:
-                    profiles_dict[p.id] = p
-
-        profiles = list(profiles_dict.values())
+        # Directly assigned, assigned to one of the user's roles, or public and unrestricted
+        profiles = entitlements.visible_query(current_user_id, 'tak_profile').all()
 
     return jsonify({
         'profiles': [{
@@ -149,15 +157,8 @@ def get_tak_profile(profile_id):
     is_admin = 'administrator' in claims.get('roles', [])
 
     if not is_admin and not profile.isPublic:
-        user = UserModel.get_user_by_id(current_user_id)
-        has_access = profile in user.takprofiles
-        if not has_access and user.roles:
-            # Check if profile is assigned to any of user's roles
-            for role in user.roles:
-                if profile in role.takprofiles:
-                    has_access = True
-                    break
-        if not has_access:
+        # Assigned to the user or one of the user's roles
+        if not TakProfileModel.can_access_profile(current_user_id, profile_id):
             return jsonify({'error': 'Access denied'}), 403
 
     return jsonify({
@@ -168,6 +169,7 @@ def get_tak_profile(profile_id):
         'takTemplateFolderLocation': profile.takTemplateFolderLocation,
         'takPrefFileLocation': profile.takPrefFileLocation,
         'injectCallsign': profile.injectCallsign or False,
+        'contentHash': profile.contentHash,
         'roles': [{'id': r.id, 'name': r.name, 'displayName': r.display_name} for r in profile.roles]
     }), 200
 
@@ -180,7 +182,6 @@ def create_download_token(profile_id):
     import datetime
 
     current_user_id = int(get_jwt_identity())
-    user = UserModel.get_user_by_id(current_user_id)
     profile = TakProfileModel.get_tak_profile_by_id(profile_id)
 
     if not profile:
@@ -188,14 +189,7 @@ def create_download_token(profile_id):
 
     claims = get_jwt()
     is_admin = 'administrator' in claims.get('roles', [])
-    is_unrestricted_public = profile.isPublic and not profile.roles and not profile.users
-    has_access = is_admin or is_unrestricted_public or profile in user.takprofiles
-    if not has_access and user.roles:
-        for role in user.roles:
-            if profile in role.takprofiles:
-                has_access = True
-                break
-    if not has_access:
+    if not is_admin and not TakProfileModel.can_access_profile(current_user_id, profile_id):
         return jsonify({'error': 'Access denied'}), 403
 
     # Remove any existing tokens for this user+profile
@@ -264,14 +258,7 @@ def download_tak_profile(profile_id, dl_token_override=None):
             return jsonify({'error': 'User not found'}), 403
 
         is_admin = any(r.name == 'administrator' for r in user.roles)
-        is_unrestricted_public = profile.isPublic and not profile.roles and not profile.users
-        has_access = is_admin or is_unrestricted_public or profile in user.takprofiles
-        if not has_access and user.roles:
-            for role in user.roles:
-                if profile in role.takprofiles:
-                    has_access = True
-                    break
-        if not has_access:
+        if not is_admin and not TakProfileModel.can_access_profile(user.id, profile_id):
             return jsonify({'error': 'Access denied'}), 403
 
     try:
@@ -291,43 +278,38 @@ def download_tak_profile(profile_id, dl_token_override=None):
             # Path is relative, prepend the base folder
             source_path = os.path.join(DATAPACKAGE_UPLOAD_FOLDER, profile.takTemplateFolderLocation)
 
-        dest_path = os.path.join(temp_dir, 'package')
-
         if not os.path.exists(source_path):
             return jsonify({'error': f'TAK profile files not found at: {source_path}'}), 404
 
-        shutil.copytree(source_path, dest_path)
-
-        # Inject user callsign into preferences file if enabled
-        if profile.injectCallsign and profile.takPrefFileLocation:
-            pref_file = os.path.join(dest_path, profile.takPrefFileLocation)
-            if os.path.exists(pref_file):
-                import xml.etree.ElementTree as ET
-                try:
-                    tree = ET.parse(pref_file)
-                    root = tree.getroot()
-                    found = False
-                    for entry in root.iter('entry'):
-                        if entry.get('key') == 'locationCallsign':
-                            entry.text = callsign
-                            found = True
-                            break
-                    if not found:
-                        new_entry = ET.SubElement(root, 'entry', {
-                            'key': 'locationCallsign',
-                            'class': 'class java.lang.String'
-                        })
-                        new_entry.text = callsign
-                    tree.write(pref_file, xml_declaration=True, encoding='unicode')
-                except ET.ParseError:
-                    pass
-
         # Create ZIP file with sanitized filename
         safe_profile_name = "".join(c for c in profile.name if c.isalnum() or c in (' ', '-', '_')).strip()
         safe_callsign = "".join(c for c in callsign if c.isalnum() or c in ('-', '_')).strip()
         zip_filename = f'{safe_profile_name}_{safe_callsign}.zip'
         zip_path = os.path.join(temp_dir, zip_filename)
-        shutil.make_archive(zip_path.replace('.zip', ''), 'zip', dest_path)
+
+        inject = profile.injectCallsign and profile.takPrefFileLocation
+        if profile.contentHash:
+            # The package without the preferences file is zipped once per version;
+            # only the personalized preferences are added per download
+            pref_name = normalize_path(profile.takPrefFileLocation) if inject else None
+            if pref_name not in (profile.get_content_manifest() or {}).get('files', {}):
+                pref_name = None
+            shutil.copyfile(datapackage_store.base_archive(profile, exclude=pref_name), zip_path)
+            if pref_name:
+                pref_file = os.path.join(temp_dir, 'preferences')
+                shutil.copyfile(os.path.join(source_path, *pref_name.split('/')), pref_file)
+                _inject_callsign(pref_file, callsign)
+                with zipfile.ZipFile(zip_path, 'a', zipfile.ZIP_DEFLATED) as archive:
+                    archive.write(pref_file, pref_name)
+        else:
+            dest_path = os.path.join(temp_dir, 'package')
+            shutil.copytree(source_path, dest_path)
+            # Inject user callsign into preferences file if enabled
+            if inject:
+                pref_file = os.path.join(dest_path, profile.takPrefFileLocation)
+                if os.path.exists(pref_file):
+                    _inject_callsign(pref_file, callsign)
+            shutil.make_archive(zip_path.replace('.zip', ''), 'zip', dest_path)
 
         # Send file and cleanup temp directory after sending
         response = send_file(
@@ -377,46 +359,11 @@ def create_tak_profile():
         return jsonify({'error': 'File must be a ZIP archive'}), 400
 
     try:
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        folder_name = filename.replace('.zip', '')
-
-        upload_path = os.path.join(DATAPACKAGE_UPLOAD_FOLDER, folder_name)
-        os.makedirs(upload_path, exist_ok=True)
-
-        zip_path = os.path.join(DATAPACKAGE_UPLOAD_FOLDER, filename)
-        file.save(zip_path)
-
-        # Extract ZIP
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(upload_path)
-
-        # Get form data
-        name = request.form.get('name', filename.replace('.zip', ''))
-        description = request.form.get('description', '')
-        is_public = request.form.get('isPublic', 'false').lower() == 'true'
-        tak_pref_file = request.form.get('takPrefFileLocation', '')
-
-        inject_callsign = request.form.get('injectCallsign', 'false').lower() == 'true'
-
-        profile = TakProfileModel.create_tak_profile(
-            name=name,
-            description=description,
-            is_public=is_public,
-            template_folder_location=folder_name,
-            pref_file_location=tak_pref_file,
-            inject_callsign=inject_callsign
-        )
-
-        # Add roles
-        role_ids = request.form.getlist('roleIds[]')
-        for role_id in role_ids:
-            role = UserRoleModel.get_by_id(int(role_id))
-            if role:
-                profile.roles.append(role)
-
-        # Clean up ZIP file
-        os.remove(zip_path)
+        options = profile_options_from_form(request.form)
+        options.setdefault('isPublic', False)
+        options.setdefault('injectCallsign', False)
+        # The upload is already spooled to a temporary file; extract straight from it
+        profile, _ = datapackage_uploads.install_package(file.stream, file.filename, options)
 
         return jsonify({
             'message': 'TAK profile created successfully',
@@ -426,6 +373,8 @@ def create_tak_profile():
             }
         }), 201
 
+    except PackageError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Failed to create TAK profile: {str(e)}'}), 400
 
@@ -443,50 +392,152 @@ def update_tak_profile(profile_id):
         return jsonify({'error': 'TAK profile not found'}), 404
 
     try:
-        # Handle file upload if provided
-        if 'datapackage' in request.files:
-            file = request.files['datapackage']
-            if file.filename:
-                # Process new datapackage similar to create
-                filename = secure_filename(file.filename)
-                folder_name = filename.replace('.zip', '')
-                # ... (similar upload logic)
-
-        # Update fields from form data
-        if request.form.get('name'):
-            profile.name = request.form.get('name')
-        if 'description' in request.form:
-            profile.description = request.form.get('description')
-        if 'isPublic' in request.form:
-            profile.isPublic = request.form.get('isPublic').lower() == 'true'
-        if 'takPrefFileLocation' in request.form:
-            profile.takPrefFileLocation = request.form.get('takPrefFileLocation')
-        if 'injectCallsign' in request.form:
-            profile.injectCallsign = request.form.get('injectCallsign').lower() == 'true'
-
-        # Update roles if roleIds[] is present in the request
-        if 'roleIds[]' in request.form or request.form:
-            profile.roles.clear()
-            role_ids = request.form.getlist('roleIds[]')
-            for role_id in role_ids:
-                role = UserRoleModel.get_by_id(int(role_id))
-                if role:
-                    profile.roles.append(role)
-
-        # Commit directly to ensure relationship changes are saved
-        db.session.commit()
+        options = profile_options_from_form(request.form)
+        # The form always carries the role selection, an empty one clears the roles
+        if request.form and 'roleIds' not in options:
+            options['roleIds'] = []
+
+        file = request.files.get('datapackage')
+        if file and file.filename:
+            if not file.filename.endswith('.zip'):
+                return jsonify({'error': 'File must be a ZIP archive'}), 400
+            # Extracts into a new folder, switches the profile over and removes the old one
+            datapackage_uploads.install_package(file.stream, file.filename, options, profile)
+        else:
+            datapackage_uploads.apply_options(profile, options)
+            db.session.commit()
 
         return jsonify({'message': 'TAK profile updated successfully'}), 200
 
+    except PackageError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Failed to update TAK profile: {str(e)}'}), 400
 
 
+@api_v1.route('/tak-profiles/uploads', methods=['POST'])
+@jwt_required()
+def create_tak_profile_upload():
+    """
+    Start a chunked data package upload (admin only)
+
+    Body: {filename, size, profileId (replace that profile's package, optional),
+    name, description, isPublic, takPrefFileLocation, injectCallsign, roleIds}
+    """
+    error = require_admin_role()
+    if error:
+        return error
+
+    data = request.get_json() or {}
+    profile = None
+    if data.get('profileId') is not None:
+        profile = TakProfileModel.get_tak_profile_by_id(data['profileId'])
+        if not profile:
+            return jsonify({'error': 'TAK profile not found'}), 404
+
+    try:
+        options = normalize_profile_options(data)
+        user = UserModel.get_user_by_id(get_jwt().get('sub'))
+        upload = datapackage_uploads.create_upload(
+            data.get('filename'), data.get('size'), options, profile=profile,
+            created_by=user.username if user else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(upload.to_dict()), 201
+
+
+@api_v1.route('/tak-profiles/uploads/<int:upload_id>', methods=['GET'])
+@jwt_required()
+def get_tak_profile_upload(upload_id):
+    """Progress of a chunked upload; 'received' is the offset of the next chunk (admin only)"""
+    error = require_admin_role()
+    if error:
+        return error
+
+    upload = DatapackageUploadModel.get_by_id(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload.to_dict()), 200
+
+
+@api_v1.route('/tak-profiles/uploads/<int:upload_id>', methods=['PUT'])
+@jwt_required()
+def put_tak_profile_upload_chunk(upload_id):
+    """Write the request body at ?offset= (admin only). A wrong offset returns 409 with the expected one."""
+    error = require_admin_role()
+    if error:
+        return error
+
+    upload = DatapackageUploadModel.get_by_id(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({'error': 'offset is required'}), 400
+
+    try:
+        datapackage_uploads.write_chunk(upload, offset, request.stream)
+    except UploadOffsetError as e:
+        return jsonify({'error': str(e), 'offset': e.expected}), 409
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 409 if upload.status != 'uploading' else 400
+
+    return jsonify(upload.to_dict()), 200
+
+
+@api_v1.route('/tak-profiles/uploads/<int:upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_tak_profile_upload(upload_id):
+    """Extract a fully received upload in the background; poll GET for the outcome (admin only)"""
+    error = require_admin_role()
+    if error:
+        return error
+
+    upload = DatapackageUploadModel.get_by_id(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    try:
+        datapackage_uploads.complete(upload)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 409
+
+    return jsonify(upload.to_dict()), 202
+
+
+@api_v1.route('/tak-profiles/uploads/<int:upload_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_tak_profile_upload(upload_id):
+    """Abandon an upload and delete the received data (admin only)"""
+    error = require_admin_role()
+    if error:
+        return error
+
+    upload = DatapackageUploadModel.get_by_id(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    if upload.status == 'processing':
+        return jsonify({'error': 'Upload is being processed'}), 409
+
+    datapackage_uploads.cancel(upload)
+    return jsonify({'message': 'Upload cancelled'}), 200
+
+
 @api_v1.route('/tak-profiles/<int:profile_id>/files', methods=['GET'])
 @jwt_required()
 def get_tak_profile_files(profile_id):
-    """Get file tree structure for TAK profile (admin or readonly)"""
+    """
+    Get file tree structure for TAK profile (admin or readonly)
+
+    Served from the package manifest with an ETag. ?path= returns one
+    directory and ?depth= limits how deep it is expanded; deeper directories
+    have children null and hasChildren set, to be fetched with ?path=.
+    """
     error = require_view_role()
     if error:
         return error
@@ -495,42 +546,65 @@ def get_tak_profile_files(profile_id):
     if not profile:
         return jsonify({'error': 'TAK profile not found'}), 404
 
-    def make_tree(path, base_path=''):
-        """Recursively build file tree structure"""
-        tree = {'name': os.path.basename(path), 'path': base_path, 'children': [], 'isDir': True}
-        try:
-            items = os.listdir(path)
-            for name in sorted(items):
-                full_path = os.path.join(path, name)
-                relative_path = os.path.join(base_path, name) if base_path else name
-
-                if os.path.isdir(full_path):
-                    tree['children'].append(make_tree(full_path, relative_path))
-                else:
-                    tree['children'].append({
-                        'name': name,
-                        'path': relative_path,
-                        'isDir': False
-                    })
-        except OSError:
-            pass
-        return tree
+    path = normalize_path(request.args.get('path', ''))
+    try:
+        depth = int(request.args['depth']) if request.args.get('depth') else None
+    except ValueError:
+        return jsonify({'error': 'depth must be a number'}), 400
 
     try:
-        if profile.takTemplateFolderLocation:
-            folder_path = os.path.join(DATAPACKAGE_UPLOAD_FOLDER, profile.takTemplateFolderLocation)
-            if os.path.exists(folder_path):
-                file_tree = make_tree(folder_path)
-                return jsonify({'fileTree': file_tree}), 200
-            else:
-                return jsonify({'error': 'Profile folder not found'}), 404
-        else:
+        if not profile.takTemplateFolderLocation:
             return jsonify({'error': 'No folder location specified'}), 404
+        if not os.path.exists(os.path.join(DATAPACKAGE_UPLOAD_FOLDER, profile.takTemplateFolderLocation)):
+            return jsonify({'error': 'Profile folder not found'}), 404
+
+        tree = file_trees.get_tree(profile)
+        etag = hashlib.sha256(
+            f'{profile.contentHash}\0{profile.takTemplateFolderLocation}\0{path}\0{depth}'.encode()
+        ).hexdigest()[:32]
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            node = subtree(tree, path, depth)
+            if node is None:
+                return jsonify({'error': 'Path not found'}), 404
+            response = jsonify({'fileTree': node, 'contentHash': profile.contentHash})
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
 
     except Exception as e:
         return jsonify({'error': f'Failed to get file tree: {str(e)}'}), 400
 
 
+@api_v1.route('/tak-profiles/storage', methods=['GET'])
+@jwt_required()
+def get_tak_profile_storage():
+    """Blob store usage: blobs, bytes stored, bytes the profiles reference and bytes saved (admin only)"""
+    error = require_admin_role()
+    if error:
+        return error
+
+    return jsonify(datapackage_store.stats()), 200
+
+
+@api_v1.route('/tak-profiles/<int:profile_id>/verify', methods=['GET'])
+@jwt_required()
+def verify_tak_profile(profile_id):
+    """Check the profile's files against its manifest; ?full=true also compares hashes (admin only)"""
+    error = require_admin_role()
+    if error:
+        return error
+
+    profile = TakProfileModel.get_tak_profile_by_id(profile_id)
+    if not profile:
+        return jsonify({'error': 'TAK profile not found'}), 404
+
+    full = request.args.get('full', 'false').lower() == 'true'
+    problems = datapackage_store.verify_profile(profile, full=full)
+    return jsonify({'ok': not problems, 'contentHash': profile.contentHash, 'problems': problems}), 200
+
+
 @api_v1.route('/tak-profiles/<int:profile_id>', methods=['DELETE'])
 @jwt_required()
 def delete_tak_profile(profile_id):
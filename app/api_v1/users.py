@@ -6,10 +6,12 @@ CRUD operations for user management
 from flask import request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt
 from app.api_v1 import api_v1
-from app.models import UserModel, UserRoleModel, OTSGroupModel, GroupUserAssociation, db
+from app.models import GroupUserAssociation, UserModel, UserRoleModel, db
 from app.ots import OTSClient
+from app.services.group_membership import GroupMembershipService, desired_groups_from_request
 from app.settings import OTS_URL, OTS_USERNAME, OTS_PASSWORD, OTS_VERIFY_SSL
 from datetime import datetime
+from sqlalchemy.orm import selectinload
 def require_admin_role():
     """Check for user_admin or administrator role (write access)"""
     from app.rbac import has_any_role
@@ -72,7 +74,10 @@ def get_users():
         )
 
     total = query.count()
-    users = query.offset((page - 1) * per_page).limit(per_page).all()
+    users = query.options(
+        selectinload(UserModel.roles),
+        selectinload(UserModel.group_associations).joinedload(GroupUserAssociation.group)
+    ).offset((page - 1) * per_page).limit(per_page).all()
 
     return jsonify({
         'users': [{
@@ -93,6 +98,184 @@ def get_users():
     }), 200
 
 
+@api_v1.route('/users/expired', methods=['GET'])
+@jwt_required()
+def get_expired_users():
+    """
+    Preview of the expired accounts the next removal run will delete (dry run)
+
+    Query parameters:
+    - limit: int (default: 100) number of users to list
+
+    Response:
+    {
+        "total": "int",
+        "users": [{"id": "int", "username": "string", "expiryDate": "string", "previousFailure": {...}}],
+        "lastRun": {...}
+    }
+    """
+    error = require_view_role()
+    if error:
+        return error
+
+    from app.services.account_expiry import account_expiry
+    limit = max(1, min(request.args.get('limit', 100, type=int) or 100, 1000))
+    total, users = account_expiry.preview(limit=limit)
+
+    return jsonify({
+        'total': total,
+        'users': users,
+        'lastRun': account_expiry.get_progress()
+    }), 200
+
+
+@api_v1.route('/users/bulk', methods=['POST'])
+@jwt_required()
+def create_bulk_user_job():
+    """
+    Apply one operation to many users in the background (admin only)
+
+    Request body:
+    {
+        "operation": "add_role|remove_role|add_group|remove_group|set_expiry|deactivate|delete",
+        "userIds": [int] or "filter": {"search": "string", "roleId": int, "groupId": int},
+        "params": {"roleId": int} | {"groupId": int, "direction": "IN|OUT|BOTH"} | {"expiryDate": "ISO8601 string or null"}
+    }
+
+    Response (202): {"job": {...}} - poll GET /users/bulk/<id> for progress
+    """
+    error = require_admin_role()
+    if error:
+        return error
+
+    from app.services.bulk_users import bulk_users
+
+    data = request.get_json() or {}
+    actor = UserModel.get_user_by_id(int(get_jwt().get('sub')))
+    try:
+        user_ids = bulk_users.select_user_ids(data.get('userIds'), data.get('filter'))
+        job = bulk_users.create_job(
+            data.get('operation'), data.get('params'), user_ids,
+            created_by=actor.username if actor else None,
+            actor_id=actor.id if actor else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    bulk_users.start(job)
+    current_app.logger.info(f"Bulk job {job.id} ({job.operation}) queued for {job.total} users by {job.created_by}")
+    return jsonify({'job': job.to_dict(include_errors=False)}), 202
+
+
+@api_v1.route('/users/import', methods=['POST'])
+@jwt_required()
+def import_users():
+    """
+    Create users from an uploaded CSV or XLSX file (admin only)
+
+    Form data:
+    - file: .csv or .xlsx with the columns username, email, firstName, lastName,
+      callsign, password (optional), roles (names separated by ';'),
+      groups ('name' or 'name:IN|OUT|BOTH' separated by ';'), expiryDate (optional)
+    - sendWelcomeEmail: true/false (default: false)
+    - dryRun: true/false (default: false) only validate the file
+
+    Every row is validated first; if any row is invalid nothing is imported
+    and the response (400) lists the errors per row. Otherwise the import runs
+    in the background.
+
+    Response (202): {"job": {...}} - poll GET /users/bulk/<id> for progress
+    """
+    error = require_admin_role()
+    if error:
+        return error
+
+    from app.services.user_import import iter_rows, user_import
+
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'file is required'}), 400
+    send_welcome_email = request.form.get('sendWelcomeEmail', 'false').lower() == 'true'
+    dry_run = request.form.get('dryRun', 'false').lower() == 'true'
+
+    try:
+        rows, errors = user_import.validate(iter_rows(upload.filename, upload.stream))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Could not read file: {str(e)}'}), 400
+
+    if errors:
+        return jsonify({'error': 'The file contains invalid rows, nothing was imported', 'valid': len(rows),
+                        'rowErrors': errors}), 400
+    if not rows:
+        return jsonify({'error': 'The file contains no users'}), 400
+    if dry_run:
+        return jsonify({'valid': len(rows), 'rowErrors': []}), 200
+
+    try:
+        job = user_import.create_job(upload.filename, rows, send_welcome_email, actor_id=int(get_jwt().get('sub')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    user_import.start(job)
+    current_app.logger.info(f"Import job {job.id} queued for {job.total} users from {upload.filename} by {job.created_by}")
+    return jsonify({'job': job.to_dict(include_errors=False)}), 202
+
+
+@api_v1.route('/users/import/<int:job_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_user_import(job_id):
+    """Continue an interrupted import and retry its failed rows (admin only)"""
+    error = require_admin_role()
+    if error:
+        return error
+
+    from app.models import BulkUserJobModel
+    from app.services.user_import import user_import
+
+    job = BulkUserJobModel.get_by_id(job_id)
+    if not job:
+        return jsonify({'error': 'Bulk job not found'}), 404
+    if job.status == 'running' and request.args.get('force', 'false').lower() != 'true':
+        return jsonify({'error': 'Import is still running, pass force=true if it was interrupted'}), 409
+    try:
+        user_import.resume(job)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    user_import.start(job)
+    return jsonify({'job': job.to_dict(include_errors=False)}), 202
+
+
+@api_v1.route('/users/bulk', methods=['GET'])
+@jwt_required()
+def get_bulk_user_jobs():
+    """Most recent bulk user jobs, newest first"""
+    error = require_view_role()
+    if error:
+        return error
+
+    from app.models import BulkUserJobModel
+    limit = max(1, min(request.args.get('limit', 20, type=int) or 20, 100))
+    return jsonify({
+        'jobs': [job.to_dict(include_errors=False) for job in BulkUserJobModel.get_recent(limit)]
+    }), 200
+
+
+@api_v1.route('/users/bulk/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_bulk_user_job(job_id):
+    """Progress and per-user errors of a bulk user job"""
+    error = require_view_role()
+    if error:
+        return error
+
+    from app.models import BulkUserJobModel
+    job = BulkUserJobModel.get_by_id(job_id)
+    if not job:
+        return jsonify({'error': 'Bulk job not found'}), 404
+    return jsonify({'job': job.to_dict()}), 200
+
+
 @api_v1.route('/users/<int:user_id>', methods=['GET'])
 @jwt_required()
 def get_user(user_id):
@@ -227,29 +410,9 @@ def create_user():
                     user.roles.append(role)
 
         # Add OTS groups with direction
-        if data.get('groups'):
-            for g in data['groups']:
-                group = OTSGroupModel.get_by_id(g['id'])
-                if group:
-                    assoc = GroupUserAssociation(group_id=group.id, user_id=user.id, direction=g.get('direction', 'BOTH'))
-                    db.session.add(assoc)
-                    directions = ['IN', 'OUT'] if assoc.direction == 'BOTH' else [assoc.direction]
-                    for d in directions:
-                        try:
-                            ots.add_user_to_group(data['username'], group.name, direction=d)
-                        except Exception as e:
-                            current_app.logger.error(f"Failed to add {data['username']} to OTS group {group.name} {d}: {e}")
-        elif data.get('groupIds'):
-            for gid in data['groupIds']:
-                group = OTSGroupModel.get_by_id(gid)
-                if group:
-                    assoc = GroupUserAssociation(group_id=group.id, user_id=user.id, direction='BOTH')
-                    db.session.add(assoc)
-                    for d in ('IN', 'OUT'):
-                        try:
-                            ots.add_user_to_group(data['username'], group.name, direction=d)
-                        except Exception as e:
-                            current_app.logger.error(f"Failed to add {data['username']} to OTS group {group.name} {d}: {e}")
+        desired_groups = desired_groups_from_request(data)
+        if desired_groups:
+            GroupMembershipService.reconcile(data['username'], desired_groups, user=user)
 
         db.session.commit()
 
@@ -328,55 +491,11 @@ def update_user(user_id):
                 user.expiryDate = None
 
         if 'groups' in data or 'groupIds' in data:
-            old_assocs = {a.group_id: a.direction for a in user.group_associations}
-
-            new_groups_list = data.get('groups', [{'id': gid, 'direction': 'BOTH'} for gid in data.get('groupIds', [])])
-            new_assocs = {g['id']: g.get('direction', 'BOTH') for g in new_groups_list}
-
-            added = set(new_assocs.keys()) - set(old_assocs.keys())
-            removed = set(old_assocs.keys()) - set(new_assocs.keys())
-            changed = {gid for gid in set(new_assocs.keys()) & set(old_assocs.keys()) if new_assocs[gid] != old_assocs[gid]}
-
-            GroupUserAssociation.query.filter_by(user_id=user.id).delete()
-            for g in new_groups_list:
-                group = OTSGroupModel.get_by_id(g['id'])
-                if group:
-                    assoc = GroupUserAssociation(group_id=group.id, user_id=user.id, direction=g.get('direction', 'BOTH'))
-                    db.session.add(assoc)
-
             try:
-                ots = OTSClient(OTS_URL, OTS_USERNAME, OTS_PASSWORD)
-                for gid in added | changed:
-                    group = OTSGroupModel.get_by_id(gid)
-                    if group:
-                        new_dir = new_assocs[gid]
-                        directions = ['IN', 'OUT'] if new_dir == 'BOTH' else [new_dir]
-                        old_dir = old_assocs.get(gid)
-                        if old_dir:
-                            old_dirs = ['IN', 'OUT'] if old_dir == 'BOTH' else [old_dir]
-                            for d in old_dirs:
-                                if d not in directions:
-                                    try:
-                                        ots.remove_user_from_group(user.username, group.name, direction=d)
-                                    except Exception as e:
-                                        current_app.logger.error(f"Failed to remove {user.username} from OTS group {group.name} {d}: {e}")
-                        for d in directions:
-                            try:
-                                ots.add_user_to_group(user.username, group.name, direction=d)
-                            except Exception as e:
-                                current_app.logger.error(f"Failed to add {user.username} to OTS group {group.name} {d}: {e}")
-                for gid in removed:
-                    group = OTSGroupModel.get_by_id(gid)
-                    if group:
-                        old_dir = old_assocs[gid]
-                        directions = ['IN', 'OUT'] if old_dir == 'BOTH' else [old_dir]
-                        for d in directions:
-                            try:
-                                ots.remove_user_from_group(user.username, group.name, direction=d)
-                            except Exception as e:
-                                current_app.logger.error(f"Failed to remove {user.username} from OTS group {group.name} {d}: {e}")
-            except Exception as e:
-                current_app.logger.error(f"Failed to sync OTS groups for {user.username}: {e}")
+                GroupMembershipService.reconcile(user.username, desired_groups_from_request(data), user=user)
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({'error': str(e)}), 400
 
     # Handle password reset (admin only)
     password_changed = False
@@ -0,0 +1,116 @@
+"""
+Flask CLI commands
+
+    flask seed dataset          Bulk-generate a large dataset for scale testing (see app/seed.py)
+    flask datapackages dedupe   Move existing TAK profile folders into the blob store
+    flask datapackages gc       Remove unreferenced blobs and cached archives
+    flask datapackages verify   Rehash the blob store and check profile folders
+"""
+
+import time
+
+import click
+from flask.cli import AppGroup
+
+seed_cli = AppGroup('seed', help='Generate test data.')
+datapackages_cli = AppGroup('datapackages', help='Maintain the TAK profile data package store.')
+
+
+@seed_cli.command('dataset')
+@click.option('--users', default=10000, show_default=True, help='Users, each with roles and OTS groups.')
+@click.option('--roles', default=20, show_default=True)
+@click.option('--groups', default=50, show_default=True, help='OTS groups.')
+@click.option('--profiles', default=50, show_default=True, help='TAK profiles with role and user assignments.')
+@click.option('--radios', default=2000, show_default=True)
+@click.option('--channels', default=1000, show_default=True, help='Meshtastic channels.')
+@click.option('--channel-groups', default=200, show_default=True, help='Meshtastic channel groups.')
+@click.option('--announcements', default=100, show_default=True)
+@click.option('--read-fraction', default=0.3, show_default=True, help='Share of users that read each announcement.')
+@click.option('--pending', default=500, show_default=True, help='Pending registrations.')
+@click.option('--prefix', default='seed', show_default=True, help='Lowercase alphanumeric prefix for generated names.')
+@click.option('--seed', 'random_seed', default=42, show_default=True, help='Random seed.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per INSERT batch.')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def seed_dataset(users, roles, groups, profiles, radios, channels, channel_groups, announcements,
+                 read_fraction, pending, prefix, random_seed, batch_size, yes):
+    """Bulk-insert a reproducible dataset. Use a dedicated database."""
+    from flask import current_app
+    from sqlalchemy.engine import make_url
+    from app.seed import generate_dataset
+
+    if not yes:
+        database = make_url(current_app.config['SQLALCHEMY_DATABASE_URI']).render_as_string(hide_password=True)
+        click.confirm(f"Insert {users} users and related rows into {database}?", abort=True)
+    started = time.monotonic()
+    try:
+        counts = generate_dataset(
+            users=users, roles=roles, groups=groups, profiles=profiles, radios=radios, channels=channels,
+            channel_groups=channel_groups, announcements=announcements, read_fraction=read_fraction,
+            pending=pending, prefix=prefix, seed=random_seed, batch_size=batch_size
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for table, count in counts.items():
+        click.echo(f"  {table:<36} {count:>8}")
+    click.echo(f"Inserted {sum(counts.values())} rows in {time.monotonic() - started:.1f}s")
+
+
+@datapackages_cli.command('dedupe')
+@click.option('--all', 'all_profiles', is_flag=True, help='Also profiles that already have a manifest.')
+def datapackages_dedupe(all_profiles):
+    """
+    Hash the folders of profiles without a manifest and link their files to the blob store.
+
+    Linked files share storage with every profile using the same content, so
+    do not edit them in place on disk afterwards; replace them instead.
+    """
+    from app.models import TakProfileModel
+    from app.services.datapackage_store import datapackage_store
+
+    query = TakProfileModel.query.filter(TakProfileModel.takTemplateFolderLocation.isnot(None))
+    if not all_profiles:
+        query = query.filter(TakProfileModel.contentHash.is_(None))
+    for profile in query.all():
+        try:
+            files = datapackage_store.adopt_profile(profile)
+            click.echo(f"  {profile.name}: {len(files)} files")
+        except OSError as e:
+            click.echo(f"  {profile.name}: skipped ({e})")
+    stats = datapackage_store.stats()
+    click.echo(f"{stats['blobs']} blobs, {stats['storedBytes']} bytes stored, {stats['savedBytes']} bytes saved")
+
+
+@datapackages_cli.command('gc')
+@click.option('--grace', default=3600, show_default=True, help='Keep unreferenced files younger than this many seconds.')
+def datapackages_gc(grace):
+    """Remove blobs and cached archives no profile uses."""
+    from app.services.datapackage_store import datapackage_store
+
+    removed = datapackage_store.collect_garbage(grace_seconds=grace)
+    click.echo(f"Removed {removed['blobs']} blobs and {removed['archives']} archives ({removed['bytes']} bytes)")
+
+
+@datapackages_cli.command('verify')
+@click.option('--repair', is_flag=True, help='Remove corrupt blobs from the store.')
+@click.option('--full', is_flag=True, help='Also rehash every profile file.')
+def datapackages_verify(repair, full):
+    """Rehash every blob and check each profile folder against its manifest."""
+    from app.models import TakProfileModel
+    from app.services.datapackage_store import datapackage_store
+
+    result = datapackage_store.verify_blobs(repair=repair)
+    for blob in result['corrupt']:
+        click.echo(f"  corrupt blob {blob['sha256']} (profiles {blob['profiles']})")
+    failed = bool(result['corrupt'])
+    for profile in TakProfileModel.query.filter(TakProfileModel.contentHash.isnot(None)).all():
+        for problem in datapackage_store.verify_profile(profile, full=full):
+            click.echo(f"  {profile.name}: {problem['path']} {problem['problem']}")
+            failed = True
+    click.echo(f"Checked {result['checked']} blobs, {len(result['corrupt'])} corrupt")
+    if failed:
+        raise click.ClickException('Data package store has problems')
+
+
+def init_cli(app):
+    app.cli.add_command(seed_cli)
+    app.cli.add_command(datapackages_cli)
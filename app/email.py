@@ -6,6 +6,7 @@ from app.settings import MAIL_DEFAULT_SENDER, FRONTEND_URL, MAIL_ENABLED
 
 DEFAULT_BRAND_NAME = 'My OTS Portal'
 from app.models import SystemSettingsModel
+from app.metrics import emails_total
 import logging
 
 
@@ -23,11 +24,12 @@ def get_brand_name():
 
 
 def get_logo_url():
-    """Get logo URL for emails"""
+    """Get logo URL for emails, the small PNG email variant when there is one"""
     try:
         enabled = SystemSettingsModel.get_setting('custom_logo_enabled')
         if enabled and str(enabled).lower() == 'true':
-            path = SystemSettingsModel.get_setting('custom_logo_path')
+            from app.services.logo_variants import variant_urls
+            path = variant_urls().get('email') or SystemSettingsModel.get_setting('custom_logo_path')
             if path:
                 return f"{FRONTEND_URL}{path}"
     except Exception:
@@ -39,6 +41,7 @@ def send_html_email(subject, recipients, message, title=None, template="email_de
     # Skip if email is disabled
     if not MAIL_ENABLED:
         logging.info(f"Email disabled - skipping email to {recipients} with subject '{subject}'")
+        emails_total.inc('skipped')
         return
 
     if not title:
@@ -53,6 +56,8 @@ def send_html_email(subject, recipients, message, title=None, template="email_de
 
     try:
         mail.send(msg)
+        emails_total.inc('sent')
         logging.info(f"Email sent to {recipients} with subject '{subject}'")
     except Exception as e:
+        emails_total.inc('failed')
         logging.error(f"Failed to send email to {recipients} with subject '{subject}': {e}")
@@ -8,4 +8,10 @@ class BadRequestError(Exception):
     pass
 
 class CSRFError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class OTSUnavailableError(ConnectionError):
+    """Raised without contacting OTS while the circuit breaker is open"""
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
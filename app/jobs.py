@@ -1,27 +1,31 @@
 from app.extensions import scheduler
-from app.models import UserModel, AnnouncementModel, OneTimeTokenModel, db
-from datetime import datetime, timedelta
-from app.ots import otsClient
+from app.models import AnnouncementModel, db
+from datetime import datetime
+from app.settings import ACCOUNT_EXPIRY_ENABLED, OTS_GROUP_SYNC_INTERVAL_MINUTES
 import os
 import shutil
 import time
 
 
-@scheduler.task(id="remove_expired_accounts", trigger="cron", hour=1, misfire_grace_time=3600, max_instances=1)
-#@scheduler.task(id="remove_expired_accounts", trigger="interval", seconds=1) #DEBUG
 def remove_expired_accounts():
+    """Remove expired accounts from OTS and the portal in batches"""
+    from app.services.account_expiry import account_expiry
     print('Removing expired accounts...')
     with scheduler.app.app_context():
-        today = datetime.now()
-        expired_users = UserModel.query.filter(UserModel.expiryDate < today).all()
-        for user in expired_users:
-            print(f"Removing user {user.username} with expiry date {user.expiryDate}")
-            otsClient.delete_user(user.username)
-            db.session.delete(user)
-        db.session.commit()
+        try:
+            progress = account_expiry.run()
+            print(f"Expired accounts: {progress['deleted']} removed, {progress['failed_count']} failed ({progress['status']})")
+        except Exception as e:
+            print(f"Expired account removal failed: {e}")
     return
 
 
+# Deletes users from OTS and the portal, so it only runs when enabled explicitly
+if ACCOUNT_EXPIRY_ENABLED:
+    scheduler.task(id="remove_expired_accounts", trigger="cron", hour=1,
+                   misfire_grace_time=3600, max_instances=1)(remove_expired_accounts)
+
+
 @scheduler.task(id="send_scheduled_announcements", trigger="interval", minutes=1, misfire_grace_time=60, max_instances=1)
 def send_scheduled_announcements():
     """Check for and send scheduled announcements"""
@@ -50,7 +54,7 @@ def send_scheduled_announcements():
 
 @scheduler.task(id="cleanup_temp_downloads", trigger="interval", minutes=15, misfire_grace_time=120, max_instances=1)
 def cleanup_temp_downloads():
-    """Remove temp download directories older than 15 minutes and expired tokens"""
+    """Remove temp download directories older than 15 minutes"""
     from app.api_v1.tak_profiles import DOWNLOAD_TEMP_DIR
     cutoff = time.time() - (15 * 60)
     removed = 0
@@ -68,10 +72,74 @@ def cleanup_temp_downloads():
     if removed:
         print(f"Cleaned up {removed} temp download directories")
 
+
+@scheduler.task(id="cleanup_stale_datapackage_uploads", trigger="interval", hours=1, misfire_grace_time=600, max_instances=1)
+def cleanup_stale_datapackage_uploads():
+    """Remove chunked data package uploads that were abandoned before completion"""
+    from app.services.datapackage_upload import datapackage_uploads
+    with scheduler.app.app_context():
+        removed = datapackage_uploads.cleanup_stale()
+        if removed:
+            print(f"Cleaned up {removed} abandoned data package uploads")
+
+
+@scheduler.task(id="collect_datapackage_garbage", trigger="cron", hour=3, misfire_grace_time=3600, max_instances=1)
+def collect_datapackage_garbage():
+    """Remove data package blobs and cached archives no profile uses any more"""
+    from app.services.datapackage_store import datapackage_store
+    with scheduler.app.app_context():
+        try:
+            removed = datapackage_store.collect_garbage()
+            if removed['blobs'] or removed['archives']:
+                print(f"Data package store: removed {removed['blobs']} blobs and {removed['archives']} archives ({removed['bytes']} bytes)")
+        except Exception as e:
+            print(f"Data package garbage collection failed: {e}")
+
+
+@scheduler.task(id="cleanup_expired_records", trigger="interval", minutes=15, misfire_grace_time=120, max_instances=1)
+def cleanup_expired_records():
+    """Delete expired one-time tokens, kiosk sessions and pending registrations, purge old import passwords"""
+    from app.services.cleanup import run_expired_cleanup
+    with scheduler.app.app_context():
+        results = run_expired_cleanup()
+        if any(results.values()):
+            print("Cleaned up expired records: " + ", ".join(f"{count} {table}" for table, count in results.items()))
+
+
+@scheduler.task(id="sweep_qr_token_cache", trigger="interval", minutes=5, misfire_grace_time=120, max_instances=1)
+def sweep_qr_token_cache():
+    """Remove expired entries from the QR token cache"""
+    from app.services.qr_token_cache import qr_token_cache
+    with scheduler.app.app_context():
+        removed = qr_token_cache.sweep()
+        if removed:
+            print(f"Swept {removed} expired QR token cache entries")
+
+
+def sync_ots_groups():
+    """Pull group changes from OTS on a schedule"""
+    from app.services.ots_group_sync import ots_group_sync
+    print('Syncing groups from OTS...')
+    with scheduler.app.app_context():
+        try:
+            ots_group_sync.sync()
+        except Exception as e:
+            print(f"Scheduled OTS group sync failed: {e}")
+
+
+if OTS_GROUP_SYNC_INTERVAL_MINUTES > 0:
+    scheduler.task(id="sync_ots_groups", trigger="interval", minutes=OTS_GROUP_SYNC_INTERVAL_MINUTES,
+                   misfire_grace_time=300, max_instances=1)(sync_ots_groups)
+
+
+@scheduler.task(id="warm_oidc_metadata", trigger="interval", minutes=30, next_run_time=datetime.now(),
+                misfire_grace_time=300, max_instances=1)
+def warm_oidc_metadata():
+    """Fetch OIDC discovery documents and JWKS at startup and keep them fresh"""
+    from app.models import OIDCProviderModel
+    from app.services.oidc_metadata import oidc_metadata
     with scheduler.app.app_context():
-        expired = OneTimeTokenModel.query.filter(
-            OneTimeTokenModel.expires_at < datetime.now()
-        ).delete()
-        db.session.commit()
-        if expired:
-            print(f"Cleaned up {expired} expired download tokens")
+        providers = OIDCProviderModel.query.filter_by(enabled=True).all()
+        if providers:
+            warmed = oidc_metadata.warm(providers)
+            print(f"Warmed OIDC metadata for {warmed}/{len(providers)} provider(s)")
@@ -0,0 +1,238 @@
+"""
+Prometheus metrics
+
+A small in-process registry rendered in the Prometheus text exposition
+format at /metrics (see init_metrics), which requires
+"Authorization: Bearer <METRICS_TOKEN>"; without a token metrics are off.
+Collected:
+
+- HTTP requests: count and latency per Flask endpoint, method and status
+- Database: queries and query time per request, from SQLAlchemy cursor events
+- OTS: call latency per OTS endpoint, from the histograms kept by app.ots
+- Scheduler: job run durations and failures, from APScheduler events
+- Email: messages sent, failed and skipped
+
+Counters are per worker process, as with prometheus_client without
+multiprocess mode.
+"""
+
+import bisect
+import hmac
+import threading
+import time
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count], sum
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            lines.extend(render_histogram_series(self.name, self.labelnames, labels, self.buckets, counts, total))
+        return lines
+
+
+def render_histogram_series(name, labelnames, labels, buckets, counts, total):
+    """Lines of one histogram series from per-bucket (non-cumulative) counts"""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(list(buckets) + [float('inf')], counts):
+        cumulative += count
+        le = [('le', _format_value(float(bound)))]
+        lines.append(f'{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}')
+    lines.append(f'{name}_sum{_format_labels(labelnames, labels)} {_format_value(float(total))}')
+    lines.append(f'{name}_count{_format_labels(labelnames, labels)} {cumulative}')
+    return lines
+
+
+http_requests_total = Counter(
+    'portal_http_requests_total', 'HTTP requests handled', ('endpoint', 'method', 'status'))
+http_request_duration = Histogram(
+    'portal_http_request_duration_seconds', 'HTTP request latency', ('endpoint', 'method'))
+db_queries_per_request = Histogram(
+    'portal_db_queries_per_request', 'Database queries issued per HTTP request', ('endpoint',),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250))
+db_time_per_request = Histogram(
+    'portal_db_time_per_request_seconds', 'Database time spent per HTTP request', ('endpoint',))
+db_queries_total = Counter(
+    'portal_db_queries_total', 'Database queries issued, including outside requests')
+job_duration = Histogram(
+    'portal_scheduler_job_duration_seconds', 'Scheduled job run duration', ('job', 'outcome'),
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600))
+emails_total = Counter(
+    'portal_emails_total', 'Emails by delivery outcome (sent, failed, skipped)', ('outcome',))
+
+REGISTRY = [
+    http_requests_total, http_request_duration, db_queries_per_request, db_time_per_request,
+    db_queries_total, job_duration, emails_total,
+]
+
+
+def _render_ots_metrics():
+    """OTS call latency, rendered from the histograms app.ots already keeps"""
+    from app.ots import LatencyHistogram, ots_call_metrics
+
+    name = 'portal_ots_request_duration_seconds'
+    lines = [f'# HELP {name} OTS API call latency', f'# TYPE {name} histogram']
+    errors = ['# HELP portal_ots_request_errors_total OTS API calls that failed or returned 5xx',
+              '# TYPE portal_ots_request_errors_total counter']
+    for endpoint, histogram in ots_call_metrics.histograms():
+        lines.extend(render_histogram_series(
+            name, ('endpoint',), (endpoint,), LatencyHistogram.BUCKETS, histogram['counts'], histogram['sum']))
+        errors.append(f'portal_ots_request_errors_total{_format_labels(("endpoint",), (endpoint,))} {histogram["errors"]}')
+    return lines + errors
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_render_ots_metrics())
+    return '\n'.join(lines) + '\n'
+
+
+# Request / database instrumentation
+# =============================================================================
+
+def _endpoint_label():
+    return request.url_rule.endpoint if request.url_rule else 'unmatched'
+
+
+def _before_request():
+    g.metrics_started = time.monotonic()
+    g.metrics_db_queries = 0
+    g.metrics_db_time = 0.0
+
+
+def _after_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    endpoint = _endpoint_label()
+    http_requests_total.inc(endpoint, request.method, str(response.status_code))
+    http_request_duration.observe(time.monotonic() - started, endpoint, request.method)
+    db_queries_per_request.observe(g.pop('metrics_db_queries', 0), endpoint)
+    db_time_per_request.observe(g.pop('metrics_db_time', 0.0), endpoint)
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_started', []).append(time.monotonic())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get('metrics_query_started')
+    elapsed = time.monotonic() - stack.pop() if stack else 0.0
+    db_queries_total.inc()
+    if has_request_context() and 'metrics_db_queries' in g:
+        g.metrics_db_queries += 1
+        g.metrics_db_time += elapsed
+
+
+# Scheduler instrumentation
+# =============================================================================
+
+_job_starts = {}
+_job_starts_lock = threading.Lock()
+
+
+def _on_job_submitted(event):
+    with _job_starts_lock:
+        for run_time in event.scheduled_run_times:
+            _job_starts[(event.job_id, run_time)] = time.monotonic()
+
+
+def _on_job_finished(event):
+    with _job_starts_lock:
+        started = _job_starts.pop((event.job_id, event.scheduled_run_time), None)
+    if started is not None:
+        job_duration.observe(time.monotonic() - started, event.job_id, 'error' if event.exception else 'success')
+
+
+def init_scheduler_metrics(scheduler):
+    from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED
+    scheduler.add_listener(_on_job_submitted, EVENT_JOB_SUBMITTED)
+    scheduler.add_listener(_on_job_finished, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+
+_engine_events_registered = False
+
+
+def init_metrics(app):
+    """Register request hooks, database events and the /metrics endpoint"""
+    global _engine_events_registered
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    if not app.config.get('METRICS_TOKEN'):
+        app.logger.warning("METRICS_TOKEN is not set, Prometheus metrics at /metrics are disabled")
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    if not _engine_events_registered:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _engine_events_registered = True
+
+    @app.route('/metrics')
+    def metrics():
+        expected = f"Bearer {current_app.config['METRICS_TOKEN']}"
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
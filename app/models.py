@@ -1,5 +1,7 @@
-from sqlalchemy import Integer, Table, Column, ForeignKey, DateTime, String, Text, Boolean, CheckConstraint, UniqueConstraint
-from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
+from sqlalchemy import BigInteger, Integer, Table, Column, ForeignKey, DateTime, String, Text, Boolean, CheckConstraint, UniqueConstraint, Index
+from sqlalchemy import exists, or_, select
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates, joinedload, selectinload
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from sqlalchemy.exc import IntegrityError
@@ -9,19 +11,42 @@ import datetime
 db = SQLAlchemy()
 migrate = Migrate()
 
+# Rows removed per DELETE statement by the expiry cleanups
+CLEANUP_CHUNK_SIZE = 1000
+
+
+def _delete_in_chunks(model, *criteria, chunk_size=CLEANUP_CHUNK_SIZE):
+    """
+    Delete the rows of model matching criteria with set-based DELETEs of at
+    most chunk_size rows, committing after each so locks stay short.
+    Returns the number of rows deleted.
+    """
+    deleted = 0
+    while True:
+        ids = [row_id for (row_id,) in db.session.query(model.id).filter(*criteria).limit(chunk_size).all()]
+        if not ids:
+            return deleted
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+        if len(ids) < chunk_size:
+            return deleted
+
 # Define the association table for the many-to-many relationship
 role_onboardingcode_association = Table(
     'role_onboardingcode_association',
     db.metadata,
-    Column('role_id', Integer, ForeignKey('user_roles.id')),
-    Column('onboardingcode_id', Integer, ForeignKey('onboardingcodes.id'))
+    Column('role_id', Integer, ForeignKey('user_roles.id'), primary_key=True),
+    Column('onboardingcode_id', Integer, ForeignKey('onboardingcodes.id'), primary_key=True),
+    Index('ix_role_onboardingcode_association_onboardingcode_id', 'onboardingcode_id', 'role_id')
 )
 
 user_onboardingcode_association = Table(
     'user_onboardingcode_association',
     db.metadata,
-    Column('user_id', Integer, ForeignKey('users.id')),
-    Column('onboardingcode_id', Integer, ForeignKey('onboardingcodes.id'))
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('onboardingcode_id', Integer, ForeignKey('onboardingcodes.id'), primary_key=True),
+    Index('ix_user_onboardingcode_association_onboardingcode_id', 'onboardingcode_id', 'user_id')
 )
 
 
@@ -29,15 +54,17 @@ user_onboardingcode_association = Table(
 user_takprofile_association = Table(
     'user_takprofile_association',
     db.metadata,
-    Column('user_id', Integer, ForeignKey('users.id')),
-    Column('takprofile_id', Integer, ForeignKey('takprofiles.id'))
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('takprofile_id', Integer, ForeignKey('takprofiles.id'), primary_key=True),
+    Index('ix_user_takprofile_association_takprofile_id', 'takprofile_id', 'user_id')
 )
 
 role_takprofile_association = Table(
     'role_takprofile_association',
     db.metadata,
-    Column('role_id', Integer, ForeignKey('user_roles.id')),
-    Column('takprofile_id', Integer, ForeignKey('takprofiles.id'))
+    Column('role_id', Integer, ForeignKey('user_roles.id'), primary_key=True),
+    Column('takprofile_id', Integer, ForeignKey('takprofiles.id'), primary_key=True),
+    Index('ix_role_takprofile_profile_role', 'takprofile_id', 'role_id')
 )
 
 
@@ -45,8 +72,9 @@ role_takprofile_association = Table(
 user_role_association = Table(
     'user_role_association',
     db.metadata,
-    Column('user_id', Integer, ForeignKey('users.id')),
-    Column('role_id', Integer, ForeignKey('user_roles.id'))
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('role_id', Integer, ForeignKey('user_roles.id'), primary_key=True),
+    Index('ix_user_role_association_role_id', 'role_id', 'user_id')
 )
 
 
@@ -54,30 +82,34 @@ user_role_association = Table(
 user_meshtastic_association = Table(
     'user_meshtastic_association',
     db.metadata,
-    Column('user_id', Integer, ForeignKey('users.id')),
-    Column('meshtastic_id', Integer, ForeignKey('meshtastic.id'))
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('meshtastic_id', Integer, ForeignKey('meshtastic.id'), primary_key=True),
+    Index('ix_user_meshtastic_association_meshtastic_id', 'meshtastic_id', 'user_id')
 )
 
 role_meshtastic_association = Table(
     'role_meshtastic_association',
     db.metadata,
-    Column('role_id', Integer, ForeignKey('user_roles.id')),
-    Column('meshtastic_id', Integer, ForeignKey('meshtastic.id'))
+    Column('role_id', Integer, ForeignKey('user_roles.id'), primary_key=True),
+    Column('meshtastic_id', Integer, ForeignKey('meshtastic.id'), primary_key=True),
+    Index('ix_role_meshtastic_association_meshtastic_id', 'meshtastic_id', 'role_id')
 )
 
 # Association tables for Meshtastic Channel Groups
 role_meshtastic_group_association = Table(
     'role_meshtastic_group_association',
     db.metadata,
-    Column('role_id', Integer, ForeignKey('user_roles.id')),
-    Column('group_id', Integer, ForeignKey('meshtastic_channel_groups.id'))
+    Column('role_id', Integer, ForeignKey('user_roles.id'), primary_key=True),
+    Column('group_id', Integer, ForeignKey('meshtastic_channel_groups.id'), primary_key=True),
+    Index('ix_role_meshtastic_group_association_group_id', 'group_id', 'role_id')
 )
 
 user_meshtastic_group_association = Table(
     'user_meshtastic_group_association',
     db.metadata,
-    Column('user_id', Integer, ForeignKey('users.id')),
-    Column('group_id', Integer, ForeignKey('meshtastic_channel_groups.id'))
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('group_id', Integer, ForeignKey('meshtastic_channel_groups.id'), primary_key=True),
+    Index('ix_user_meshtastic_group_association_group_id', 'group_id', 'user_id')
 )
 
 # ChannelGroupMembership is defined below as a proper model class for the association object pattern
@@ -93,6 +125,10 @@ class GroupOnboardingCodeAssociation(db.Model):
     group = relationship("OTSGroupModel", backref=db.backref("onboarding_code_associations", cascade="all, delete-orphan"))
     onboarding_code = relationship("OnboardingCodeModel", backref=db.backref("group_associations", cascade="all, delete-orphan"))
 
+    __table_args__ = (
+        Index('ix_group_onboardingcode_association_onboardingcode_id', 'onboardingcode_id', 'group_id'),
+    )
+
 class GroupUserAssociation(db.Model):
     __tablename__ = 'group_user_association'
 
@@ -103,19 +139,25 @@ class GroupUserAssociation(db.Model):
     group = relationship("OTSGroupModel", backref=db.backref("user_associations", cascade="all, delete-orphan"))
     user = relationship("UserModel", backref=db.backref("group_associations", cascade="all, delete-orphan"))
 
+    __table_args__ = (
+        Index('ix_group_user_association_user_id', 'user_id', 'group_id'),
+    )
+
 # Association tables for announcements
 announcement_role_association = Table(
     'announcement_role_association',
     db.metadata,
-    Column('announcement_id', Integer, ForeignKey('announcements.id')),
-    Column('role_id', Integer, ForeignKey('user_roles.id'))
+    Column('announcement_id', Integer, ForeignKey('announcements.id'), primary_key=True),
+    Column('role_id', Integer, ForeignKey('user_roles.id'), primary_key=True),
+    Index('ix_announcement_role_association_role_id', 'role_id', 'announcement_id')
 )
 
 announcement_user_association = Table(
     'announcement_user_association',
     db.metadata,
-    Column('announcement_id', Integer, ForeignKey('announcements.id')),
-    Column('user_id', Integer, ForeignKey('users.id'))
+    Column('announcement_id', Integer, ForeignKey('announcements.id'), primary_key=True),
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Index('ix_announcement_user_association_user_id', 'user_id', 'announcement_id')
 )
 
 class UserRoleModel(db.Model):
@@ -310,6 +352,11 @@ class TakProfileModel(db.Model):
     takTemplateFolderLocation: Mapped[str] = mapped_column(nullable=True)
     takPrefFileLocation: Mapped[str] = mapped_column(nullable=True)
     injectCallsign: Mapped[bool] = mapped_column(nullable=True, default=False, server_default='0')
+    # sha256 over the package's file list and hashes; changes whenever any file does
+    contentHash: Mapped[str] = mapped_column(String(64), nullable=True)
+    # JSON {"version": 2, "files": {path: {"size", "mtime", "sha256"}}, "dirs": [path]},
+    # written when the package is extracted
+    contentManifest: Mapped[str] = mapped_column(Text, nullable=True, deferred=True)
 
     users = relationship(
         "UserModel",
@@ -346,6 +393,31 @@ class TakProfileModel(db.Model):
     @staticmethod
     def get_tak_profile_by_id(tak_profile_id):
         return TakProfileModel.query.get(tak_profile_id)
+
+    @staticmethod
+    def can_access_profile(user_id, profile_id):
+        """
+        True when the profile is assigned to the user, to one of the user's
+        roles, or is public and assigned to nobody. Answered with a single
+        EXISTS query over the association table indexes and memoized for the
+        rest of the request. Administrator access is checked by the caller.
+        """
+        memo = g.setdefault('profile_access', {}) if has_request_context() else {}
+        key = (user_id, profile_id)
+        if key not in memo:
+            uta, rta, ura = user_takprofile_association, role_takprofile_association, user_role_association
+            direct = exists().where(uta.c.user_id == user_id, uta.c.takprofile_id == profile_id)
+            via_role = exists().where(
+                rta.c.takprofile_id == profile_id, ura.c.role_id == rta.c.role_id, ura.c.user_id == user_id
+            )
+            unrestricted_public = exists().where(
+                TakProfileModel.id == profile_id,
+                TakProfileModel.isPublic.is_(True),
+                ~exists().where(uta.c.takprofile_id == profile_id),
+                ~exists().where(rta.c.takprofile_id == profile_id)
+            )
+            memo[key] = bool(db.session.execute(select(or_(direct, via_role, unrestricted_public))).scalar())
+        return memo[key]
     
     @staticmethod
     def get_tak_profile_by_name(name):
@@ -364,6 +436,13 @@ class TakProfileModel(db.Model):
         except:
             return {"error": "tak_profile.not.exist"}
     
+    def get_content_manifest(self):
+        import json
+        try:
+            return json.loads(self.contentManifest) if self.contentManifest else None
+        except ValueError:
+            return None
+
     @staticmethod
     def delete_tak_profile_by_id(tak_profile_id):
         tak_profile = TakProfileModel.get_tak_profile_by_id(tak_profile_id)
@@ -452,6 +531,11 @@ class OnboardingCodeModel(db.Model):
     # Relationship to UserRoleModel for approver role
     approverRole = relationship("UserRoleModel", foreign_keys=[approverRoleId])
 
+    # Approver work queue: codes needing approval by a given role
+    __table_args__ = (
+        Index('ix_onboardingcodes_approver_role', 'approverRoleId', 'requireApproval'),
+    )
+
     roles = relationship(
         "UserRoleModel",
         secondary=role_onboardingcode_association,
@@ -506,7 +590,24 @@ class OnboardingCodeModel(db.Model):
 
     @staticmethod
     def get_all_onboarding_codes():
-        return OnboardingCodeModel.query.all()
+        return OnboardingCodeModel.listing_query().all()
+
+    @staticmethod
+    def listing_query(include_details=True):
+        """
+        Query for code listings with the relationships the list view renders
+        loaded up front instead of lazily per code.
+        """
+        query = OnboardingCodeModel.query.options(
+            joinedload(OnboardingCodeModel.approverRole),
+            joinedload(OnboardingCodeModel.onboardContact),
+        )
+        if include_details:
+            query = query.options(
+                selectinload(OnboardingCodeModel.roles),
+                selectinload(OnboardingCodeModel.group_associations).joinedload(GroupOnboardingCodeAssociation.group),
+            )
+        return query.order_by(OnboardingCodeModel.id)
 
     @staticmethod
     def update_onboarding_code(onboarding_code):
@@ -997,7 +1098,7 @@ class PendingRegistrationModel(db.Model):
     callsign: Mapped[str] = mapped_column(nullable=True)
     onboarding_code_id: Mapped[int] = mapped_column(ForeignKey('onboardingcodes.id'), nullable=False)
     verification_token: Mapped[str] = mapped_column(unique=True, nullable=False)
-    expires_at: Mapped[datetime.datetime] = mapped_column(nullable=False)
+    expires_at: Mapped[datetime.datetime] = mapped_column(nullable=False, index=True)
     created_at: Mapped[datetime.datetime] = mapped_column(default=db.func.current_timestamp(), nullable=False)
 
     # Approval workflow fields
@@ -1010,6 +1111,11 @@ class PendingRegistrationModel(db.Model):
     onboarding_code = relationship("OnboardingCodeModel")
     approver = relationship("UserModel", foreign_keys=[approved_by])
 
+    # Approver work queue: registrations of a code in a given status
+    __table_args__ = (
+        Index('ix_pending_registrations_code_status', 'onboarding_code_id', 'approval_status'),
+    )
+
     @staticmethod
     def create_pending_registration(username, email, password, first_name, last_name, callsign, onboarding_code_id, verification_token, expires_at):
         try:
@@ -1040,6 +1146,29 @@ class PendingRegistrationModel(db.Model):
     def get_by_token(token):
         return PendingRegistrationModel.query.filter_by(verification_token=token).first()
 
+    @staticmethod
+    def listing_query(status=None, onboarding_code=None, include_details=True):
+        """
+        Query for registration listings, newest first.
+        status filters on approval_status; onboarding_code matches either the
+        code id or the code string. The onboarding code, its approver role and
+        the approver are joined in one query when include_details is set.
+        """
+        query = PendingRegistrationModel.query
+        if include_details:
+            query = query.options(
+                joinedload(PendingRegistrationModel.onboarding_code).joinedload(OnboardingCodeModel.approverRole),
+                joinedload(PendingRegistrationModel.approver),
+            )
+        if status:
+            query = query.filter(PendingRegistrationModel.approval_status == status)
+        if onboarding_code:
+            if str(onboarding_code).isdigit():
+                query = query.filter(PendingRegistrationModel.onboarding_code_id == int(onboarding_code))
+            else:
+                query = query.filter(PendingRegistrationModel.onboarding_code.has(onboardingCode=onboarding_code))
+        return query.order_by(PendingRegistrationModel.created_at.desc(), PendingRegistrationModel.id.desc())
+
     @staticmethod
     def delete_by_id(pending_id):
         pending = PendingRegistrationModel.query.get(pending_id)
@@ -1053,13 +1182,10 @@ class PendingRegistrationModel(db.Model):
     def cleanup_expired():
         """Delete expired pending registrations"""
         try:
-            expired = PendingRegistrationModel.query.filter(
+            return _delete_in_chunks(
+                PendingRegistrationModel,
                 PendingRegistrationModel.expires_at < datetime.datetime.now()
-            ).all()
-            for pending in expired:
-                db.session.delete(pending)
-            db.session.commit()
-            return len(expired)
+            )
         except Exception as e:
             db.session.rollback()
             print(f"Error cleaning up expired registrations: {e}")
@@ -1077,7 +1203,7 @@ class OneTimeTokenModel(db.Model):
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
     token_type: Mapped[str] = mapped_column(nullable=False)  # 'password_reset', 'email_verification', etc.
     is_used: Mapped[bool] = mapped_column(default=False, nullable=False)
-    expires_at: Mapped[datetime.datetime] = mapped_column(nullable=False)
+    expires_at: Mapped[datetime.datetime] = mapped_column(nullable=False, index=True)
     created_at: Mapped[datetime.datetime] = mapped_column(default=db.func.current_timestamp(), nullable=False)
     used_at: Mapped[datetime.datetime] = mapped_column(nullable=True)
 
@@ -1156,13 +1282,10 @@ class OneTimeTokenModel(db.Model):
     def cleanup_expired_tokens():
         """Delete expired tokens (for maintenance)"""
         try:
-            expired = OneTimeTokenModel.query.filter(
+            return _delete_in_chunks(
+                OneTimeTokenModel,
                 OneTimeTokenModel.expires_at < datetime.datetime.now()
-            ).all()
-            for token in expired:
-                db.session.delete(token)
-            db.session.commit()
-            return len(expired)
+            )
         except Exception as e:
             db.session.rollback()
             print(f"Error cleaning up tokens: {e}")
@@ -1182,7 +1305,7 @@ class KioskSessionModel(db.Model):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
     status: Mapped[str] = mapped_column(nullable=False, default='pending')
     created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     authenticated_at = Column(DateTime, nullable=True)
     access_token = Column(String, nullable=True)
     refresh_token = Column(String, nullable=True)
@@ -1213,19 +1336,44 @@ class KioskSessionModel(db.Model):
     def cleanup_expired():
         """Delete expired kiosk sessions"""
         try:
-            expired = KioskSessionModel.query.filter(
+            return _delete_in_chunks(
+                KioskSessionModel,
                 KioskSessionModel.expires_at < datetime.datetime.utcnow()
-            ).all()
-            for session in expired:
-                db.session.delete(session)
-            db.session.commit()
-            return len(expired)
+            )
         except Exception as e:
             db.session.rollback()
             print(f"Error cleaning up kiosk sessions: {e}")
             return 0
 
 
+class QRTokenCacheModel(db.Model):
+    """
+    Shared cache of ATAK enrollment QR strings (QR_CACHE_BACKEND=database).
+    Times are unix epoch seconds to match the OTS token 'exp' claim.
+    """
+    __tablename__ = "qr_token_cache"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    cache_key: Mapped[str] = mapped_column(unique=True, nullable=False)  # "username:token_type"
+    qr_string: Mapped[str] = mapped_column(nullable=True)
+    max_uses: Mapped[int] = mapped_column(nullable=True)
+    total_uses: Mapped[int] = mapped_column(nullable=True)
+    fingerprint: Mapped[str] = mapped_column(nullable=True)  # Token settings the entry was generated with
+    cached_at = Column(db.Float, nullable=True)
+    expires_at: Mapped[int] = mapped_column(nullable=False, default=0, index=True)
+    lease_until: Mapped[int] = mapped_column(nullable=True)  # Held by the worker generating a new token
+
+    def to_entry(self):
+        return {
+            'qr_string': self.qr_string,
+            'expires_at': self.expires_at,
+            'max_uses': self.max_uses,
+            'total_uses': self.total_uses,
+            'fingerprint': self.fingerprint,
+            'cached_at': self.cached_at
+        }
+
+
 class OIDCProviderModel(db.Model):
     """
     Model for OIDC (OpenID Connect) authentication providers.
@@ -1707,7 +1855,7 @@ class AnnouncementModel(db.Model):
     send_email: Mapped[bool] = mapped_column(default=False, nullable=False)
 
     # Metadata
-    created_by: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
+    created_by: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=True)
     created_at: Mapped[datetime.datetime] = mapped_column(default=db.func.current_timestamp(), nullable=False)
     updated_at: Mapped[datetime.datetime] = mapped_column(default=db.func.current_timestamp(), onupdate=db.func.current_timestamp(), nullable=False)
 
@@ -1910,7 +2058,7 @@ class ApiKeyModel(db.Model):
     rate_limit: Mapped[int] = mapped_column(nullable=True, default=1000)
     is_active: Mapped[bool] = mapped_column(default=True, nullable=False)
     expires_at: Mapped[datetime.datetime] = mapped_column(nullable=True)
-    created_by: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
+    created_by: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=True)
     created_at: Mapped[datetime.datetime] = mapped_column(default=db.func.current_timestamp(), nullable=False)
     last_used_at: Mapped[datetime.datetime] = mapped_column(nullable=True)
     last_used_ip: Mapped[str] = mapped_column(nullable=True)
@@ -2025,3 +2173,240 @@ class ApiKeyModel(db.Model):
             db.session.commit()
             return {"message": "API key deleted successfully"}
         return {"error": "api_key.not.found"}
+
+
+class BulkUserJobModel(db.Model):
+    """
+    Model for bulk user operations (role, group, expiry, deactivate, delete)
+    that run in the background. The selected user ids are fixed when the job
+    is created; progress counters are updated after every batch.
+    """
+    __tablename__ = "bulk_user_jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    operation: Mapped[str] = mapped_column(String(32), nullable=False)
+    params: Mapped[str] = mapped_column(Text, nullable=False, default='{}')
+    user_ids: Mapped[str] = mapped_column(Text, nullable=False, default='[]')
+    # 'queued', 'running', 'completed', 'failed'
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default='queued')
+    total: Mapped[int] = mapped_column(default=0, nullable=False)
+    processed: Mapped[int] = mapped_column(default=0, nullable=False)
+    succeeded: Mapped[int] = mapped_column(default=0, nullable=False)
+    failed: Mapped[int] = mapped_column(default=0, nullable=False)
+    errors: Mapped[str] = mapped_column(Text, nullable=False, default='[]')
+    created_by: Mapped[str] = mapped_column(nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.now, nullable=False, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    @staticmethod
+    def create_job(operation, params, user_ids, created_by=None):
+        import json
+        try:
+            job = BulkUserJobModel(
+                operation=operation,
+                params=json.dumps(params),
+                user_ids=json.dumps(user_ids),
+                status='queued',
+                total=len(user_ids),
+                created_by=created_by
+            )
+            db.session.add(job)
+            db.session.commit()
+            return job
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating bulk user job: {e}")
+            return None
+
+    @staticmethod
+    def get_by_id(job_id):
+        return db.session.get(BulkUserJobModel, job_id)
+
+    @staticmethod
+    def get_recent(limit=20):
+        return BulkUserJobModel.query.order_by(BulkUserJobModel.id.desc()).limit(limit).all()
+
+    def get_params(self):
+        import json
+        return json.loads(self.params or '{}')
+
+    def get_user_ids(self):
+        import json
+        return json.loads(self.user_ids or '[]')
+
+    def get_errors(self):
+        import json
+        return json.loads(self.errors or '[]')
+
+    def to_dict(self, include_errors=True):
+        data = {
+            'id': self.id,
+            'operation': self.operation,
+            'params': self.get_params(),
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'createdBy': self.created_by,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None,
+        }
+        if include_errors:
+            data['errors'] = self.get_errors()
+        return data
+
+
+class UserImportRowModel(db.Model):
+    """
+    One validated row of a user import (a BulkUserJobModel with operation
+    'import'). The row's status records how far it got, so an interrupted or
+    partly failed import can be resumed:
+    'pending' -> 'provisioned' (OTS account created) -> 'completed'
+    or 'failed' (retried on resume). Only supplied passwords are stored; each
+    is cleared once the OTS account exists, when the job finishes, or by
+    purge_passwords once the job is older than PASSWORD_RETENTION.
+    """
+    __tablename__ = "user_import_rows"
+    PASSWORD_RETENTION = datetime.timedelta(hours=24)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    job_id = Column(Integer, ForeignKey('bulk_user_jobs.id', ondelete='CASCADE'), nullable=False)
+    row_number: Mapped[int] = mapped_column(nullable=False)
+    username: Mapped[str] = mapped_column(nullable=False)
+    email: Mapped[str] = mapped_column(nullable=False)
+    first_name: Mapped[str] = mapped_column(nullable=True)
+    last_name: Mapped[str] = mapped_column(nullable=True)
+    callsign: Mapped[str] = mapped_column(nullable=True)
+    password: Mapped[str] = mapped_column(nullable=True)
+    has_password: Mapped[bool] = mapped_column(default=True, nullable=False)
+    role_ids: Mapped[str] = mapped_column(Text, nullable=False, default='[]')
+    # JSON {group_id: direction}
+    groups: Mapped[str] = mapped_column(Text, nullable=False, default='{}')
+    expiry_date = Column(DateTime, nullable=True)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default='pending')
+    attempts: Mapped[int] = mapped_column(default=0, nullable=False)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+
+    __table_args__ = (
+        Index('ix_user_import_rows_job_status', 'job_id', 'status', 'row_number'),
+    )
+
+    @staticmethod
+    def get_for_job(job_id, statuses=None, limit=None):
+        query = UserImportRowModel.query.filter_by(job_id=job_id)
+        if statuses:
+            query = query.filter(UserImportRowModel.status.in_(statuses))
+        query = query.order_by(UserImportRowModel.row_number)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def count_by_status(job_id):
+        rows = db.session.query(UserImportRowModel.status, db.func.count()).filter(
+            UserImportRowModel.job_id == job_id
+        ).group_by(UserImportRowModel.status).all()
+        return dict(rows)
+
+    @staticmethod
+    def purge_passwords():
+        """Clear the passwords left on rows of finished jobs and of jobs older than PASSWORD_RETENTION"""
+        try:
+            stale_jobs = select(BulkUserJobModel.id).where(or_(
+                BulkUserJobModel.finished_at.isnot(None),
+                BulkUserJobModel.created_at < datetime.datetime.now() - UserImportRowModel.PASSWORD_RETENTION
+            ))
+            purged = UserImportRowModel.query.filter(
+                UserImportRowModel.password.isnot(None), UserImportRowModel.job_id.in_(stale_jobs)
+            ).update({'password': None, 'has_password': False}, synchronize_session=False)
+            db.session.commit()
+            return purged
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error purging import passwords: {e}")
+            return 0
+
+
+class DatapackageUploadModel(db.Model):
+    """
+    A chunked upload of a TAK profile data package. Chunks are appended to a
+    part file until received == total_size; the package is then extracted
+    in the background into a new profile, or into profile_id's folder.
+    status: 'uploading' -> 'processing' -> 'completed' or 'failed'
+    """
+    __tablename__ = "datapackage_uploads"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    profile_id = Column(Integer, ForeignKey('takprofiles.id', ondelete='CASCADE'), nullable=True)
+    filename: Mapped[str] = mapped_column(nullable=False)
+    total_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    received: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    # JSON profile fields: name, description, isPublic, takPrefFileLocation, injectCallsign, roleIds
+    options: Mapped[str] = mapped_column(Text, nullable=False, default='{}')
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default='uploading')
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    # JSON {profileId, files, bytes, contentHash} once completed
+    result: Mapped[str] = mapped_column(Text, nullable=True)
+    created_by: Mapped[str] = mapped_column(nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.now, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.now, nullable=False, index=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    @staticmethod
+    def create_upload(filename, total_size, options, profile_id=None, created_by=None):
+        import json
+        try:
+            upload = DatapackageUploadModel(
+                filename=filename,
+                total_size=total_size,
+                options=json.dumps(options),
+                profile_id=profile_id,
+                created_by=created_by
+            )
+            db.session.add(upload)
+            db.session.commit()
+            return upload
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating datapackage upload: {e}")
+            return None
+
+    @staticmethod
+    def get_by_id(upload_id):
+        return db.session.get(DatapackageUploadModel, upload_id)
+
+    @staticmethod
+    def get_stale(before, status='uploading'):
+        """Uploads in the given status that were last touched before the given time"""
+        return DatapackageUploadModel.query.filter(
+            DatapackageUploadModel.status == status,
+            DatapackageUploadModel.updated_at < before
+        ).all()
+
+    def get_options(self):
+        import json
+        return json.loads(self.options or '{}')
+
+    def get_result(self):
+        import json
+        return json.loads(self.result) if self.result else None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'profileId': self.profile_id,
+            'filename': self.filename,
+            'totalSize': self.total_size,
+            'received': self.received,
+            'status': self.status,
+            'error': self.error,
+            'result': self.get_result(),
+            'createdBy': self.created_by,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -1,6 +1,312 @@
-from app.settings import OTS_USERNAME, OTS_PASSWORD, OTS_URL, OTS_VERIFY_SSL
+from app.settings import OTS_USERNAME, OTS_PASSWORD, OTS_URL, OTS_VERIFY_SSL, OTS_CACHE_ENABLED
+from app.settings import OTS_CONNECT_TIMEOUT, OTS_READ_TIMEOUT, OTS_MIN_READ_TIMEOUT
+from app.settings import OTS_BREAKER_FAILURE_THRESHOLD, OTS_BREAKER_RECOVERY_SECONDS
+import bisect
+import copy
+import functools
+import threading
+import time
+from collections import deque
 import requests
-from .exceptions import AuthenticationError, AuthorizationError, BadRequestError, CSRFError
+from .exceptions import AuthenticationError, AuthorizationError, BadRequestError, CSRFError, OTSUnavailableError
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for calls to one OTS server.
+
+    closed:    requests flow normally, consecutive failures are counted
+    open:      requests fail immediately with OTSUnavailableError
+    half_open: after the recovery period one probe request is let through;
+               success closes the breaker, failure opens it again
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """Raise OTSUnavailableError if the request must not be sent"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            retry_in = self.opened_at + self.recovery_timeout - time.time()
+            if self.state == self.OPEN and retry_in <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return
+            raise OTSUnavailableError("OTS server unavailable (circuit breaker open)",
+                                      retry_after=max(int(retry_in), 1))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("OTS circuit breaker closed - OTS is reachable again")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"OTS circuit breaker opened after {self.consecutive_failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def status(self):
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(round(self.opened_at + self.recovery_timeout - time.time(), 1), 0)
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'retry_in': retry_in
+            }
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with a window of recent samples for percentiles"""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, window=200):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.total += 1
+        self.sum += seconds
+        if error:
+            self.errors += 1
+        self.recent.append(seconds)
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.BUCKETS) + ['+Inf'], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            'count': self.total,
+            'sum': round(self.sum, 4),
+            'errors': self.errors,
+            'buckets': buckets,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99)
+        }
+
+
+class OTSCallMetrics:
+    """Per-endpoint OTS latency histograms, shared by every OTSClient instance"""
+
+    # Samples needed before an endpoint's read timeout is derived from its latency
+    MIN_SAMPLES = 20
+    # Read timeout is this multiple of the endpoint's recent p99
+    TIMEOUT_FACTOR = 4
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, seconds, error=False):
+        with self._lock:
+            histogram = self._histograms.setdefault(endpoint, LatencyHistogram())
+            histogram.observe(seconds, error)
+
+    def read_timeout(self, endpoint):
+        """Adaptive read timeout: a multiple of recent p99, between the configured bounds"""
+        with self._lock:
+            histogram = self._histograms.get(endpoint)
+            if not histogram or len(histogram.recent) < self.MIN_SAMPLES:
+                return OTS_READ_TIMEOUT
+            p99 = histogram.percentile(0.99)
+        return min(OTS_READ_TIMEOUT, max(OTS_MIN_READ_TIMEOUT, p99 * self.TIMEOUT_FACTOR))
+
+    def histograms(self):
+        """Raw per-endpoint bucket counts, sum and errors for metrics export"""
+        with self._lock:
+            return [(endpoint, {'counts': list(h.counts), 'sum': h.sum, 'errors': h.errors})
+                    for endpoint, h in sorted(self._histograms.items())]
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = list(self._histograms.items())
+        return {endpoint: {**histogram.snapshot(), 'read_timeout': self.read_timeout(endpoint)}
+                for endpoint, histogram in endpoints}
+
+
+ots_call_metrics = OTSCallMetrics()
+
+# One breaker per OTS base URL, shared by the admin client and per-user clients
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(base_url):
+    with _breakers_lock:
+        if base_url not in _breakers:
+            _breakers[base_url] = CircuitBreaker(OTS_BREAKER_FAILURE_THRESHOLD, OTS_BREAKER_RECOVERY_SECONDS)
+        return _breakers[base_url]
+
+
+# Response cache settings per read endpoint: (fresh seconds, stale seconds).
+# A fresh entry is served as-is. A stale entry is still served, but triggers
+# a background refresh. Past the stale window the call blocks on OTS again.
+CACHE_TTLS = {
+    'status': (15, 60),
+    'groups': (300, 900),
+    'group_members': (60, 300),
+    'meshtastic_channels': (300, 900),
+}
+
+
+class OTSResponseCache:
+    """
+    Opt-in cache for read-mostly OTS endpoints (OTS_CACHE_ENABLED).
+    Write methods invalidate the endpoints they affect.
+    """
+
+    def __init__(self, enabled=False, ttls=None):
+        self.enabled = enabled
+        self.ttls = ttls or CACHE_TTLS
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {endpoint: {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0,
+                                  'refresh_errors': 0, 'invalidations': 0}
+                       for endpoint in self.ttls}
+
+    def _count(self, endpoint, stat):
+        with self._lock:
+            self._stats[endpoint][stat] += 1
+
+    def call(self, endpoint, key, loader, fresh=False):
+        """Return the cached response for key, loading it with loader() when needed"""
+        if not self.enabled:
+            return loader()
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((endpoint, key))
+
+        if entry and not fresh:
+            fresh_ttl, stale_ttl = self.ttls[endpoint]
+            age = now - entry['stored_at']
+            if age < fresh_ttl:
+                self._count(endpoint, 'hits')
+                return copy.deepcopy(entry['value'])
+            if age < fresh_ttl + stale_ttl:
+                self._count(endpoint, 'stale_hits')
+                self._refresh_in_background(endpoint, key, loader)
+                return copy.deepcopy(entry['value'])
+
+        self._count(endpoint, 'misses')
+        value = loader()
+        self._store(endpoint, key, value)
+        return copy.deepcopy(value)
+
+    def _store(self, endpoint, key, value):
+        with self._lock:
+            self._entries[(endpoint, key)] = {'value': value, 'stored_at': time.time()}
+
+    def _refresh_in_background(self, endpoint, key, loader):
+        with self._lock:
+            if (endpoint, key) in self._refreshing:
+                return
+            self._refreshing.add((endpoint, key))
+
+        def refresh():
+            try:
+                self._store(endpoint, key, loader())
+                self._count(endpoint, 'refreshes')
+            except Exception as e:
+                print(f"Background refresh of OTS {endpoint} failed: {e}")
+                self._count(endpoint, 'refresh_errors')
+            finally:
+                with self._lock:
+                    self._refreshing.discard((endpoint, key))
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def invalidate(self, *endpoints):
+        """Drop all cached responses for the given endpoints"""
+        with self._lock:
+            for cached_key in [k for k in self._entries if k[0] in endpoints]:
+                del self._entries[cached_key]
+            for endpoint in endpoints:
+                self._stats[endpoint]['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Per-endpoint counters plus the number of cached entries"""
+        with self._lock:
+            result = {}
+            for endpoint, counters in self._stats.items():
+                lookups = counters['hits'] + counters['stale_hits'] + counters['misses']
+                result[endpoint] = {
+                    **counters,
+                    'entries': len([k for k in self._entries if k[0] == endpoint]),
+                    'hit_ratio': round((counters['hits'] + counters['stale_hits']) / lookups, 3) if lookups else None
+                }
+            return {'enabled': self.enabled, 'endpoints': result}
+
+
+def cached_response(endpoint):
+    """
+    Serve an OTSClient read method through the response cache.
+    Callers can pass fresh=True to bypass cached data (the result is still stored).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, fresh=False, **kwargs):
+            key = repr((args, sorted(kwargs.items())))
+            return self.cache.call(endpoint, key, lambda: fn(self, *args, **kwargs), fresh=fresh)
+        return wrapper
+    return decorator
+
+
+def invalidates(*endpoints):
+    """Invalidate cached endpoints after an OTSClient write method runs (even if it fails)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                self.cache.invalidate(*endpoints)
+        return wrapper
+    return decorator
+
 
 class OTSClient:
 
@@ -27,7 +333,7 @@ class OTSClient:
     _meshtastic = _apibase + "/meshtastic"
 
 
-    def __init__(self, url, username, password):
+    def __init__(self, url, username, password, cache_enabled=False):
         self.base_url = url
         self.username = username
         self.password = password
@@ -35,14 +341,31 @@ class OTSClient:
         self.auth_token = None
         self.headers = {"Content-Type": "application/json"}
         self.session = requests.Session()
+        self.cache = OTSResponseCache(enabled=cache_enabled)
 
     
     
     def execute_request(self, method, endpoint, body=None, params=None, response_type="json"):
+        breaker = get_breaker(self.base_url)
+        breaker.before_request()
+        started = time.monotonic()
         try:
             url = self.base_url + endpoint
             self.headers["Referer"] = self.base_url+self._data_packages
-            response = self.session.request(method, url, json=body, headers=self.headers, params=params, verify=OTS_VERIFY_SSL, timeout=30)
+            timeout = (OTS_CONNECT_TIMEOUT, ots_call_metrics.read_timeout(endpoint))
+            try:
+                response = self.session.request(method, url, json=body, headers=self.headers, params=params, verify=OTS_VERIFY_SSL, timeout=timeout)
+            except Exception:
+                ots_call_metrics.observe(endpoint, time.monotonic() - started, error=True)
+                breaker.record_failure()
+                raise
+
+            ots_call_metrics.observe(endpoint, time.monotonic() - started, error=response.status_code >= 500)
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
             if response_type == "json":
 
                 if not response.text.strip():
@@ -129,6 +452,7 @@ class OTSClient:
     def get_me(self):
         return self.request_handler(method="GET", endpoint=self._me)
     
+    @cached_response('status')
     def get_status(self):
         return self.request_handler(method="GET", endpoint=self._status)
     
@@ -226,6 +550,7 @@ class OTSClient:
         body = {'username': username, 'password': password, 'confirm_password': password, 'roles': roles}
         return self.request_handler(method="POST", endpoint=self._user_add, body=body)
     
+    @invalidates('group_members')
     def delete_user(self, username):
         body = {'username': username}
         return self.request_handler(method="POST", endpoint=self._user_delete, body=body)
@@ -243,6 +568,7 @@ class OTSClient:
         return self.request_handler(method="POST", endpoint=self._user_deactivate, body=body)
 
 
+    @cached_response('groups')
     def get_groups(self, page=None, page_size=None, name=None, active=None):
         """Get all groups from OTS"""
         params = {}
@@ -256,6 +582,7 @@ class OTSClient:
             params["active"] = active
         return self.request_handler(method="GET", endpoint=self._groups, params=params)
 
+    @invalidates('groups', 'group_members')
     def create_group(self, name, description=None):
         """Create a new group in OTS"""
         body = {'name': name}
@@ -263,16 +590,19 @@ class OTSClient:
             body['description'] = description
         return self.request_handler(method="POST", endpoint=self._groups, body=body)
 
+    @invalidates('groups', 'group_members')
     def delete_group(self, group_name):
         """Delete a group from OTS"""
         params = {'group_name': group_name}
         return self.request_handler(method="DELETE", endpoint=self._groups, params=params)
 
+    @cached_response('group_members')
     def get_group_members(self, group_name):
         """Get members of a specific OTS group"""
         params = {'name': group_name}
         return self.request_handler(method="GET", endpoint=self._groups_members, params=params)
 
+    @invalidates('group_members')
     def add_user_to_group(self, username, group_name, direction='IN'):
         """Add a user to an OTS group with a specific direction (IN or OUT)"""
         body = {
@@ -282,6 +612,7 @@ class OTSClient:
         }
         return self.request_handler(method="PUT", endpoint=self._groups, body=body)
 
+    @invalidates('group_members')
     def remove_user_from_group(self, username, group_name, direction='IN'):
         """Remove a user from an OTS group"""
         params = {
@@ -356,6 +687,7 @@ class OTSClient:
     # Meshtastic endpoints - uses /api/meshtastic/channel
     _meshtastic_channel = _meshtastic + "/channel"
 
+    @cached_response('meshtastic_channels')
     def get_meshtastic_channels(self, page=None, page_size=None, name=None, url=None):
         """Get all Meshtastic channels from OTS"""
         params = {}
@@ -369,6 +701,7 @@ class OTSClient:
             params["url"] = url
         return self.request_handler(method="GET", endpoint=self._meshtastic_channel, params=params)
 
+    @invalidates('meshtastic_channels')
     def create_meshtastic_channel(self, url, name=None):
         """Create a new Meshtastic channel in OTS using the meshtastic:// URL"""
         body = {'url': url}
@@ -376,6 +709,7 @@ class OTSClient:
             body['name'] = name
         return self.request_handler(method="POST", endpoint=self._meshtastic_channel, body=body)
 
+    @invalidates('meshtastic_channels')
     def delete_meshtastic_channel(self, url):
         """Delete a Meshtastic channel from OTS by URL"""
         params = {'url': url}
@@ -386,4 +720,4 @@ class OTSClient:
         endpoint = self._meshtastic + "/generate_psk"
         return self.request_handler(method="GET", endpoint=endpoint)
 
-otsClient = OTSClient(OTS_URL, OTS_USERNAME, OTS_PASSWORD)
\ No newline at end of file
+otsClient = OTSClient(OTS_URL, OTS_USERNAME, OTS_PASSWORD, cache_enabled=OTS_CACHE_ENABLED)
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+SQL query profiler
+
+Counts the queries issued while a profile is active and groups them by
+normalized statement (literals and IN lists collapsed), so the same query
+run once per row of a loop - an N+1 - stands out.
+
+- profile_queries(): context manager returning a QueryProfile, used by the
+  pytest max_queries fixture in tests/query_budget.py
+- init_query_profiler(app): opt-in middleware (QUERY_PROFILING_ENABLED) that
+  profiles every request. It adds X-Query-Count, X-Query-Time-Ms and
+  X-Query-N1-Suspects headers and logs a line with the suspects, or when
+  the request exceeds QUERY_BUDGET queries.
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_N1_THRESHOLD = 5
+
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_RE = re.compile(r'%\(\w+\)s|:\w+|\?')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    """Collapse a SQL statement to its shape so repeated queries group together"""
+    statement = _STRING_RE.sub('?', statement)
+    statement = _NUMBER_RE.sub('?', statement)
+    statement = _PARAM_RE.sub('?', statement)
+    statement = _IN_LIST_RE.sub('IN (...)', statement)
+    return _SPACE_RE.sub(' ', statement).strip()
+
+
+class QueryProfile:
+    """Queries seen while a profile was active"""
+
+    def __init__(self, n1_threshold=DEFAULT_N1_THRESHOLD):
+        self.n1_threshold = n1_threshold
+        self.statements = []
+        self.total_time = 0.0
+
+    def record(self, statement, duration):
+        self.statements.append(normalize_statement(statement))
+        self.total_time += duration
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def groups(self):
+        """[(normalized statement, times executed)], most frequent first"""
+        return Counter(self.statements).most_common()
+
+    def n1_suspects(self):
+        """Statements executed at least n1_threshold times"""
+        return [(statement, count) for statement, count in self.groups() if count >= self.n1_threshold]
+
+    def report(self, limit=10):
+        """Human readable breakdown for assertion messages"""
+        lines = [f"{self.count} queries in {self.total_time * 1000:.1f}ms"]
+        for statement, count in self.groups()[:limit]:
+            marker = ' <- N+1 suspect' if count >= self.n1_threshold else ''
+            lines.append(f"  {count:>4}x {statement[:200]}{marker}")
+        return '\n'.join(lines)
+
+
+_active = threading.local()
+_listeners_registered = False
+_listeners_lock = threading.Lock()
+
+
+def _profiles():
+    if not hasattr(_active, 'profiles'):
+        _active.profiles = []
+    return _active.profiles
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _profiles():
+        conn.info.setdefault('profiler_query_started', []).append(time.monotonic())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profiles = _profiles()
+    if not profiles:
+        return
+    stack = conn.info.get('profiler_query_started')
+    duration = time.monotonic() - stack.pop() if stack else 0.0
+    for profile in profiles:
+        profile.record(statement, duration)
+
+
+def _register_listeners():
+    global _listeners_registered
+    with _listeners_lock:
+        if not _listeners_registered:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            _listeners_registered = True
+
+
+def start_profile(n1_threshold=DEFAULT_N1_THRESHOLD):
+    _register_listeners()
+    profile = QueryProfile(n1_threshold)
+    _profiles().append(profile)
+    return profile
+
+
+def stop_profile(profile):
+    profiles = _profiles()
+    if profile in profiles:
+        profiles.remove(profile)
+    return profile
+
+
+@contextmanager
+def profile_queries(n1_threshold=DEFAULT_N1_THRESHOLD):
+    """Profile the queries issued by this thread inside the block"""
+    profile = start_profile(n1_threshold)
+    try:
+        yield profile
+    finally:
+        stop_profile(profile)
+
+
+def _before_request():
+    g.query_profile = start_profile(int(current_app.config.get('QUERY_PROFILING_N1_THRESHOLD', DEFAULT_N1_THRESHOLD)))
+
+
+def _after_request(response):
+    profile = g.pop('query_profile', None)
+    if profile is None:
+        return response
+    stop_profile(profile)
+
+    suspects = profile.n1_suspects()
+    response.headers['X-Query-Count'] = str(profile.count)
+    response.headers['X-Query-Time-Ms'] = f"{profile.total_time * 1000:.1f}"
+    response.headers['X-Query-N1-Suspects'] = str(len(suspects))
+
+    budget = int(current_app.config.get('QUERY_BUDGET', 0))
+    over_budget = budget and profile.count > budget
+    if suspects or over_budget:
+        endpoint = request.url_rule.endpoint if request.url_rule else request.path
+        budget_note = f" (budget {budget})" if over_budget else ''
+        current_app.logger.warning(
+            f"Query profile {request.method} {endpoint}: {profile.count} queries{budget_note}, "
+            f"{profile.total_time * 1000:.1f}ms\n{profile.report()}"
+        )
+    return response
+
+
+def init_query_profiler(app):
+    """Profile every request when QUERY_PROFILING_ENABLED is set"""
+    if not app.config.get('QUERY_PROFILING_ENABLED'):
+        return
+    _register_listeners()
+    app.before_request(_before_request)
+    app.after_request(_after_request)
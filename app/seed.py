@@ -0,0 +1,261 @@
+"""
+Seeded dataset generator
+
+Fills the database with a large, reproducible dataset for scale testing:
+users with role and OTS group memberships, TAK profiles, radios, Meshtastic
+channels and channel groups with their memberships, announcements with read
+records, and pending registrations.
+
+Rows are written with bulk INSERTs in batches instead of the per-object
+create_* helpers, which commit every row, so tens of thousands of users take
+seconds. Every generated name starts with the prefix, and the same seed and
+counts always produce the same users, memberships and assignments.
+
+Run through the CLI (see app/cli.py):
+    flask seed dataset --users 20000 --radios 5000 --channels 2000
+"""
+
+import random
+import secrets
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.models import (
+    AnnouncementModel, AnnouncementReadModel, ChannelGroupMembership, GroupUserAssociation,
+    MeshtasticChannelGroup, MeshtasticModel, OnboardingCodeModel, OTSGroupModel,
+    PendingRegistrationModel, RadioModel, TakProfileModel, UserModel, UserRoleModel, db,
+    role_meshtastic_association, role_meshtastic_group_association, role_onboardingcode_association,
+    role_takprofile_association, user_meshtastic_association, user_meshtastic_group_association,
+    user_role_association, user_takprofile_association
+)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Channels per channel group, slot 0 is the primary channel
+CHANNELS_PER_GROUP = 4
+
+
+class DatasetSeeder:
+    """Bulk-inserts a generated dataset whose names all start with prefix"""
+
+    def __init__(self, prefix='seed', seed=42, batch_size=DEFAULT_BATCH_SIZE):
+        if not prefix.isalnum() or not prefix.islower():
+            raise ValueError('Prefix must be lowercase letters and numbers, as usernames are')
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.now = datetime.now()
+        self.counts = {}
+
+    def _insert(self, model_or_table, rows):
+        table = getattr(model_or_table, '__table__', model_or_table)
+        for start in range(0, len(rows), self.batch_size):
+            db.session.execute(table.insert(), rows[start:start + self.batch_size])
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+
+    def _ids(self, id_column, name_column, prefix):
+        rows = db.session.execute(select(id_column).where(name_column.like(f'{prefix}%')).order_by(id_column))
+        return [row_id for (row_id,) in rows]
+
+    def _sample(self, ids, low, high):
+        return self.rng.sample(ids, min(len(ids), self.rng.randint(low, high)))
+
+    def _mac(self):
+        return ':'.join(f'{b:02x}' for b in self.rng.randbytes(6))
+
+    def exists(self):
+        return db.session.execute(
+            select(UserModel.id).where(UserModel.username == f'{self.prefix}user0')
+        ).first() is not None
+
+    def roles(self, count):
+        user_role = UserRoleModel.get_role_by_name('user')
+        if not user_role:
+            self._insert(UserRoleModel, [{'name': 'user', 'display_name': 'User', 'description': 'Default user role'}])
+            user_role = UserRoleModel.get_role_by_name('user')
+        self.user_role_id = user_role.id
+        self._insert(UserRoleModel, [{
+            'name': f'{self.prefix}_role_{i}', 'display_name': f'Seed Role {i}', 'description': 'Generated role'
+        } for i in range(count)])
+        self.role_ids = self._ids(UserRoleModel.id, UserRoleModel.name, f'{self.prefix}_role_')
+
+    def ots_groups(self, count):
+        self._insert(OTSGroupModel, [{
+            'name': f'{self.prefix}_group_{i}', 'display_name': f'Seed Group {i}', 'active': True, 'created_at': self.now
+        } for i in range(count)])
+        self.group_ids = self._ids(OTSGroupModel.id, OTSGroupModel.name, f'{self.prefix}_group_')
+
+    def users(self, count):
+        self._insert(UserModel, [{
+            'username': f'{self.prefix}user{i}',
+            'email': f'{self.prefix}user{i}@example.com',
+            'firstName': f'Seed{i}',
+            'lastName': 'User',
+            'callsign': f'{self.prefix.upper()}{i}',
+            'emailVerified': True,
+            'language': 'en',
+            'has_password': True,
+            'expiryDate': self.now + timedelta(days=self.rng.randint(30, 365)) if self.rng.random() < 0.1 else None,
+        } for i in range(count)])
+        self.user_ids = self._ids(UserModel.id, UserModel.username, f'{self.prefix}user')
+
+        memberships, group_memberships = [], []
+        for user_id in self.user_ids:
+            memberships.append({'user_id': user_id, 'role_id': self.user_role_id})
+            for role_id in self._sample(self.role_ids, 0, 2):
+                memberships.append({'user_id': user_id, 'role_id': role_id})
+            for group_id in self._sample(self.group_ids, 1, 3):
+                group_memberships.append({'user_id': user_id, 'group_id': group_id, 'direction': 'BOTH'})
+        self._insert(user_role_association, memberships)
+        self._insert(GroupUserAssociation, group_memberships)
+
+    def _direct_users(self, resource_ids, key, high):
+        """A few directly assigned users for some of the resources"""
+        rows = []
+        for resource_id in resource_ids:
+            if self.rng.random() < 0.2:
+                rows.extend({'user_id': user_id, key: resource_id} for user_id in self._sample(self.user_ids, 1, high))
+        return rows
+
+    def tak_profiles(self, count):
+        self._insert(TakProfileModel, [{
+            'name': f'{self.prefix} profile {i}',
+            'description': 'Generated TAK profile',
+            'isPublic': self.rng.random() < 0.2,
+            'takTemplateFolderLocation': f'{self.prefix}_profile_{i}',
+            'injectCallsign': False,
+        } for i in range(count)])
+        profile_ids = self._ids(TakProfileModel.id, TakProfileModel.name, f'{self.prefix} profile ')
+        self._insert(role_takprofile_association, [
+            {'role_id': role_id, 'takprofile_id': profile_id}
+            for profile_id in profile_ids for role_id in self._sample(self.role_ids, 1, 3)
+        ])
+        self._insert(user_takprofile_association, self._direct_users(profile_ids, 'takprofile_id', 5))
+
+    def radios(self, count):
+        self._insert(RadioModel, [{
+            'name': f'{self.prefix}-radio-{i}',
+            'platform': self.rng.choice(['heltec_v3', 'tbeam', 'rak4631', 'tlora_v2']),
+            'radioType': 'meshtastic' if self.rng.random() < 0.9 else 'other',
+            'shortName': f'S{i % 10000:04d}',
+            'longName': f'Seed Radio {i}',
+            'mac': self._mac(),
+            'assignedTo': self.rng.choice(self.user_ids) if self.user_ids and self.rng.random() < 0.7 else None,
+            'owner': self.rng.choice(self.user_ids) if self.user_ids and self.rng.random() < 0.3 else None,
+        } for i in range(count)])
+
+    def meshtastic(self, channels, channel_groups):
+        self._insert(MeshtasticModel, [{
+            'name': f'{self.prefix}-channel-{i}',
+            'description': 'Generated channel',
+            'url': f'https://meshtastic.org/e/#{self.rng.randbytes(18).hex()}',
+            'isPublic': self.rng.random() < 0.2,
+            'showOnHomepage': self.rng.random() < 0.5,
+            'defaultRadioConfig': False,
+        } for i in range(channels)])
+        channel_ids = self._ids(MeshtasticModel.id, MeshtasticModel.name, f'{self.prefix}-channel-')
+        self._insert(role_meshtastic_association, [
+            {'role_id': role_id, 'meshtastic_id': channel_id}
+            for channel_id in channel_ids for role_id in self._sample(self.role_ids, 1, 3)
+        ])
+        self._insert(user_meshtastic_association, self._direct_users(channel_ids, 'meshtastic_id', 5))
+
+        self._insert(MeshtasticChannelGroup, [{
+            'name': f'{self.prefix}-channel-group-{i}',
+            'description': 'Generated channel group',
+            'isPublic': self.rng.random() < 0.2,
+            'showOnHomepage': True,
+            'created_at': self.now,
+            'updated_at': self.now,
+        } for i in range(channel_groups)])
+        group_ids = self._ids(MeshtasticChannelGroup.id, MeshtasticChannelGroup.name, f'{self.prefix}-channel-group-')
+        self._insert(ChannelGroupMembership, [
+            {'group_id': group_id, 'channel_id': channel_id, 'slot_number': slot}
+            for group_id in group_ids
+            for slot, channel_id in enumerate(self._sample(channel_ids, 1, CHANNELS_PER_GROUP))
+        ])
+        self._insert(role_meshtastic_group_association, [
+            {'role_id': role_id, 'group_id': group_id}
+            for group_id in group_ids for role_id in self._sample(self.role_ids, 1, 3)
+        ])
+        self._insert(user_meshtastic_group_association, self._direct_users(group_ids, 'group_id', 5))
+
+    def announcements(self, count, read_fraction):
+        if not self.user_ids:
+            return
+        self._insert(AnnouncementModel, [{
+            'title': f'{self.prefix} announcement {i}',
+            'content': f'<p>Generated announcement {i}</p>',
+            'target_type': 'all',
+            'status': 'sent',
+            'sent_at': self.now - timedelta(hours=i),
+            'send_email': False,
+            'created_by': self.user_ids[0],
+            'created_at': self.now - timedelta(hours=i),
+            'updated_at': self.now - timedelta(hours=i),
+        } for i in range(count)])
+        announcement_ids = self._ids(AnnouncementModel.id, AnnouncementModel.title, f'{self.prefix} announcement ')
+        readers = max(0, min(len(self.user_ids), int(len(self.user_ids) * read_fraction)))
+        self._insert(AnnouncementReadModel, [{
+            'announcement_id': announcement_id,
+            'user_id': user_id,
+            'read_at': self.now,
+            'email_opened': False,
+            'dismissed': self.rng.random() < 0.1,
+        } for announcement_id in announcement_ids for user_id in self.rng.sample(self.user_ids, readers)])
+
+    def pending_registrations(self, count):
+        self._insert(OnboardingCodeModel, [{
+            'name': f'{self.prefix} onboarding code',
+            'description': 'Generated onboarding code',
+            'onboardingCode': f'{self.prefix.upper()}-PENDING',
+            'uses': 0,
+            'autoApprove': False,
+            'requireApproval': True,
+            'approverRoleId': self.role_ids[0] if self.role_ids else None,
+        }])
+        code_id = self._ids(OnboardingCodeModel.id, OnboardingCodeModel.name, f'{self.prefix} onboarding code')[0]
+        self._insert(role_onboardingcode_association, [{'role_id': self.user_role_id, 'onboardingcode_id': code_id}])
+        statuses = ['pending_verification', 'pending_approval', 'approved', 'rejected']
+        self._insert(PendingRegistrationModel, [{
+            'username': f'{self.prefix}pending{i}',
+            'email': f'{self.prefix}pending{i}@example.com',
+            'password': 'seeded-password',
+            'firstName': f'Pending{i}',
+            'lastName': 'Registration',
+            'callsign': f'{self.prefix.upper()}P{i}',
+            'onboarding_code_id': code_id,
+            'verification_token': secrets.token_urlsafe(32),
+            'approval_token': secrets.token_urlsafe(32),
+            'approval_status': self.rng.choice(statuses),
+            # Some already expired, so the cleanup job has work to do
+            'expires_at': self.now + timedelta(days=self.rng.randint(-3, 7)),
+            'created_at': self.now,
+        } for i in range(count)])
+
+
+def generate_dataset(users=10000, roles=20, groups=50, profiles=50, radios=2000, channels=1000,
+                     channel_groups=200, announcements=100, read_fraction=0.3, pending=500,
+                     prefix='seed', seed=42, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Insert a generated dataset and commit it. Returns {table: rows inserted}.
+    Raises ValueError if a dataset with this prefix already exists.
+    """
+    seeder = DatasetSeeder(prefix, seed, batch_size)
+    if seeder.exists():
+        raise ValueError(f"A dataset with prefix '{prefix}' already exists, choose another prefix")
+    try:
+        seeder.roles(roles)
+        seeder.ots_groups(groups)
+        seeder.users(users)
+        seeder.tak_profiles(profiles)
+        seeder.radios(radios)
+        seeder.meshtastic(channels, channel_groups)
+        seeder.announcements(announcements, read_fraction)
+        seeder.pending_registrations(pending)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return seeder.counts
@@ -0,0 +1,231 @@
+"""
+Account Expiry Service
+
+Removes user accounts whose expiryDate has passed, from OTS and from the
+local database.
+
+Expired users are processed in chunks of ACCOUNT_EXPIRY_CHUNK_SIZE:
+1. Delete the chunk's users from OTS, up to ACCOUNT_EXPIRY_OTS_CONCURRENCY at a time
+2. For the users OTS confirmed (or no longer knows), clear their tokens,
+   kiosk sessions, announcement reads and radio assignments, and unset
+   references to them (onboardedBy, onboarding code contacts, creators of
+   announcements and API keys) with set-based statements, then delete the
+   users
+3. Commit, then record progress
+
+A user whose OTS delete fails is left in place and retried on the next run,
+since it is still expired. Its failure count and last error are kept in the
+progress record. If OTS is unavailable the run stops after the
+current chunk instead of failing every remaining user.
+
+Progress of the last run is stored as the 'account_expiry_progress' system
+setting in the 'sync' category.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+
+from app.exceptions import BadRequestError
+from app.models import (
+    AnnouncementModel, AnnouncementReadModel, ApiKeyModel, KioskSessionModel, OneTimeTokenModel,
+    OnboardingCodeModel, PendingRegistrationModel, RadioModel, SystemSettingsModel, UserModel, db
+)
+from app.ots import otsClient
+
+DEFAULT_CHUNK_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+
+PROGRESS_SETTING = 'account_expiry_progress'
+
+# OTS answers 400 when asked to delete a user it does not have
+_MISSING_USER_MARKERS = ('not exist', 'not found', 'no such user', 'does not exist')
+
+
+class AccountExpiryService:
+    """Batched removal of expired user accounts"""
+
+    @staticmethod
+    def expired_users_query(now=None):
+        return UserModel.query.filter(UserModel.expiryDate < (now or datetime.now())).order_by(UserModel.id)
+
+    @staticmethod
+    def preview(limit=100):
+        """
+        Dry run: return (total, users) for the accounts the next run would
+        remove, with the failure record of users that failed before.
+        """
+        query = AccountExpiryService.expired_users_query()
+        failed = (AccountExpiryService.get_progress() or {}).get('failed', {})
+        users = [{
+            'id': user.id,
+            'username': user.username,
+            'expiryDate': user.expiryDate.isoformat() if user.expiryDate else None,
+            'previousFailure': failed.get(user.username),
+        } for user in query.limit(limit).all()]
+        return query.order_by(None).count(), users
+
+    @staticmethod
+    def _delete_from_ots(app, username):
+        """Returns (username, error) - error is None when the user is gone from OTS"""
+        with app.app_context():
+            try:
+                otsClient.delete_user(username)
+                return username, None
+            except BadRequestError as e:
+                if any(marker in str(e).lower() for marker in _MISSING_USER_MARKERS):
+                    return username, None
+                return username, e
+            except Exception as e:
+                return username, e
+
+    @staticmethod
+    def _cleanup_users(user_ids):
+        """Set-based removal of rows that reference the users, then the users themselves"""
+        OneTimeTokenModel.query.filter(OneTimeTokenModel.user_id.in_(user_ids)).delete(synchronize_session=False)
+        KioskSessionModel.query.filter(KioskSessionModel.user_id.in_(user_ids)).delete(synchronize_session=False)
+        AnnouncementReadModel.query.filter(AnnouncementReadModel.user_id.in_(user_ids)).delete(synchronize_session=False)
+        RadioModel.query.filter(RadioModel.assignedTo.in_(user_ids)).update({'assignedTo': None}, synchronize_session=False)
+        RadioModel.query.filter(RadioModel.owner.in_(user_ids)).update({'owner': None}, synchronize_session=False)
+        PendingRegistrationModel.query.filter(PendingRegistrationModel.approved_by.in_(user_ids)).update(
+            {'approved_by': None}, synchronize_session=False
+        )
+        UserModel.query.filter(UserModel.onboardedBy.in_(user_ids)).update({'onboardedBy': None}, synchronize_session=False)
+        OnboardingCodeModel.query.filter(OnboardingCodeModel.onboardContactId.in_(user_ids)).update(
+            {'onboardContactId': None}, synchronize_session=False
+        )
+        AnnouncementModel.query.filter(AnnouncementModel.created_by.in_(user_ids)).update(
+            {'created_by': None}, synchronize_session=False
+        )
+        ApiKeyModel.query.filter(ApiKeyModel.created_by.in_(user_ids)).update({'created_by': None}, synchronize_session=False)
+        # Users go through the ORM so role, group and profile associations cascade
+        for user in UserModel.query.filter(UserModel.id.in_(user_ids)).all():
+            db.session.delete(user)
+
+    @staticmethod
+    def run(chunk_size=None, concurrency=None):
+        """
+        Remove all expired accounts. Returns the progress dict that is also
+        stored in the account_expiry_progress setting.
+        """
+        config = current_app.config
+        chunk_size = chunk_size or int(config.get('ACCOUNT_EXPIRY_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+        concurrency = concurrency or int(config.get('ACCOUNT_EXPIRY_OTS_CONCURRENCY', DEFAULT_CONCURRENCY))
+        app = current_app._get_current_object()
+
+        previous = AccountExpiryService.get_progress() or {}
+        failed = previous.get('failed', {})
+        # Forget failures of users that have since been removed some other way
+        if failed:
+            remaining = {u.username for u in UserModel.query.filter(UserModel.username.in_(list(failed))).all()}
+            failed = {name: record for name, record in failed.items() if name in remaining}
+        progress = {
+            'started_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'status': 'running',
+            'processed': 0,
+            'deleted': 0,
+            'failed_count': 0,
+            'chunks': 0,
+            'failed': failed,
+        }
+        started = time.monotonic()
+        now = datetime.now()
+        last_id = 0
+
+        # Log in once up front rather than from every worker thread
+        if not otsClient.auth_token:
+            try:
+                otsClient.login()
+            except Exception as e:
+                current_app.logger.warning(f"Could not log in to OTS, skipping expired account removal: {e}")
+                progress.update(status='aborted', finished_at=datetime.now().isoformat())
+                AccountExpiryService._record_progress(progress)
+                return progress
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            while True:
+                chunk = AccountExpiryService.expired_users_query(now).filter(
+                    UserModel.id > last_id
+                ).limit(chunk_size).all()
+                if not chunk:
+                    progress['status'] = 'complete'
+                    break
+                last_id = chunk[-1].id
+                ids_by_name = {user.username: user.id for user in chunk}
+
+                results = list(pool.map(lambda name: AccountExpiryService._delete_from_ots(app, name), ids_by_name))
+                deleted_ids = []
+                ots_down = False
+                for username, error in results:
+                    if error is None:
+                        deleted_ids.append(ids_by_name[username])
+                        failed.pop(username, None)
+                        continue
+                    ots_down = ots_down or isinstance(error, ConnectionError)
+                    record = failed.get(username, {'attempts': 0})
+                    failed[username] = {
+                        'attempts': record['attempts'] + 1,
+                        'error': str(error)[:500],
+                        'last_attempt': datetime.now().isoformat(),
+                    }
+                    current_app.logger.warning(f"Failed to delete expired user '{username}' from OTS: {error}")
+
+                try:
+                    if deleted_ids:
+                        AccountExpiryService._cleanup_users(deleted_ids)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"Failed to remove expired users locally: {e}")
+                    for username, user_id in ids_by_name.items():
+                        if user_id in deleted_ids:
+                            failed[username] = {
+                                'attempts': failed.get(username, {'attempts': 0})['attempts'] + 1,
+                                'error': f"Local delete failed: {str(e)[:450]}",
+                                'last_attempt': datetime.now().isoformat(),
+                            }
+                    deleted_ids = []
+
+                progress['processed'] += len(chunk)
+                progress['deleted'] += len(deleted_ids)
+                progress['failed_count'] = progress['processed'] - progress['deleted']
+                progress['chunks'] += 1
+                AccountExpiryService._record_progress(progress)
+
+                if ots_down:
+                    current_app.logger.warning("OTS unavailable, stopping expired account removal until the next run")
+                    progress['status'] = 'aborted'
+                    break
+
+        progress['finished_at'] = datetime.now().isoformat()
+        progress['duration_ms'] = int((time.monotonic() - started) * 1000)
+        AccountExpiryService._record_progress(progress)
+        current_app.logger.info(
+            f"Expired account removal {progress['status']}: {progress['deleted']} deleted, "
+            f"{progress['failed_count']} failed in {progress['duration_ms']}ms"
+        )
+        return progress
+
+    @staticmethod
+    def _record_progress(progress):
+        SystemSettingsModel.set_setting(
+            PROGRESS_SETTING, json.dumps(progress), category='sync',
+            description='Progress of the last expired account removal run'
+        )
+
+    @staticmethod
+    def get_progress():
+        """Return the progress dict of the last run, or None"""
+        value = SystemSettingsModel.get_setting(PROGRESS_SETTING)
+        try:
+            return json.loads(value) if value else None
+        except (ValueError, TypeError):
+            return None
+
+
+# Convenience instance
+account_expiry = AccountExpiryService()
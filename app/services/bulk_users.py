@@ -0,0 +1,327 @@
+"""
+Bulk User Operations Service
+
+Applies one operation to many users as a tracked background job:
+- add_role / remove_role        params: roleId
+- add_group / remove_group      params: groupId, direction (IN, OUT or BOTH)
+- set_expiry                    params: expiryDate (ISO 8601, or null to clear)
+- deactivate                    deactivates the users in OTS
+- delete                        deletes the users from OTS and the database
+
+The users are picked by id or by a filter (search, roleId, groupId) and the
+selection is fixed when the job is created. The job then works through them
+in batches of BULK_USER_CHUNK_SIZE:
+1. The batch's users are loaded with one query
+2. OTS calls for the batch run up to BULK_USER_OTS_CONCURRENCY at a time
+3. Local changes are written with set-based statements, only for users whose
+   OTS calls succeeded, and committed
+4. The job's progress counters are updated
+
+Failures are recorded per user (first MAX_RECORDED_ERRORS) and do not stop
+the job. add_group sets the group's direction like POST /groups/<id>/members;
+remove_group removes only the given directions.
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.models import (
+    BulkUserJobModel, GroupUserAssociation, OTSGroupModel, UserModel, UserRoleModel, db,
+    user_role_association
+)
+from app.ots import otsClient
+from app.services.account_expiry import AccountExpiryService
+from app.services.entitlements import entitlements
+from app.services.group_membership import DIRECTIONS, GroupMembershipService, MembershipOperation, expand_direction
+
+OPERATIONS = ('add_role', 'remove_role', 'add_group', 'remove_group', 'set_expiry', 'deactivate', 'delete')
+# Operations the requesting admin may not apply to their own account
+SELF_PROTECTED_OPERATIONS = ('deactivate', 'delete')
+
+DEFAULT_CHUNK_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+MAX_RECORDED_ERRORS = 100
+
+
+def _direction_of(directions):
+    """Stored direction for a set of OTS directions, None for none"""
+    if directions == {'IN', 'OUT'}:
+        return 'BOTH'
+    return next(iter(directions)) if directions else None
+
+
+class BulkUserService:
+    """Background bulk operations on users"""
+
+    @staticmethod
+    def validate(operation, params):
+        """Return the normalized params for operation. Raises ValueError when invalid."""
+        if operation not in OPERATIONS:
+            raise ValueError(f"Operation must be one of: {', '.join(OPERATIONS)}")
+        params = params or {}
+
+        if operation in ('add_role', 'remove_role'):
+            role = UserRoleModel.get_by_id(params.get('roleId')) if params.get('roleId') else None
+            if not role:
+                raise ValueError('roleId must be an existing role')
+            return {'roleId': role.id, 'roleName': role.name}
+
+        if operation in ('add_group', 'remove_group'):
+            group = OTSGroupModel.get_by_id(params.get('groupId')) if params.get('groupId') else None
+            if not group:
+                raise ValueError('groupId must be an existing group')
+            direction = params.get('direction', 'BOTH')
+            if direction not in DIRECTIONS:
+                raise ValueError('Direction must be IN, OUT, or BOTH')
+            return {'groupId': group.id, 'groupName': group.name, 'direction': direction}
+
+        if operation == 'set_expiry':
+            expiry = params.get('expiryDate')
+            if expiry:
+                try:
+                    expiry = datetime.fromisoformat(expiry.replace('Z', '+00:00')).isoformat()
+                except (AttributeError, ValueError):
+                    raise ValueError('expiryDate must be an ISO 8601 date or null')
+            return {'expiryDate': expiry or None}
+
+        return {}
+
+    @staticmethod
+    def select_user_ids(user_ids=None, filters=None):
+        """Ids of the existing users given by id or matching filters (search, roleId, groupId)"""
+        query = select(UserModel.id).order_by(UserModel.id)
+        if user_ids is not None:
+            if not isinstance(user_ids, list):
+                raise ValueError('userIds must be a list')
+            query = query.where(UserModel.id.in_(user_ids))
+        else:
+            filters = filters or {}
+            if not any(filters.get(k) for k in ('search', 'roleId', 'groupId')):
+                raise ValueError('userIds or a filter (search, roleId, groupId) is required')
+            if filters.get('search'):
+                search_filter = f"%{filters['search']}%"
+                query = query.where(
+                    (UserModel.username.ilike(search_filter)) |
+                    (UserModel.email.ilike(search_filter)) |
+                    (UserModel.callsign.ilike(search_filter))
+                )
+            if filters.get('roleId'):
+                query = query.where(UserModel.id.in_(
+                    select(user_role_association.c.user_id).where(user_role_association.c.role_id == filters['roleId'])
+                ))
+            if filters.get('groupId'):
+                query = query.where(UserModel.id.in_(
+                    select(GroupUserAssociation.user_id).where(GroupUserAssociation.group_id == filters['groupId'])
+                ))
+        return [user_id for (user_id,) in db.session.execute(query)]
+
+    @staticmethod
+    def create_job(operation, params, user_ids, created_by=None, actor_id=None):
+        """Validate and store a job. Raises ValueError when the request is invalid."""
+        params = BulkUserService.validate(operation, params)
+        if not user_ids:
+            raise ValueError('No users selected')
+        if operation in SELF_PROTECTED_OPERATIONS and actor_id in user_ids:
+            raise ValueError('The selection includes your own account')
+        job = BulkUserJobModel.create_job(operation, params, user_ids, created_by=created_by)
+        if not job:
+            raise ValueError('Failed to create bulk job')
+        return job
+
+    @staticmethod
+    def start(job):
+        """Run the job in a background thread"""
+        app = current_app._get_current_object()
+
+        def run_in_background(job_id):
+            with app.app_context():
+                BulkUserService.run(job_id)
+
+        thread = threading.Thread(target=run_in_background, args=(job.id,))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    @staticmethod
+    def run(job_id, chunk_size=None):
+        """Process a queued job to the end and return it"""
+        config = current_app.config
+        chunk_size = chunk_size or int(config.get('BULK_USER_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+        job = BulkUserJobModel.get_by_id(job_id)
+        if not job or job.operation not in OPERATIONS or job.status != 'queued':
+            return job
+
+        job.status = 'running'
+        job.started_at = datetime.now()
+        db.session.commit()
+
+        params = job.get_params()
+        user_ids = job.get_user_ids()
+        errors = []
+        handler = getattr(BulkUserService, f'_{job.operation}')
+        try:
+            for start in range(0, len(user_ids), chunk_size):
+                chunk = user_ids[start:start + chunk_size]
+                users = dict(db.session.execute(
+                    select(UserModel.id, UserModel.username).where(UserModel.id.in_(chunk))
+                ).all())
+                failures = {user_id: 'User not found' for user_id in chunk if user_id not in users}
+                try:
+                    failures.update(handler(users, params))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"Bulk job {job_id} ({job.operation}) batch failed: {e}")
+                    failures = {user_id: str(e) for user_id in chunk}
+
+                errors += [{'userId': user_id, 'username': users.get(user_id), 'error': str(error)[:500]}
+                           for user_id, error in failures.items()]
+                job.processed += len(chunk)
+                job.failed += len(failures)
+                job.succeeded = job.processed - job.failed
+                job.errors = json.dumps(errors[:MAX_RECORDED_ERRORS])
+                db.session.commit()
+            job.status = 'completed'
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Bulk job {job_id} ({job.operation}) failed: {e}")
+            job.status = 'failed'
+            job.errors = json.dumps((errors + [{'userId': None, 'username': None, 'error': str(e)[:500]}])[:MAX_RECORDED_ERRORS])
+
+        job.finished_at = datetime.now()
+        db.session.commit()
+        current_app.logger.info(
+            f"Bulk job {job_id} ({job.operation}) {job.status}: {job.succeeded} succeeded, {job.failed} failed"
+        )
+        return job
+
+    # Operations: each takes {user_id: username} and params, applies the change
+    # to the session and returns {user_id: error} for the users it failed
+    # =========================================================================
+
+    @staticmethod
+    def _add_role(users, params):
+        role_id = params['roleId']
+        existing = set(db.session.scalars(select(user_role_association.c.user_id).where(
+            user_role_association.c.role_id == role_id, user_role_association.c.user_id.in_(list(users))
+        )))
+        rows = [{'user_id': user_id, 'role_id': role_id} for user_id in users if user_id not in existing]
+        if rows:
+            db.session.execute(user_role_association.insert(), rows)
+            # Core statements bypass the entitlement cache's flush listener
+            entitlements.clear()
+        return {}
+
+    @staticmethod
+    def _remove_role(users, params):
+        result = db.session.execute(user_role_association.delete().where(
+            user_role_association.c.role_id == params['roleId'], user_role_association.c.user_id.in_(list(users))
+        ))
+        if result.rowcount:
+            entitlements.clear()
+        return {}
+
+    @staticmethod
+    def _change_group(users, params, remove):
+        group = OTSGroupModel.get_by_id(params['groupId'])
+        if not group:
+            raise ValueError('Group no longer exists')
+        target = expand_direction(params['direction'])
+        current = {a.user_id: a for a in GroupUserAssociation.query.filter(
+            GroupUserAssociation.group_id == group.id, GroupUserAssociation.user_id.in_(list(users))
+        ).all()}
+
+        planned, calls = {}, []
+        for user_id, username in users.items():
+            assoc = current.get(user_id)
+            old = expand_direction(assoc.direction if assoc else None)
+            new = old - target if remove else target
+            if new == old:
+                continue
+            planned[user_id] = new
+            calls += [(username, MembershipOperation('add', group.name, d)) for d in sorted(new - old)]
+            calls += [(username, MembershipOperation('remove', group.name, d)) for d in sorted(old - new)]
+
+        concurrency = int(current_app.config.get('BULK_USER_OTS_CONCURRENCY', DEFAULT_CONCURRENCY))
+        errors = GroupMembershipService.run_operations(calls, concurrency) if calls else []
+        user_ids = {username: user_id for user_id, username in users.items()}
+        failures = {user_ids[username]: error for username, _, error in errors}
+
+        for user_id, new in planned.items():
+            if user_id in failures:
+                continue
+            assoc = current.get(user_id)
+            direction = _direction_of(new)
+            if direction is None:
+                db.session.delete(assoc)
+            elif assoc:
+                assoc.direction = direction
+            else:
+                db.session.add(GroupUserAssociation(group_id=group.id, user_id=user_id, direction=direction))
+        return failures
+
+    @staticmethod
+    def _add_group(users, params):
+        return BulkUserService._change_group(users, params, remove=False)
+
+    @staticmethod
+    def _remove_group(users, params):
+        return BulkUserService._change_group(users, params, remove=True)
+
+    @staticmethod
+    def _set_expiry(users, params):
+        expiry = datetime.fromisoformat(params['expiryDate']) if params.get('expiryDate') else None
+        UserModel.query.filter(UserModel.id.in_(list(users))).update(
+            {UserModel.expiryDate: expiry}, synchronize_session=False
+        )
+        return {}
+
+    @staticmethod
+    def _deactivate(users, params):
+        def deactivate(app, username):
+            with app.app_context():
+                try:
+                    otsClient.deactivate_user(username)
+                    return username, None
+                except Exception as e:
+                    return username, e
+
+        user_ids = {username: user_id for user_id, username in users.items()}
+        return {user_ids[username]: error for username, error in BulkUserService._run_ots(deactivate, users.values())
+                if error is not None}
+
+    @staticmethod
+    def _delete(users, params):
+        user_ids = {username: user_id for user_id, username in users.items()}
+        results = BulkUserService._run_ots(AccountExpiryService._delete_from_ots, users.values())
+        failures = {user_ids[username]: error for username, error in results if error is not None}
+        deleted = [user_id for user_id in users if user_id not in failures]
+        if deleted:
+            AccountExpiryService._cleanup_users(deleted)
+        return failures
+
+    @staticmethod
+    def _run_ots(call, usernames):
+        """Run call(app, username) -> (username, error) for every username, several at a time"""
+        usernames = list(usernames)
+        if not usernames:
+            return []
+        # Log in once up front rather than from every worker thread
+        if not otsClient.auth_token:
+            try:
+                otsClient.login()
+            except Exception as e:
+                return [(username, e) for username in usernames]
+        app = current_app._get_current_object()
+        concurrency = int(current_app.config.get('BULK_USER_OTS_CONCURRENCY', DEFAULT_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(usernames)))) as pool:
+            return list(pool.map(lambda username: call(app, username), usernames))
+
+
+# Convenience instance
+bulk_users = BulkUserService()
@@ -0,0 +1,70 @@
+"""
+Expired Record Cleanup
+
+Removes expired one-time tokens, kiosk sessions and pending registrations,
+and clears passwords left on old user import rows, on a schedule (see
+cleanup_expired_records in app/jobs.py) instead of on request paths. Each model's cleanup deletes in chunks with set-based
+DELETEs over its expires_at index.
+
+Per-table counters of the runs in this process are kept in cleanup_metrics
+for the admin status endpoint.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from app.models import KioskSessionModel, OneTimeTokenModel, PendingRegistrationModel, UserImportRowModel
+
+CLEANUPS = (
+    ('one_time_tokens', OneTimeTokenModel.cleanup_expired_tokens),
+    ('kiosk_sessions', KioskSessionModel.cleanup_expired),
+    ('pending_registrations', PendingRegistrationModel.cleanup_expired),
+    ('user_import_passwords', UserImportRowModel.purge_passwords),
+)
+
+
+class CleanupMetrics:
+    """Counters of expired-record cleanup runs, per table"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}
+
+    def observe(self, table, deleted, duration, error=False):
+        with self._lock:
+            stats = self._tables.setdefault(table, {
+                'runs': 0, 'errors': 0, 'deleted_total': 0,
+                'last_deleted': 0, 'last_duration_ms': 0, 'last_run_at': None
+            })
+            stats['runs'] += 1
+            stats['errors'] += 1 if error else 0
+            stats['deleted_total'] += deleted
+            stats['last_deleted'] = deleted
+            stats['last_duration_ms'] = int(duration * 1000)
+            stats['last_run_at'] = datetime.now().isoformat()
+
+    def snapshot(self):
+        with self._lock:
+            return {table: dict(stats) for table, stats in self._tables.items()}
+
+
+cleanup_metrics = CleanupMetrics()
+
+
+def run_expired_cleanup():
+    """Run every cleanup, returns {table: rows deleted}"""
+    results = {}
+    for table, cleanup in CLEANUPS:
+        started = time.monotonic()
+        try:
+            deleted = cleanup()
+            error = False
+        except Exception as e:
+            current_app.logger.error(f"Cleanup of expired {table} failed: {e}")
+            deleted, error = 0, True
+        cleanup_metrics.observe(table, deleted, time.monotonic() - started, error=error)
+        results[table] = deleted
+    return results
@@ -0,0 +1,368 @@
+"""
+Data Package Store
+
+Content-addressed storage for the files of TAK profile data packages, so the
+imagery, map tiles and APKs many profiles share are kept on disk once:
+
+    <DATAPACKAGE_UPLOAD_FOLDER>/.blobs/<first two hex digits>/<sha256>
+
+Profile folders keep their normal layout (downloads and the file browser
+read them as before), but each file is a hardlink to its blob. Extraction
+(app/services/datapackage_upload.py) hashes every file and ingests it: a
+new hash becomes a blob by linking the extracted file into the store, a
+known hash replaces the extracted file with a link to the existing blob.
+Where hardlinks are not possible the file simply stays a separate copy.
+The profile's manifest ({path: {size, mtime, sha256}}) records which blobs it uses.
+
+Download archives are built once per package version and cached as
+.archives/<key>.zip, keyed by the profile's contentHash; a download copies
+the cached archive and only adds the personalized preference file. Before
+an archive is reused the profile folder is checked for changes made on
+disk (mtimes newer than the archive, or files that differ from the
+manifest); a changed folder is rehashed and gets a new archive.
+
+Folders that existed before the store are only adopted (hashed and linked
+to blobs) by "flask datapackages dedupe". Once linked, a file must not be
+edited in place, since its blob is shared with every profile using it.
+
+collect_garbage removes blobs no manifest references (and that no folder
+still links) and archives of package versions no profile uses any more.
+verify_blobs rehashes the blobs; verify_profile checks a profile's folder
+against its manifest.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.models import TakProfileModel, db
+from app.services.datapackage_upload import build_manifest, folder_path, package_hash, upload_root
+
+BLOBS_DIR = '.blobs'
+ARCHIVES_DIR = '.archives'
+HASH_BLOCK_SIZE = 1024 * 1024
+# Unreferenced blobs and archives younger than this may belong to an extraction in progress
+GC_GRACE_SECONDS = 3600
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_path(path):
+    return (path or '').replace('\\', '/').strip('/')
+
+
+class DatapackageStoreService:
+    """Deduplicated blob storage, cached download archives and integrity checks"""
+
+    @staticmethod
+    def enabled():
+        return bool(current_app.config.get('DATAPACKAGE_DEDUPLICATION', True))
+
+    @staticmethod
+    def blob_path(sha256):
+        return os.path.join(upload_root(), BLOBS_DIR, sha256[:2], sha256)
+
+    @staticmethod
+    def ingest(path, sha256):
+        """
+        Make the file at path (with the given hash) share storage with its
+        blob, creating the blob if it is new. Returns True when deduplicated.
+        """
+        blob = DatapackageStoreService.blob_path(sha256)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(path, blob)
+                return True
+            except FileExistsError:
+                pass  # stored by a concurrent extraction
+            except OSError:
+                return False  # no hardlinks here, keep the copy
+
+        if os.path.getsize(blob) != os.path.getsize(path):
+            # A damaged blob is replaced by the good file rather than linked
+            current_app.logger.warning(f"Replacing damaged data package blob {sha256}")
+            return DatapackageStoreService._link_over(path, blob)
+        return DatapackageStoreService._link_over(blob, path)
+
+    @staticmethod
+    def _link_over(source, target):
+        """Atomically replace target with a hardlink to source"""
+        temp = f'{target}.{os.getpid()}-{threading.get_ident()}.link'
+        try:
+            os.link(source, temp)
+            os.replace(temp, target)
+            return True
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+            return False
+
+    @staticmethod
+    def ingest_folder(folder, files):
+        """Ingest every file of a manifest extracted under folder, returns how many were deduplicated"""
+        return sum(
+            DatapackageStoreService.ingest(os.path.join(folder, *path.split('/')), entry['sha256'])
+            for path, entry in files.items()
+        )
+
+    @staticmethod
+    def scan_folder(folder, hash_files=True):
+        """Manifest files and directories of an extracted folder, hashing every file unless hash_files is False"""
+        files, dirs = {}, []
+
+        def scan(path, prefix):
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    relative = f'{prefix}{entry.name}'
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(relative)
+                        scan(entry.path, f'{relative}/')
+                    elif entry.is_file(follow_symlinks=False):
+                        info = entry.stat()
+                        files[relative] = {
+                            'size': info.st_size,
+                            'mtime': datetime.fromtimestamp(int(info.st_mtime)).isoformat(),
+                            'sha256': file_sha256(entry.path) if hash_files else None,
+                        }
+
+        scan(folder, '')
+        return files, sorted(dirs)
+
+    @staticmethod
+    def adopt_profile(profile):
+        """
+        Hash and ingest the folder of a profile extracted before the store
+        existed, and store its manifest. Returns the manifest's files.
+        """
+        folder = folder_path(profile.takTemplateFolderLocation)
+        files, dirs = DatapackageStoreService.scan_folder(folder)
+        if DatapackageStoreService.enabled():
+            DatapackageStoreService.ingest_folder(folder, files)
+        profile.contentHash = package_hash(files)
+        profile.contentManifest = json.dumps(build_manifest(files, dirs))
+        db.session.commit()
+        return files
+
+    @staticmethod
+    def refresh_manifest(profile):
+        """
+        Rehash the folder of a profile whose files were changed on disk and
+        store the new manifest. Files are not linked to the store: a folder
+        managed by hand keeps its own copies. Returns the manifest's files.
+        """
+        folder = folder_path(profile.takTemplateFolderLocation)
+        files, dirs = DatapackageStoreService.scan_folder(folder)
+        profile.contentHash = package_hash(files)
+        profile.contentManifest = json.dumps(build_manifest(files, dirs))
+        db.session.commit()
+        current_app.logger.info(f"TAK profile {profile.id} changed on disk, manifest refreshed")
+        return files
+
+    @staticmethod
+    def _modified_after(folder, timestamp):
+        """True when folder or anything below it was modified after timestamp"""
+        pending = [folder]
+        while pending:
+            path = pending.pop()
+            if os.stat(path).st_mtime > timestamp:
+                return True
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.stat(follow_symlinks=False).st_mtime > timestamp:
+                        return True
+        return False
+
+    @staticmethod
+    def _matches_manifest(folder, manifest):
+        """Cheap check that folder has the manifest's files with the manifest's sizes"""
+        files, _ = DatapackageStoreService.scan_folder(folder, hash_files=False)
+        expected = manifest.get('files', {})
+        return files.keys() == expected.keys() and all(files[p]['size'] == expected[p]['size'] for p in files)
+
+    # Download archives
+    # =========================================================================
+
+    @staticmethod
+    def archive_key(content_hash, exclude=None):
+        return hashlib.sha256(f'{content_hash}\0{normalize_path(exclude)}'.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def base_archive(profile, exclude=None):
+        """
+        Path of a ZIP with every file of the profile's package except
+        exclude, built on first use and reused until the package changes.
+        A folder edited on disk since the archive was built, or whose files
+        no longer match the manifest, gets its manifest refreshed first.
+        """
+        folder = folder_path(profile.takTemplateFolderLocation)
+        key = DatapackageStoreService.archive_key(profile.contentHash, exclude)
+        path = os.path.join(upload_root(), ARCHIVES_DIR, f'{key}.zip')
+        manifest = profile.get_content_manifest() or {'files': {}}
+        if os.path.exists(path):
+            if not DatapackageStoreService._modified_after(folder, os.path.getmtime(path)):
+                os.utime(path)
+                return path
+            stale = True
+        else:
+            stale = not DatapackageStoreService._matches_manifest(folder, manifest)
+        if stale:
+            DatapackageStoreService.refresh_manifest(profile)
+            manifest = profile.get_content_manifest()
+            key = DatapackageStoreService.archive_key(profile.contentHash, exclude)
+            path = os.path.join(upload_root(), ARCHIVES_DIR, f'{key}.zip')
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(temp, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for name in sorted(manifest['files']):
+                    if name != normalize_path(exclude):
+                        archive.write(os.path.join(folder, *name.split('/')), name)
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        return path
+
+    # Maintenance
+    # =========================================================================
+
+    @staticmethod
+    def _manifests():
+        """(profile id, manifest files) for every profile with a manifest"""
+        rows = db.session.execute(
+            select(TakProfileModel.id, TakProfileModel.contentManifest).where(TakProfileModel.contentManifest.isnot(None))
+        )
+        for profile_id, manifest in rows:
+            try:
+                yield profile_id, json.loads(manifest).get('files', {})
+            except ValueError:
+                continue
+
+    @staticmethod
+    def _blobs():
+        """(sha256, path) of every stored blob"""
+        root = os.path.join(upload_root(), BLOBS_DIR)
+        if not os.path.isdir(root):
+            return
+        for prefix in os.scandir(root):
+            if prefix.is_dir():
+                for entry in os.scandir(prefix.path):
+                    if entry.is_file() and len(entry.name) == 64:
+                        yield entry.name, entry.path
+
+    @staticmethod
+    def collect_garbage(grace_seconds=GC_GRACE_SECONDS):
+        """Delete unreferenced blobs and unused archives, returns {blobs, archives, bytes}"""
+        referenced = set()
+        for _, files in DatapackageStoreService._manifests():
+            referenced.update(entry['sha256'] for entry in files.values())
+        cutoff = time.time() - grace_seconds
+        removed = {'blobs': 0, 'archives': 0, 'bytes': 0}
+
+        for sha256, path in DatapackageStoreService._blobs():
+            if sha256 in referenced:
+                continue
+            info = os.stat(path)
+            # A blob still linked from a folder is in use by an extraction not yet committed
+            if info.st_nlink > 1 or info.st_mtime > cutoff:
+                continue
+            os.remove(path)
+            removed['blobs'] += 1
+            removed['bytes'] += info.st_size
+
+        keys = set()
+        for profile in TakProfileModel.query.filter(TakProfileModel.contentHash.isnot(None)).all():
+            keys.add(DatapackageStoreService.archive_key(profile.contentHash))
+            keys.add(DatapackageStoreService.archive_key(profile.contentHash, profile.takPrefFileLocation))
+        archives = os.path.join(upload_root(), ARCHIVES_DIR)
+        if os.path.isdir(archives):
+            for entry in os.scandir(archives):
+                info = entry.stat()
+                # Leftover .tmp files of interrupted builds go too
+                if entry.name[:-len('.zip')] not in keys and info.st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed['archives'] += 1
+                    removed['bytes'] += info.st_size
+        return removed
+
+    @staticmethod
+    def verify_blobs(repair=False):
+        """
+        Rehash every blob. Returns {checked, corrupt: [{sha256, profiles}]};
+        with repair=True corrupt blobs are removed from the store (profile
+        files linked to them are damaged too and need a new upload).
+        """
+        users = {}
+        for profile_id, files in DatapackageStoreService._manifests():
+            for entry in files.values():
+                users.setdefault(entry['sha256'], set()).add(profile_id)
+
+        checked, corrupt = 0, []
+        for sha256, path in DatapackageStoreService._blobs():
+            checked += 1
+            if file_sha256(path) != sha256:
+                corrupt.append({'sha256': sha256, 'profiles': sorted(users.get(sha256, ()))})
+                if repair:
+                    os.remove(path)
+        return {'checked': checked, 'corrupt': corrupt}
+
+    @staticmethod
+    def verify_profile(profile, full=False):
+        """
+        Compare a profile's folder with its manifest: missing files and size
+        mismatches, and with full=True content hashes. Returns a list of
+        {path, problem}.
+        """
+        manifest = profile.get_content_manifest()
+        if manifest is None:
+            return [{'path': None, 'problem': 'no manifest'}]
+        folder = folder_path(profile.takTemplateFolderLocation)
+        problems = []
+        for path, entry in sorted(manifest['files'].items()):
+            full_path = os.path.join(folder, *path.split('/'))
+            if not os.path.isfile(full_path):
+                problems.append({'path': path, 'problem': 'missing'})
+            elif os.path.getsize(full_path) != entry['size']:
+                problems.append({'path': path, 'problem': 'size mismatch'})
+            elif full and file_sha256(full_path) != entry['sha256']:
+                problems.append({'path': path, 'problem': 'hash mismatch'})
+        return problems
+
+    @staticmethod
+    def stats():
+        """Blob count and bytes on disk against the bytes the manifests describe"""
+        blobs, stored = 0, 0
+        for _, path in DatapackageStoreService._blobs():
+            blobs += 1
+            stored += os.path.getsize(path)
+        logical = sum(entry['size'] for _, files in DatapackageStoreService._manifests() for entry in files.values())
+        return {
+            'blobs': blobs,
+            'storedBytes': stored,
+            'referencedBytes': logical,
+            'savedBytes': max(logical - stored, 0),
+        }
+
+
+# Convenience instance
+datapackage_store = DatapackageStoreService()
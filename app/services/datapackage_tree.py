@@ -0,0 +1,131 @@
+"""
+TAK Profile File Tree
+
+Serves the profile file browser from the content manifest written when the
+package was extracted (app/services/datapackage_upload.py) instead of
+walking the folder on every request. Nodes:
+- directory: {name, path, isDir: True, size, fileCount, children}
+- file:      {name, path, isDir: False, size, mtime, sha256}
+
+Built trees are kept per worker in a small LRU keyed by profile id and
+contentHash, so a new package is picked up immediately. Profiles extracted
+before manifests existed get a tree from a plain os.scandir of their folder,
+without hashes (sha256 None) and without writing anything; their manifest is
+created by "flask datapackages dedupe".
+
+subtree() returns one directory limited to a depth: directories below it
+come back with children None and hasChildren, for lazy expansion.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from app.services.datapackage_store import datapackage_store
+from app.services.datapackage_upload import folder_path
+
+DEFAULT_MAX_ENTRIES = 32
+
+
+def build_tree(manifest, root_name):
+    """Nested, name-sorted tree of a manifest's files and directories"""
+    root = {'name': root_name, 'path': '', 'isDir': True, 'size': 0, 'fileCount': 0, 'children': {}}
+
+    def directory(path):
+        node = root
+        prefix = ''
+        for part in path.split('/'):
+            prefix = f'{prefix}/{part}' if prefix else part
+            child = node['children'].get(part)
+            if child is None:
+                child = {'name': part, 'path': prefix, 'isDir': True, 'size': 0, 'fileCount': 0, 'children': {}}
+                node['children'][part] = child
+            node = child
+        return node
+
+    for path in manifest.get('dirs', []):
+        directory(path)
+    for path, entry in manifest.get('files', {}).items():
+        parent, _, name = path.rpartition('/')
+        node = directory(parent) if parent else root
+        node['children'][name] = {
+            'name': name, 'path': path, 'isDir': False,
+            'size': entry.get('size'), 'mtime': entry.get('mtime'), 'sha256': entry.get('sha256')
+        }
+
+    def finish(node):
+        children = [node['children'][name] for name in sorted(node['children'])]
+        for child in children:
+            if child['isDir']:
+                finish(child)
+                node['size'] += child['size']
+                node['fileCount'] += child['fileCount']
+            else:
+                node['size'] += child['size'] or 0
+                node['fileCount'] += 1
+        node['children'] = children
+
+    finish(root)
+    return root
+
+
+def subtree(tree, path='', depth=None):
+    """
+    The directory at path with children expanded depth levels deep (all
+    when depth is None). Returns None when path is not a directory.
+    """
+    node = tree
+    for part in [p for p in path.split('/') if p]:
+        node = next((c for c in node['children'] if c['isDir'] and c['name'] == part), None)
+        if node is None:
+            return None
+    return node if depth is None else _limit(node, depth)
+
+
+def _limit(node, depth):
+    limited = {key: value for key, value in node.items() if key != 'children'}
+    if depth <= 0:
+        limited['children'] = None
+        limited['hasChildren'] = bool(node['children'])
+    else:
+        limited['children'] = [_limit(c, depth - 1) if c['isDir'] else c for c in node['children']]
+    return limited
+
+
+class FileTreeCache:
+    """Bounded, per-process LRU of built trees"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_tree(self, profile):
+        """The profile's full tree, from a scan of its folder when it has no manifest yet"""
+        key = (profile.id, profile.contentHash, profile.takTemplateFolderLocation)
+        with self._lock:
+            tree = self._entries.get(key)
+            if tree is not None:
+                self._entries.move_to_end(key)
+                return tree
+
+        folder = folder_path(profile.takTemplateFolderLocation)
+        if profile.contentHash:
+            manifest = profile.get_content_manifest() or {}
+        else:
+            files, dirs = datapackage_store.scan_folder(folder, hash_files=False)
+            manifest = {'files': files, 'dirs': dirs}
+        tree = build_tree(manifest, os.path.basename(os.path.normpath(folder)))
+        with self._lock:
+            self._entries[key] = tree
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return tree
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Convenience instance
+file_trees = FileTreeCache()
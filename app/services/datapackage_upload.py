@@ -0,0 +1,473 @@
+"""
+Data Package Upload Service
+
+Installs TAK profile data packages (ZIP archives) safely:
+- The archive is streamed entry by entry into a staging directory next to the
+  data package folders. Limits on entry count, total and per-file extracted
+  size and compression ratio are checked against the bytes actually written,
+  not just the sizes the archive claims, so zip bombs stop early. Absolute
+  paths, '..' components and symlinks are rejected.
+- Every file's sha256 is computed while it is written. The manifest
+  ({"version": 2, "files": {path: {size, mtime, sha256}}, "dirs": [path]})
+  and a hash over the files are stored on the profile for cache
+  invalidation; the file browser is served from it as well.
+- Files are deduplicated against the content-addressed store
+  (app/services/datapackage_store.py) before the folder is published.
+- The staging directory is renamed to a new, unused folder name and the
+  profile is pointed at it in one commit, so readers see either the old or
+  the new package, never a half-extracted one. The old folder is removed
+  afterwards.
+
+Large packages are uploaded in chunks (DatapackageUploadModel): the client
+creates an upload with the total size, PUTs chunks at the offset the server
+reports (an interrupted upload resumes from there), then completes it, which
+extracts the package in a background thread.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app.models import DatapackageUploadModel, TakProfileModel, UserRoleModel, db
+
+MANIFEST_VERSION = 2
+COPY_BLOCK_SIZE = 1024 * 1024
+# Entries smaller than this are not checked against the compression ratio
+RATIO_CHECK_MIN_BYTES = 1024 * 1024
+UPLOADS_DIR = '.uploads'
+STAGING_PREFIX = '.staging-'
+
+DEFAULT_MAX_UPLOAD_BYTES = 2 * 1024 ** 3
+DEFAULT_MAX_EXTRACTED_BYTES = 4 * 1024 ** 3
+DEFAULT_MAX_FILE_BYTES = 1024 ** 3
+DEFAULT_MAX_ENTRIES = 20000
+DEFAULT_MAX_COMPRESSION_RATIO = 100
+DEFAULT_UPLOAD_EXPIRY_HOURS = 24
+
+PROFILE_OPTIONS = ('name', 'description', 'isPublic', 'takPrefFileLocation', 'injectCallsign', 'roleIds')
+
+
+class PackageError(ValueError):
+    """The archive is invalid or exceeds a limit"""
+
+
+class UploadError(ValueError):
+    """The upload is not in a state that allows the request"""
+
+
+class UploadOffsetError(UploadError):
+    def __init__(self, expected):
+        super().__init__(f'Chunk must start at offset {expected}')
+        self.expected = expected
+
+
+@dataclass(frozen=True)
+class ExtractionLimits:
+    max_extracted_bytes: int = DEFAULT_MAX_EXTRACTED_BYTES
+    max_file_bytes: int = DEFAULT_MAX_FILE_BYTES
+    max_entries: int = DEFAULT_MAX_ENTRIES
+    max_ratio: int = DEFAULT_MAX_COMPRESSION_RATIO
+
+    @staticmethod
+    def from_config(config):
+        return ExtractionLimits(
+            max_extracted_bytes=int(config.get('DATAPACKAGE_MAX_EXTRACTED_BYTES', DEFAULT_MAX_EXTRACTED_BYTES)),
+            max_file_bytes=int(config.get('DATAPACKAGE_MAX_FILE_BYTES', DEFAULT_MAX_FILE_BYTES)),
+            max_entries=int(config.get('DATAPACKAGE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+            max_ratio=int(config.get('DATAPACKAGE_MAX_COMPRESSION_RATIO', DEFAULT_MAX_COMPRESSION_RATIO)),
+        )
+
+
+def _member_path(info):
+    """Normalized relative path of a zip entry, None for the archive root. Raises PackageError when unsafe."""
+    name = info.filename.replace('\\', '/')
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if name.startswith('/') or '\x00' in name or '..' in parts or (parts and ':' in parts[0]):
+        raise PackageError(f'Unsafe path in archive: {info.filename}')
+    if stat.S_ISLNK(info.external_attr >> 16):
+        raise PackageError(f'Symbolic links are not allowed: {info.filename}')
+    return '/'.join(parts) or None
+
+
+def extract_package(source, dest_dir, limits=None):
+    """
+    Extract the ZIP archive source (a path or seekable file object) into the
+    existing, empty dest_dir. Returns the manifest of the files
+    ({path: {size, mtime, sha256}}) and the directories the archive lists.
+    Raises PackageError when the archive is invalid or exceeds limits.
+    """
+    limits = limits or ExtractionLimits()
+    files, dirs = {}, set()
+    try:
+        with zipfile.ZipFile(source) as archive:
+            entries = archive.infolist()
+            if len(entries) > limits.max_entries:
+                raise PackageError(f'Archive has {len(entries)} entries, the limit is {limits.max_entries}')
+            # Cheap rejection on the declared sizes; the real sizes are checked while extracting
+            if sum(info.file_size for info in entries) > limits.max_extracted_bytes:
+                raise PackageError(f'Archive expands to more than {limits.max_extracted_bytes} bytes')
+
+            total = 0
+            for info in entries:
+                path = _member_path(info)
+                if path is None:
+                    continue
+                target = os.path.join(dest_dir, *path.split('/'))
+                if info.is_dir():
+                    os.makedirs(target, exist_ok=True)
+                    dirs.add(path)
+                    continue
+                if info.file_size > limits.max_file_bytes:
+                    raise PackageError(f'{path} is larger than {limits.max_file_bytes} bytes')
+
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                digest = hashlib.sha256()
+                size = 0
+                # 'xb' so a duplicate entry cannot overwrite an earlier file
+                with archive.open(info) as src, open(target, 'xb') as dst:
+                    while True:
+                        block = src.read(COPY_BLOCK_SIZE)
+                        if not block:
+                            break
+                        size += len(block)
+                        total += len(block)
+                        if size > limits.max_file_bytes:
+                            raise PackageError(f'{path} is larger than {limits.max_file_bytes} bytes')
+                        if total > limits.max_extracted_bytes:
+                            raise PackageError(f'Archive expands to more than {limits.max_extracted_bytes} bytes')
+                        if size > RATIO_CHECK_MIN_BYTES and size > max(info.compress_size, 1) * limits.max_ratio:
+                            raise PackageError(f'{path} exceeds the maximum compression ratio of {limits.max_ratio}')
+                        digest.update(block)
+                        dst.write(block)
+                files[path] = {
+                    'size': size,
+                    'mtime': datetime(*info.date_time).isoformat(),
+                    'sha256': digest.hexdigest(),
+                }
+    except zipfile.BadZipFile as e:
+        raise PackageError(f'Invalid ZIP archive: {e}')
+    except (FileExistsError, NotADirectoryError, IsADirectoryError):
+        raise PackageError('Archive contains conflicting or duplicate entries')
+    if not files:
+        raise PackageError('Archive contains no files')
+    return files, sorted(dirs)
+
+
+def build_manifest(files, dirs=()):
+    return {'version': MANIFEST_VERSION, 'files': files, 'dirs': list(dirs)}
+
+
+def package_hash(files):
+    """sha256 over the sorted file paths and their hashes"""
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(f"{path}\0{files[path]['sha256']}\n".encode())
+    return digest.hexdigest()
+
+
+def upload_root():
+    return current_app.config.get('DATAPACKAGE_UPLOAD_FOLDER', 'datapackages')
+
+
+def folder_path(location):
+    """Absolute-or-relative path of a profile's takTemplateFolderLocation"""
+    root = upload_root()
+    return location if location.startswith(root) else os.path.join(root, location)
+
+
+def _new_folder_name(root, filename):
+    base = secure_filename(filename or '')
+    base = (base[:-len('.zip')] if base.lower().endswith('.zip') else base) or 'datapackage'
+    name = base
+    while os.path.exists(os.path.join(root, name)):
+        name = f'{base}-{os.urandom(4).hex()}'
+    return name
+
+
+def _bool(value):
+    return value if isinstance(value, bool) else str(value).lower() == 'true'
+
+
+def profile_options_from_form(form):
+    """Profile fields present in a multipart form (as sent to POST/PUT /tak-profiles)"""
+    options = {key: form.get(key) for key in ('name', 'description', 'takPrefFileLocation') if key in form}
+    for key in ('isPublic', 'injectCallsign'):
+        if key in form:
+            options[key] = _bool(form.get(key))
+    if 'roleIds[]' in form:
+        options['roleIds'] = form.getlist('roleIds[]')
+    return options
+
+
+def normalize_profile_options(data):
+    """Profile fields from a JSON body. Raises ValueError when invalid."""
+    options = {key: data[key] for key in PROFILE_OPTIONS if key in data}
+    for key in ('isPublic', 'injectCallsign'):
+        if key in options:
+            options[key] = _bool(options[key])
+    if 'roleIds' in options:
+        if not isinstance(options['roleIds'], list):
+            raise ValueError('roleIds must be a list')
+    return options
+
+
+class DatapackageUploadService:
+    """Safe extraction and chunked, resumable uploads of TAK profile data packages"""
+
+    @staticmethod
+    def install_package(source, filename, options, profile=None):
+        """
+        Extract the archive source into a new folder and point profile (or a
+        new profile built from options) at it. Returns (profile, files).
+        Raises PackageError when the archive is rejected.
+        """
+        root = upload_root()
+        os.makedirs(root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=root)
+        try:
+            files, dirs = extract_package(source, staging, ExtractionLimits.from_config(current_app.config))
+            from app.services.datapackage_store import datapackage_store
+            if datapackage_store.enabled():
+                datapackage_store.ingest_folder(staging, files)
+            folder = _new_folder_name(root, filename)
+            os.rename(staging, os.path.join(root, folder))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        old_folder = profile.takTemplateFolderLocation if profile is not None else None
+        try:
+            if profile is None:
+                profile = TakProfileModel(
+                    name=options.get('name') or folder,
+                    description=options.get('description') or '',
+                    isPublic=options.get('isPublic', False),
+                    takPrefFileLocation=options.get('takPrefFileLocation', ''),
+                    injectCallsign=options.get('injectCallsign', False)
+                )
+                db.session.add(profile)
+            DatapackageUploadService.apply_options(profile, options)
+            profile.takTemplateFolderLocation = folder
+            profile.contentHash = package_hash(files)
+            profile.contentManifest = json.dumps(build_manifest(files, dirs))
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            shutil.rmtree(os.path.join(root, folder), ignore_errors=True)
+            raise
+
+        if old_folder and old_folder != folder:
+            DatapackageUploadService.remove_folder(old_folder, keep_for=profile.id)
+        return profile, files
+
+    @staticmethod
+    def apply_options(profile, options):
+        if options.get('name'):
+            profile.name = options['name']
+        for key in ('description', 'isPublic', 'takPrefFileLocation', 'injectCallsign'):
+            if key in options:
+                setattr(profile, key, options[key])
+        if 'roleIds' in options:
+            role_ids = [int(role_id) for role_id in options['roleIds']]
+            profile.roles = UserRoleModel.query.filter(UserRoleModel.id.in_(role_ids)).all() if role_ids else []
+
+    @staticmethod
+    def remove_folder(location, keep_for=None):
+        """Delete a data package folder unless another profile than keep_for still uses it"""
+        shared = TakProfileModel.query.filter(
+            TakProfileModel.takTemplateFolderLocation == location, TakProfileModel.id != keep_for
+        ).first()
+        path = folder_path(location)
+        if not shared and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+    # Chunked uploads
+    # =========================================================================
+
+    @staticmethod
+    def part_path(upload_id):
+        return os.path.join(upload_root(), UPLOADS_DIR, f'{upload_id}.part')
+
+    @staticmethod
+    def create_upload(filename, total_size, options, profile=None, created_by=None):
+        """Validate and store a new upload. Raises ValueError when the request is invalid."""
+        if not filename or not filename.lower().endswith('.zip'):
+            raise ValueError('File must be a ZIP archive')
+        if not isinstance(total_size, int) or isinstance(total_size, bool) or total_size <= 0:
+            raise ValueError('size must be a positive number of bytes')
+        max_bytes = int(current_app.config.get('DATAPACKAGE_MAX_UPLOAD_BYTES', DEFAULT_MAX_UPLOAD_BYTES))
+        if total_size > max_bytes:
+            raise ValueError(f'Data packages may be at most {max_bytes} bytes')
+
+        upload = DatapackageUploadModel.create_upload(
+            secure_filename(filename), total_size, options,
+            profile_id=profile.id if profile is not None else None, created_by=created_by
+        )
+        if not upload:
+            raise ValueError('Failed to create upload')
+        path = DatapackageUploadService.part_path(upload.id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+        return upload
+
+    @staticmethod
+    def write_chunk(upload, offset, stream):
+        """
+        Append the bytes of stream at offset, which must be the number of
+        bytes received so far. Raises UploadOffsetError otherwise.
+        """
+        if upload.status != 'uploading':
+            raise UploadError(f'Upload is {upload.status}')
+        if offset != upload.received:
+            raise UploadOffsetError(upload.received)
+
+        remaining = upload.total_size - offset
+        written = 0
+        path = DatapackageUploadService.part_path(upload.id)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as part:
+            part.seek(offset)
+            part.truncate()
+            while True:
+                block = stream.read(COPY_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > remaining:
+                    part.truncate(offset)
+                    raise UploadError(f'Chunk extends past the declared size of {upload.total_size} bytes')
+                part.write(block)
+
+        upload.received = offset + written
+        upload.updated_at = datetime.now()
+        db.session.commit()
+        return upload
+
+    @staticmethod
+    def complete(upload):
+        """Start extracting a fully received upload in the background"""
+        if upload.received != upload.total_size:
+            raise UploadError(f'Upload is incomplete: {upload.received} of {upload.total_size} bytes received')
+        # Conditional update so a repeated request cannot start a second job
+        started = DatapackageUploadModel.query.filter_by(id=upload.id, status='uploading').update(
+            {'status': 'processing', 'updated_at': datetime.now()}, synchronize_session=False
+        )
+        db.session.commit()
+        if not started:
+            raise UploadError(f'Upload is {upload.status}')
+        db.session.refresh(upload)
+        DatapackageUploadService.start(upload)
+        return upload
+
+    @staticmethod
+    def start(upload):
+        """Run the extraction in a background thread"""
+        app = current_app._get_current_object()
+
+        def run_in_background(upload_id):
+            with app.app_context():
+                DatapackageUploadService.run(upload_id)
+
+        thread = threading.Thread(target=run_in_background, args=(upload.id,))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    @staticmethod
+    def run(upload_id):
+        """Extract a processing upload and record the outcome"""
+        upload = DatapackageUploadModel.get_by_id(upload_id)
+        if not upload or upload.status != 'processing':
+            return upload
+
+        started = time.monotonic()
+        path = DatapackageUploadService.part_path(upload.id)
+        try:
+            profile = None
+            if upload.profile_id:
+                profile = TakProfileModel.get_tak_profile_by_id(upload.profile_id)
+                if not profile:
+                    raise PackageError('TAK profile no longer exists')
+            profile, files = DatapackageUploadService.install_package(
+                path, upload.filename, upload.get_options(), profile
+            )
+            upload.status = 'completed'
+            upload.profile_id = profile.id
+            upload.result = json.dumps({
+                'profileId': profile.id,
+                'files': len(files),
+                'bytes': sum(f['size'] for f in files.values()),
+                'contentHash': profile.contentHash,
+            })
+        except PackageError as e:
+            upload.status = 'failed'
+            upload.error = str(e)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Data package upload {upload_id} failed: {e}")
+            upload.status = 'failed'
+            upload.error = f'Failed to extract data package: {e}'
+
+        if os.path.exists(path):
+            os.remove(path)
+        upload.finished_at = upload.updated_at = datetime.now()
+        db.session.commit()
+        current_app.logger.info(
+            f"Data package upload {upload_id} {upload.status} in {time.monotonic() - started:.1f}s"
+        )
+        return upload
+
+    @staticmethod
+    def cancel(upload):
+        path = DatapackageUploadService.part_path(upload.id)
+        if os.path.exists(path):
+            os.remove(path)
+        db.session.delete(upload)
+        db.session.commit()
+
+    @staticmethod
+    def cleanup_stale(max_age_hours=None):
+        """
+        Remove abandoned uploads and leftover staging folders, and fail
+        uploads whose extraction was interrupted (e.g. by a restart).
+        Returns the number of uploads removed or failed.
+        """
+        max_age_hours = max_age_hours or int(
+            current_app.config.get('DATAPACKAGE_UPLOAD_EXPIRY_HOURS', DEFAULT_UPLOAD_EXPIRY_HOURS)
+        )
+        cutoff = datetime.now() - timedelta(hours=max_age_hours)
+        stale = DatapackageUploadModel.get_stale(cutoff)
+        for upload in stale:
+            DatapackageUploadService.cancel(upload)
+
+        interrupted = DatapackageUploadModel.get_stale(cutoff, status='processing')
+        for upload in interrupted:
+            path = DatapackageUploadService.part_path(upload.id)
+            if os.path.exists(path):
+                os.remove(path)
+            upload.status = 'failed'
+            upload.error = 'Processing was interrupted, upload the package again'
+            upload.finished_at = upload.updated_at = datetime.now()
+        db.session.commit()
+
+        root = upload_root()
+        if os.path.isdir(root):
+            for entry in os.listdir(root):
+                path = os.path.join(root, entry)
+                if entry.startswith(STAGING_PREFIX) and os.stat(path).st_mtime < cutoff.timestamp():
+                    shutil.rmtree(path, ignore_errors=True)
+        return len(stale) + len(interrupted)
+
+
+# Convenience instance
+datapackage_uploads = DatapackageUploadService()
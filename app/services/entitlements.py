@@ -0,0 +1,208 @@
+"""
+Entitlement Service
+
+Answers "which TAK profiles / Meshtastic channels / channel groups can this
+user see" with a single SQL UNION over the direct assignment, role
+assignment and public visibility rules, instead of loading every resource
+and walking its roles in Python.
+
+Visibility rules (unchanged from the original endpoint logic):
+- tak_profile:      assigned to the user or one of their roles, or public
+                    and assigned to no user or role
+- meshtastic:       same as tak_profile
+- meshtastic_group: assigned to the user or one of their roles, or public
+
+Administrators are not special-cased here; endpoints that show admins
+everything keep doing so.
+
+Visible id sets are cached per (user, resource type) for
+ENTITLEMENT_CACHE_SECONDS. Changes flushed through this process's sessions
+invalidate the affected entries right away:
+- a user's role changes drop that user's entries
+- assignment, resource or role changes drop the resource type
+The TTL bounds how long other worker processes can serve a stale set.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from flask import current_app
+from sqlalchemy import and_, event, exists, inspect, select, union
+from sqlalchemy.orm import Session
+
+from app.models import (
+    MeshtasticChannelGroup, MeshtasticModel, TakProfileModel, UserModel, UserRoleModel, db,
+    role_meshtastic_association, role_meshtastic_group_association, role_takprofile_association,
+    user_meshtastic_association, user_meshtastic_group_association, user_role_association,
+    user_takprofile_association
+)
+
+DEFAULT_CACHE_SECONDS = 60
+DEFAULT_MAX_ENTRIES = 4096
+
+
+@dataclass(frozen=True)
+class ResourceType:
+    model: type
+    user_table: object
+    role_table: object
+    # Name of the resource id column in both association tables
+    fk: str
+    # Public resources are only visible to everyone while nobody is assigned
+    public_requires_unassigned: bool
+    # UserModel relationship holding direct assignments
+    user_attr: str
+
+
+RESOURCES = {
+    'tak_profile': ResourceType(
+        TakProfileModel, user_takprofile_association, role_takprofile_association,
+        'takprofile_id', True, 'takprofiles'
+    ),
+    'meshtastic': ResourceType(
+        MeshtasticModel, user_meshtastic_association, role_meshtastic_association,
+        'meshtastic_id', True, 'meshtastic'
+    ),
+    'meshtastic_group': ResourceType(
+        MeshtasticChannelGroup, user_meshtastic_group_association, role_meshtastic_group_association,
+        'group_id', False, 'meshtastic_groups'
+    ),
+}
+
+
+def visible_ids_select(user_id, resource):
+    """SELECT of the ids of resource visible to user_id (direct UNION role UNION public)"""
+    spec = RESOURCES[resource]
+    user_fk = spec.user_table.c[spec.fk]
+    role_fk = spec.role_table.c[spec.fk]
+
+    direct = select(user_fk.label('id')).where(spec.user_table.c.user_id == user_id)
+    via_role = select(role_fk.label('id')).join(
+        user_role_association, user_role_association.c.role_id == spec.role_table.c.role_id
+    ).where(user_role_association.c.user_id == user_id)
+
+    public_criteria = [spec.model.isPublic.is_(True)]
+    if spec.public_requires_unassigned:
+        public_criteria += [
+            ~exists().where(user_fk == spec.model.id),
+            ~exists().where(role_fk == spec.model.id),
+        ]
+    public = select(spec.model.id.label('id')).where(and_(*public_criteria))
+
+    return union(direct, via_role, public)
+
+
+class EntitlementCache:
+    """Bounded per-process cache of visible id sets keyed by (user_id, resource)"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a set computed before it is not stored after it
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, ids = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return ids
+
+    def set(self, key, ids, ttl, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, ids)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None, resource=None):
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._entries
+                        if (user_id is None or k[0] == user_id) and (resource is None or k[1] == resource)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class EntitlementService:
+    """Visibility of profiles, channels and channel groups per user"""
+
+    def __init__(self):
+        self.cache = EntitlementCache()
+
+    def visible_ids(self, user_id, resource):
+        """frozenset of the ids of resource the user can see"""
+        if resource not in RESOURCES:
+            raise ValueError(f"Unknown resource type '{resource}'")
+        ttl = float(current_app.config.get('ENTITLEMENT_CACHE_SECONDS', DEFAULT_CACHE_SECONDS))
+        key = (user_id, resource)
+        if ttl > 0:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        generation = self.cache.generation
+        ids = frozenset(row_id for (row_id,) in db.session.execute(visible_ids_select(user_id, resource)))
+        if ttl > 0:
+            self.cache.set(key, ids, ttl, generation)
+        return ids
+
+    def visible_query(self, user_id, resource):
+        """Query of the visible rows of resource, ordered by id"""
+        model = RESOURCES[resource].model
+        return model.query.filter(model.id.in_(self.visible_ids(user_id, resource))).order_by(model.id)
+
+    def can_see(self, user_id, resource, resource_id):
+        return resource_id in self.visible_ids(user_id, resource)
+
+    def invalidate_user(self, user_id):
+        self.cache.invalidate(user_id=user_id)
+
+    def invalidate_resource(self, resource):
+        self.cache.invalidate(resource=resource)
+
+    def clear(self):
+        self.cache.invalidate()
+
+
+entitlements = EntitlementService()
+
+
+# Invalidation on flushed changes
+# =============================================================================
+
+_RESOURCE_BY_MODEL = {spec.model: name for name, spec in RESOURCES.items()}
+_RESOURCE_BY_USER_ATTR = {spec.user_attr: name for name, spec in RESOURCES.items()}
+
+
+def _attribute_changed(instance, attr):
+    return inspect(instance).attrs[attr].history.has_changes()
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_on_flush(session, flush_context):
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        resource = _RESOURCE_BY_MODEL.get(type(instance))
+        if resource:
+            entitlements.invalidate_resource(resource)
+        elif isinstance(instance, UserRoleModel):
+            # A role's assignments changed, which can affect anyone holding it
+            entitlements.clear()
+        elif isinstance(instance, UserModel):
+            if instance in session.deleted or _attribute_changed(instance, 'roles'):
+                entitlements.invalidate_user(instance.id)
+            for attr, changed_resource in _RESOURCE_BY_USER_ATTR.items():
+                if _attribute_changed(instance, attr):
+                    # Direct assignments also decide whether a public resource is unrestricted
+                    entitlements.invalidate_resource(changed_resource)
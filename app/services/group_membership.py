@@ -0,0 +1,176 @@
+"""
+Group Membership Service
+
+Reconciles a user's OTS group memberships (GroupUserAssociation rows and the
+matching OTS group members) with a desired {group_id: direction} mapping.
+
+1. The user's current associations and every affected group are loaded with
+   one query each
+2. Only the differences are applied to the session: new groups are inserted,
+   changed directions updated and groups no longer wanted deleted
+3. The minimal OTS operations are derived per direction (BOTH = IN + OUT):
+   a change from IN to BOTH only adds OUT, BOTH to OUT only removes IN
+4. The OTS operations run together, up to GROUP_MEMBERSHIP_OTS_CONCURRENCY
+   at a time
+
+Nothing is committed here: callers commit, or roll back when an OTS failure
+should abort the change. OTS failures are returned rather than raised.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from flask import current_app
+
+from app.models import GroupUserAssociation, OTSGroupModel, db
+from app.ots import otsClient
+
+DIRECTIONS = ('IN', 'OUT', 'BOTH')
+DEFAULT_CONCURRENCY = 4
+
+
+def expand_direction(direction):
+    """OTS directions a stored direction stands for"""
+    if not direction:
+        return set()
+    return {'IN', 'OUT'} if direction == 'BOTH' else {direction}
+
+
+@dataclass(frozen=True)
+class MembershipOperation:
+    action: str  # 'add' or 'remove'
+    group_name: str
+    direction: str
+
+
+@dataclass
+class MembershipChanges:
+    added: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    operations: list = field(default_factory=list)
+    # (MembershipOperation, exception) for every failed OTS call
+    errors: list = field(default_factory=list)
+
+    def failed(self, action=None):
+        return [(op, e) for op, e in self.errors if action is None or op.action == action]
+
+
+class GroupMembershipService:
+    """Diff-based updates of OTS group memberships"""
+
+    @staticmethod
+    def reconcile(username, desired, user=None, remove_missing=True):
+        """
+        Bring username's memberships in line with desired ({group_id: direction}).
+
+        user is the local UserModel, if any; without one only OTS is changed
+        and the current directions are taken to be none. With
+        remove_missing=False groups not in desired are left alone.
+        Unknown group ids are ignored. Raises ValueError for an invalid direction.
+        """
+        for direction in desired.values():
+            if direction not in DIRECTIONS:
+                raise ValueError('Direction must be IN, OUT, or BOTH')
+
+        current = {}
+        if user is not None and user.id is not None:
+            query = GroupUserAssociation.query.filter_by(user_id=user.id)
+            if not remove_missing:
+                query = query.filter(GroupUserAssociation.group_id.in_(list(desired)))
+            current = {assoc.group_id: assoc for assoc in query.all()}
+
+        group_ids = set(desired) | set(current)
+        groups = {}
+        if group_ids:
+            groups = {g.id: g for g in OTSGroupModel.query.filter(OTSGroupModel.id.in_(list(group_ids))).all()}
+
+        changes = MembershipChanges()
+        for group_id in sorted(group_ids):
+            group = groups.get(group_id)
+            assoc = current.get(group_id)
+            old_direction = assoc.direction if assoc else None
+            new_direction = desired.get(group_id) if group else None
+
+            if new_direction is None and (group_id in desired or not remove_missing):
+                # Unknown group, or one the caller did not ask about
+                continue
+            if new_direction == old_direction:
+                continue
+
+            if assoc is None:
+                if user is not None and user.id is not None:
+                    db.session.add(GroupUserAssociation(group_id=group_id, user_id=user.id, direction=new_direction))
+                changes.added.append(group_id)
+            elif new_direction is None:
+                db.session.delete(assoc)
+                changes.removed.append(group_id)
+            else:
+                assoc.direction = new_direction
+                changes.updated.append(group_id)
+
+            if group is None:
+                continue
+            new_dirs, old_dirs = expand_direction(new_direction), expand_direction(old_direction)
+            changes.operations += [MembershipOperation('add', group.name, d) for d in sorted(new_dirs - old_dirs)]
+            changes.operations += [MembershipOperation('remove', group.name, d) for d in sorted(old_dirs - new_dirs)]
+
+        if changes.operations:
+            changes.errors = GroupMembershipService.apply_to_ots(username, changes.operations)
+        return changes
+
+    @staticmethod
+    def apply_to_ots(username, operations, concurrency=None):
+        """Run the operations against OTS and return (operation, exception) for the failures"""
+        errors = GroupMembershipService.run_operations([(username, op) for op in operations], concurrency)
+        return [(op, error) for _, op, error in errors]
+
+    @staticmethod
+    def run_operations(calls, concurrency=None):
+        """
+        Run (username, MembershipOperation) pairs against OTS, several at a time.
+        Returns (username, operation, exception) for the failures.
+        """
+        concurrency = concurrency or int(current_app.config.get('GROUP_MEMBERSHIP_OTS_CONCURRENCY', DEFAULT_CONCURRENCY))
+        if len(calls) == 1 or concurrency <= 1:
+            results = [GroupMembershipService._run(None, username, op) for username, op in calls]
+        else:
+            # Log in once up front rather than from every worker thread
+            if not otsClient.auth_token:
+                try:
+                    otsClient.login()
+                except Exception as e:
+                    return [(username, op, e) for username, op in calls]
+            app = current_app._get_current_object()
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(calls))) as pool:
+                results = list(pool.map(lambda call: GroupMembershipService._run(app, *call), calls))
+
+        errors = []
+        for username, op, error in results:
+            if error is None:
+                current_app.logger.info(f"OTS group {op.group_name}: {op.action} {username} ({op.direction})")
+            else:
+                current_app.logger.error(f"OTS group {op.group_name}: failed to {op.action} {username} ({op.direction}): {error}")
+                errors.append((username, op, error))
+        return errors
+
+    @staticmethod
+    def _run(app, username, op):
+        """Returns (username, op, error) - error is None on success"""
+        call = otsClient.add_user_to_group if op.action == 'add' else otsClient.remove_user_from_group
+        try:
+            if app is None:
+                call(username, op.group_name, direction=op.direction)
+            else:
+                with app.app_context():
+                    call(username, op.group_name, direction=op.direction)
+            return username, op, None
+        except Exception as e:
+            return username, op, e
+
+
+def desired_groups_from_request(data):
+    """{group_id: direction} from a request's 'groups' ([{id, direction}]) or 'groupIds' ([id])"""
+    if data.get('groups') is not None:
+        return {g['id']: g.get('direction', 'BOTH') for g in data['groups']}
+    return {gid: 'BOTH' for gid in data.get('groupIds') or []}
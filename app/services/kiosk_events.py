@@ -0,0 +1,138 @@
+"""
+Kiosk Session Events
+
+Lets the kiosk status endpoint wait for a session to change instead of the
+kiosk screen polling the database in a tight loop.
+
+authenticate_kiosk_session() publishes the session id after committing, and
+waiters for that session are woken immediately. Backends (selected with the
+KIOSK_EVENTS_BACKEND setting):
+- memory: in-process condition variable (default)
+
+A notification only reaches waiters in the same worker process; the session
+is read again only when a waiter is woken or times out, so an authentication
+handled by another worker is seen on the kiosk's next poll. Additional pub/sub
+backends can be registered with register_backend().
+
+Every waiter holds a server thread, so at most KIOSK_LONG_POLL_MAX_WAITERS
+requests wait at once (waiter_slot()); the rest are answered immediately.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+
+# Forget versions of sessions nobody waited on after this many seconds
+VERSION_TTL_SECONDS = 900
+DEFAULT_MAX_WAITERS = 4
+
+
+class MemoryBackend:
+    """Process-local notifications using a single condition variable"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # session_id -> (version, last published monotonic time)
+        self._versions = {}
+
+    def version(self, session_id):
+        with self._condition:
+            return self._versions.get(session_id, (0, 0))[0]
+
+    def publish(self, session_id):
+        with self._condition:
+            version = self._versions.get(session_id, (0, 0))[0] + 1
+            self._versions[session_id] = (version, time.monotonic())
+            self._prune()
+            self._condition.notify_all()
+
+    def wait(self, session_id, since_version, timeout):
+        """Block until the session version moves past since_version, returns True if it did"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._versions.get(session_id, (0, 0))[0] <= since_version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def _prune(self):
+        cutoff = time.monotonic() - VERSION_TTL_SECONDS
+        stale = [k for k, (_, published) in self._versions.items() if published < cutoff]
+        for key in stale:
+            del self._versions[key]
+
+
+_BACKENDS = {
+    'memory': MemoryBackend,
+}
+
+
+def register_backend(name, factory):
+    """Register a pub/sub backend implementing version/publish/wait"""
+    _BACKENDS[name] = factory
+
+
+class KioskEvents:
+    """Publish/wait facade over the configured backend"""
+
+    def __init__(self):
+        self._backend = None
+        self._backend_lock = threading.Lock()
+        self._waiters = 0
+        self._waiters_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    @staticmethod
+    def _create_backend():
+        name = str(current_app.config.get('KIOSK_EVENTS_BACKEND', 'memory')).lower()
+        if name not in _BACKENDS:
+            current_app.logger.warning(f"Unknown KIOSK_EVENTS_BACKEND '{name}', using memory")
+            name = 'memory'
+        return _BACKENDS[name]()
+
+    def version(self, session_id):
+        return self.backend.version(session_id)
+
+    def publish(self, session_id):
+        """Wake everyone waiting on session_id"""
+        try:
+            self.backend.publish(session_id)
+        except Exception as e:
+            # Waiters see the change when they time out
+            current_app.logger.warning(f"Failed to publish kiosk session event: {e}")
+
+    @contextmanager
+    def waiter_slot(self):
+        """Yields True when the caller may wait, False when KIOSK_LONG_POLL_MAX_WAITERS are waiting already"""
+        limit = int(current_app.config.get('KIOSK_LONG_POLL_MAX_WAITERS', DEFAULT_MAX_WAITERS))
+        with self._waiters_lock:
+            admitted = self._waiters < limit
+            if admitted:
+                self._waiters += 1
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                with self._waiters_lock:
+                    self._waiters -= 1
+
+    def wait(self, session_id, since_version, timeout):
+        """Wait up to timeout seconds for a change, returns True if notified"""
+        if timeout <= 0:
+            return False
+        return self.backend.wait(session_id, since_version, timeout)
+
+
+# Shared instance
+kiosk_events = KioskEvents()
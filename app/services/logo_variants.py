@@ -0,0 +1,124 @@
+"""
+Logo Variants Service
+
+Turns an uploaded logo into the sizes the portal actually uses, once, at
+upload time instead of sending the original file to every page view, email
+and kiosk:
+- favicon-32, favicon-180 (apple-touch-icon), favicon-192: square, padded
+- header: the portal header and kiosk, at twice the displayed height
+- email: the email template's 200x80 box at twice the size
+
+Every variant is written as WebP and as an optimized PNG fallback, named
+logo-<content hash>-<variant>.<ext>. The hash is taken over the uploaded
+bytes, so a new upload always gets new URLs and the files can be cached as
+immutable. serve_upload hands out the WebP sibling of a PNG to clients that
+accept image/webp.
+
+The manifest ({variant: {png, webp, width, height}}) is stored as the
+'custom_logo_variants' system setting.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+
+from PIL import Image, ImageOps
+
+VARIANTS_SETTING = 'custom_logo_variants'
+URL_PREFIX = '/api/v1/uploads/'
+
+# name: (width, height, square) - the image is fitted inside width x height
+VARIANTS = {
+    'favicon-32': (32, 32, True),
+    'favicon-180': (180, 180, True),
+    'favicon-192': (192, 192, True),
+    'header': (480, 128, False),
+    'email': (400, 160, False),
+}
+WEBP_QUALITY = 85
+
+HASHED_FILENAME = re.compile(r'^logo-[0-9a-f]{16}-[a-z0-9-]+\.(png|webp)$')
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def is_hashed_filename(filename):
+    return bool(HASHED_FILENAME.match(filename))
+
+
+def webp_sibling(filename):
+    """WebP name of a hashed PNG variant, or None"""
+    if is_hashed_filename(filename) and filename.endswith('.png'):
+        return filename[:-len('.png')] + '.webp'
+    return None
+
+
+def _load(data):
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Image.DecompressionBombError:
+        raise InvalidImageError('Image dimensions are too large')
+    except OSError:
+        raise InvalidImageError('File is not a valid image')
+    # Animated GIFs keep their first frame; EXIF rotation is applied
+    image.seek(0)
+    image = ImageOps.exif_transpose(image)
+    return image.convert('RGBA')
+
+
+def _resize(image, width, height, square):
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+    if not square:
+        return resized
+    canvas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    canvas.paste(resized, ((width - resized.width) // 2, (height - resized.height) // 2))
+    return canvas
+
+
+def generate_variants(data, upload_folder):
+    """Write every variant of the image in data and return the manifest. Raises InvalidImageError."""
+    image = _load(data)
+    digest = content_hash(data)
+    manifest = {}
+    for name, (width, height, square) in VARIANTS.items():
+        variant = _resize(image, width, height, square)
+        entry = {'width': variant.width, 'height': variant.height}
+        for ext, options in (('png', {'optimize': True}), ('webp', {'quality': WEBP_QUALITY, 'method': 6})):
+            filename = f'logo-{digest}-{name}.{ext}'
+            variant.save(os.path.join(upload_folder, filename), format=ext.upper(), **options)
+            entry[ext] = filename
+        manifest[name] = entry
+    return manifest
+
+
+def remove_variants(manifest, upload_folder):
+    for entry in (manifest or {}).values():
+        for ext in ('png', 'webp'):
+            path = os.path.join(upload_folder, os.path.basename(entry.get(ext) or ''))
+            if entry.get(ext) and os.path.exists(path):
+                os.remove(path)
+
+
+def get_manifest():
+    from app.models import SystemSettingsModel
+    value = SystemSettingsModel.get_setting(VARIANTS_SETTING)
+    try:
+        return json.loads(value) if value else {}
+    except (ValueError, TypeError):
+        return {}
+
+
+def variant_urls(manifest=None):
+    """{variant: PNG url} - the same url serves WebP to clients that accept it"""
+    manifest = get_manifest() if manifest is None else manifest
+    return {name: URL_PREFIX + entry['png'] for name, entry in manifest.items() if entry.get('png')}
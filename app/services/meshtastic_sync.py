@@ -39,73 +39,229 @@ class MeshtasticSyncService:
         Creates new records or updates existing ones based on URL.
         Returns tuple of (created_count, updated_count, errors)
         """
-        created = 0
-        updated = 0
-        errors = []
+        result = MeshtasticSyncService.sync_channels_from_ots()
+        return result['created'], result['updated'], result['errors']
 
-        try:
-            response = otsClient.get_meshtastic_channels()
-            if response is None:
-                errors.append("OTS returned no response - meshtastic endpoint may not be available")
-                return created, updated, errors
+    @staticmethod
+    def _parse_channels_page(response):
+        """
+        Extract the channel list and total page count from an OTS response.
+        Returns (channels, total_pages) - total_pages is None if OTS did not say.
+        """
+        # OTS responses are double-nested: {"response": {"response": {...}}}
+        inner_response = response.get('response', {})
+        if isinstance(inner_response, dict):
+            inner_response = inner_response.get('response', inner_response)
 
-            # OTS responses are double-nested: {"response": {"response": {...}}}
-            inner_response = response.get('response', {})
-            if isinstance(inner_response, dict):
-                inner_response = inner_response.get('response', inner_response)
+        if not isinstance(inner_response, dict):
+            return [], None
+
+        # OTS returns paginated results with 'results' key
+        return inner_response.get('results', []), inner_response.get('total_pages')
 
-            # OTS returns paginated results with 'results' key
-            ots_channels = inner_response.get('results', []) if isinstance(inner_response, dict) else []
+    @staticmethod
+    def _upsert_statement(rows):
+        """
+        Build an INSERT for new channels.
+        On SQLite and PostgreSQL this is an upsert keyed on ots_id, so a row
+        inserted concurrently by another sync is updated instead of failing.
+        """
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return db.insert(MeshtasticModel).values(rows)
+
+        stmt = insert(MeshtasticModel).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=['ots_id'],
+            set_={'url': stmt.excluded.url, 'synced_at': stmt.excluded.synced_at}
+        )
+
+    @staticmethod
+    def _apply_page(inserts, updates):
+        """Write one page of changes: one bulk upsert, one bulk update, one commit"""
+        if inserts:
+            with_ots_id = [row for row in inserts if row['ots_id'] is not None]
+            without_ots_id = [row for row in inserts if row['ots_id'] is None]
+            if with_ots_id:
+                db.session.execute(MeshtasticSyncService._upsert_statement(with_ots_id))
+            if without_ots_id:
+                db.session.execute(db.insert(MeshtasticModel).values(without_ots_id))
+        if updates:
+            db.session.execute(db.update(MeshtasticModel), updates)
+        db.session.commit()
+
+    @staticmethod
+    def _apply_rows_individually(inserts, updates, channel_errors):
+        """Fallback when a bulk write fails: apply each row in its own savepoint"""
+        for row, is_insert in [(r, True) for r in inserts] + [(r, False) for r in updates]:
+            try:
+                with db.session.begin_nested():
+                    if is_insert:
+                        db.session.execute(db.insert(MeshtasticModel).values(row))
+                    else:
+                        db.session.execute(db.update(MeshtasticModel), [row])
+            except Exception as e:
+                if is_insert:
+                    inserts.remove(row)
+                else:
+                    updates.remove(row)
+                channel_errors.append({'name': row.get('name'), 'url': row.get('url'), 'error': str(e)})
+        db.session.commit()
 
-            for ots_channel in ots_channels:
-                try:
+    @staticmethod
+    def sync_channels_from_ots(dry_run=False, page_size=100):
+        """
+        Page through OTS Meshtastic channels and sync them into the local database.
+
+        Local channels are prefetched once and matched by URL. Each OTS page is
+        written with one bulk upsert for new channels, one bulk update for
+        changed ones and a single commit. Channels that would break the unique
+        name or ots_id constraints are reported per channel and skipped.
+
+        With dry_run nothing is written and the planned changes are returned
+        in 'diff'.
+
+        Returns dict with created, updated, unchanged, pages, errors (list of
+        strings) and channel_errors (list of {name, url, error}).
+        """
+        result = {'created': 0, 'updated': 0, 'unchanged': 0, 'pages': 0, 'errors': [], 'channel_errors': []}
+        if dry_run:
+            result['diff'] = []
+
+        # One prefetch of the columns needed for matching, keyed for O(1) lookups
+        by_url = {}
+        id_by_name = {}
+        id_by_ots_id = {}
+        for channel_id, url, name, ots_id in db.session.query(
+                MeshtasticModel.id, MeshtasticModel.url, MeshtasticModel.name, MeshtasticModel.ots_id).all():
+            if url and url not in by_url:
+                by_url[url] = {'id': channel_id, 'name': name, 'ots_id': ots_id}
+            if name:
+                id_by_name[name] = channel_id
+            if ots_id is not None:
+                id_by_ots_id[ots_id] = channel_id
+
+        seen_urls = set()
+        page = 1
+        try:
+            while True:
+                response = otsClient.get_meshtastic_channels(page=page, page_size=page_size, fresh=True)
+                if response is None:
+                    result['errors'].append("OTS returned no response - meshtastic endpoint may not be available")
+                    break
+
+                ots_channels, total_pages = MeshtasticSyncService._parse_channels_page(response)
+                result['pages'] = page
+                now = datetime.utcnow()
+                inserts = []
+                updates = []
+                page_errors = []
+                unchanged_ids = set()
+                new_urls = 0
+
+                for ots_channel in ots_channels:
                     channel_url = ots_channel.get('url')
                     name = ots_channel.get('name')
                     ots_id = ots_channel.get('id')
 
-                    if not channel_url:
+                    if not channel_url or channel_url in seen_urls:
+                        continue
+                    seen_urls.add(channel_url)
+                    new_urls += 1
+
+                    local = by_url.get(channel_url)
+                    local_id = local['id'] if local else None
+                    target_name = name if name else (local['name'] if local else f"Channel {ots_id}")
+
+                    if id_by_name.get(target_name, local_id) != local_id:
+                        page_errors.append({'name': target_name, 'url': channel_url,
+                                            'error': f"A different channel is already named '{target_name}'"})
+                        continue
+                    if ots_id is not None and id_by_ots_id.get(ots_id, local_id) != local_id:
+                        page_errors.append({'name': target_name, 'url': channel_url,
+                                            'error': f"OTS id {ots_id} is already linked to another channel"})
                         continue
 
-                    # Check if we already have this config by URL
-                    local_config = MeshtasticModel.query.filter_by(url=channel_url).first()
-
-                    if local_config:
-                        # Update existing - only update name if OTS has one
-                        if name and name != local_config.name:
-                            local_config.name = name
-                        local_config.ots_id = ots_id
-                        local_config.synced_at = datetime.utcnow()
-                        db.session.commit()
-                        updated += 1
+                    if local:
+                        changes = {}
+                        if target_name != local['name']:
+                            changes['name'] = target_name
+                        if ots_id != local['ots_id']:
+                            changes['ots_id'] = ots_id
+                        if dry_run:
+                            if changes:
+                                result['diff'].append({'action': 'update', 'id': local_id, 'url': channel_url, 'changes': changes})
+                            else:
+                                result['unchanged'] += 1
+                            continue
+                        updates.append({'id': local_id, 'name': target_name, 'ots_id': ots_id, 'synced_at': now})
+                        if not changes:
+                            unchanged_ids.add(local_id)
                     else:
-                        # Create new
-                        new_config = MeshtasticModel(
-                            ots_id=ots_id,
-                            name=name or f"Channel {ots_id}",
-                            url=channel_url,
-                            synced_at=datetime.utcnow(),
-                            isPublic=False,
-                            showOnHomepage=False
-                        )
-                        db.session.add(new_config)
-                        db.session.commit()
-                        created += 1
-
-                except Exception as e:
-                    errors.append(f"Error syncing channel {ots_channel.get('name', 'unknown')}: {str(e)}")
-                    db.session.rollback()
+                        if dry_run:
+                            result['diff'].append({'action': 'create', 'url': channel_url, 'name': target_name, 'ots_id': ots_id})
+                            continue
+                        inserts.append({
+                            'ots_id': ots_id,
+                            'name': target_name,
+                            'url': channel_url,
+                            'synced_at': now,
+                            'isPublic': False,
+                            'showOnHomepage': False
+                        })
+
+                    # Claim the name and OTS id so later rows in this sync see them
+                    id_by_name[target_name] = local_id if local_id else -len(seen_urls)
+                    if ots_id is not None:
+                        id_by_ots_id[ots_id] = id_by_name[target_name]
+
+                if not dry_run and (inserts or updates):
+                    try:
+                        MeshtasticSyncService._apply_page(inserts, updates)
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"Bulk Meshtastic sync of page {page} failed, retrying per channel: {e}")
+                        MeshtasticSyncService._apply_rows_individually(inserts, updates, page_errors)
+
+                # Rows that were only re-stamped with synced_at count as unchanged
+                restamped = len([row for row in updates if row['id'] in unchanged_ids])
+                result['created'] += len(inserts)
+                result['updated'] += len(updates) - restamped
+                result['unchanged'] += restamped
+                result['channel_errors'].extend(page_errors)
+
+                if total_pages is not None:
+                    if page >= total_pages:
+                        break
+                # Older OTS versions ignore paging and return everything each time
+                elif len(ots_channels) < page_size or new_urls == 0:
+                    break
+                page += 1
 
-        except AttributeError as e:
+        except AttributeError:
             # This happens when OTS returns non-JSON response (e.g., 404 page)
-            errors.append("OTS does not support Meshtastic sync (endpoint not available)")
+            db.session.rollback()
+            result['errors'].append("OTS does not support Meshtastic sync (endpoint not available)")
         except Exception as e:
+            db.session.rollback()
             error_msg = str(e)
             if "'NoneType'" in error_msg or "404" in error_msg:
-                errors.append("OTS does not support Meshtastic sync (endpoint not available)")
+                result['errors'].append("OTS does not support Meshtastic sync (endpoint not available)")
             else:
-                errors.append(f"Error fetching from OTS: {error_msg}")
+                result['errors'].append(f"Error fetching from OTS: {error_msg}")
+
+        if dry_run:
+            result['created'] = len([d for d in result['diff'] if d['action'] == 'create'])
+            result['updated'] = len([d for d in result['diff'] if d['action'] == 'update'])
 
-        return created, updated, errors
+        result['errors'].extend(
+            f"Error syncing channel {e['name'] or 'unknown'}: {e['error']}" for e in result['channel_errors']
+        )
+        return result
 
     @staticmethod
     def is_valid_meshtastic_url(url):
@@ -0,0 +1,155 @@
+"""
+OIDC Metadata Cache
+
+Caches each OIDC provider's discovery document and JWKS so that SSO logins
+don't fetch them from the identity provider on every /authorize and /callback.
+
+- Entries live for the max-age the provider sends in Cache-Control, clamped
+  to OIDC_CACHE_MIN_SECONDS..OIDC_CACHE_MAX_SECONDS, or OIDC_CACHE_DEFAULT_SECONDS
+  when the provider sends none.
+- If a refetch fails, the expired copy keeps being served rather than
+  breaking logins while the provider is briefly unreachable (except for
+  strict fetches, which validate a provider's URL).
+- An id_token signed with a key id missing from the cached JWKS (key
+  rotation) triggers one forced JWKS refetch, at most once per
+  JWKS_REFRESH_COOLDOWN seconds per provider.
+- warm() fetches everything for the enabled providers and is run at startup
+  by the scheduler.
+"""
+
+import re
+import threading
+import time
+
+import requests as http_requests
+from authlib.jose import JsonWebKey
+from flask import current_app
+
+FETCH_TIMEOUT = 10
+# Minimum seconds between forced JWKS refetches for unknown key ids
+JWKS_REFRESH_COOLDOWN = 30
+
+_MAX_AGE_RE = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+def _parse_discovery(doc):
+    if not isinstance(doc, dict):
+        raise ValueError('discovery document is not a JSON object')
+    return doc
+
+
+class OIDCMetadataCache:
+    """Per-process TTL cache of discovery documents and key sets, keyed by URL"""
+
+    def __init__(self):
+        # url -> {'data': ..., 'expires_at': ..., 'fetched_at': ...}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._last_forced = {}
+
+    def _ttl(self, response):
+        config = current_app.config
+        minimum = int(config.get('OIDC_CACHE_MIN_SECONDS', 60))
+        maximum = int(config.get('OIDC_CACHE_MAX_SECONDS', 86400))
+        default = int(config.get('OIDC_CACHE_DEFAULT_SECONDS', 3600))
+
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        match = _MAX_AGE_RE.search(cache_control)
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            ttl = minimum
+        elif match:
+            ttl = int(match.group(1))
+        else:
+            ttl = default
+        return max(minimum, min(ttl, maximum))
+
+    def _url_lock(self, url):
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def _get(self, url, parse, force=False, strict=False):
+        """
+        Return the cached parsed document for url, fetching it when missing
+        or expired. Concurrent misses for one URL share a single fetch.
+        Returns None if nothing could be fetched and nothing is cached, and
+        with strict=True whenever the fetch fails.
+        """
+        requested_at = time.time()
+        entry = self._entries.get(url)
+        if entry and not force and entry['expires_at'] > requested_at:
+            return entry['data']
+
+        with self._url_lock(url):
+            entry = self._entries.get(url)
+            # Another request may have refreshed it while we waited
+            if entry and entry['expires_at'] > time.time() and (not force or entry['fetched_at'] >= requested_at):
+                return entry['data']
+
+            try:
+                resp = http_requests.get(url, timeout=FETCH_TIMEOUT)
+                resp.raise_for_status()
+                data = parse(resp.json())
+            except Exception as e:
+                if entry and not strict:
+                    current_app.logger.warning(f"OIDC metadata refresh failed for {url}, serving cached copy: {e}")
+                    return entry['data']
+                current_app.logger.error(f"OIDC metadata fetch failed for {url}: {e}")
+                return None
+
+            now = time.time()
+            self._entries[url] = {'data': data, 'expires_at': now + self._ttl(resp), 'fetched_at': now}
+            return data
+
+    def get_discovery(self, discovery_url, force=False, strict=False):
+        """
+        Return the provider's discovery document (dict) or None. strict=True
+        fetches it now and returns None when that fails, even if a copy is
+        cached - for checking that a URL is reachable.
+        """
+        return self._get(discovery_url, _parse_discovery, force=force or strict, strict=strict)
+
+    def get_key_set(self, jwks_uri, kid=None):
+        """
+        Return the provider's JWKS as an authlib KeySet, or None.
+        If kid is given and not in the cached set, the JWKS is refetched once
+        to pick up a rotated signing key.
+        """
+        key_set = self._get(jwks_uri, JsonWebKey.import_key_set)
+        if key_set is None or kid is None or any(k.kid == kid for k in key_set.keys):
+            return key_set
+
+        with self._lock:
+            last = self._last_forced.get(jwks_uri, 0)
+            if time.time() - last < JWKS_REFRESH_COOLDOWN:
+                return key_set
+            self._last_forced[jwks_uri] = time.time()
+
+        current_app.logger.info(f"OIDC signing key {kid} not in cached JWKS, refetching {jwks_uri}")
+        return self._get(jwks_uri, JsonWebKey.import_key_set, force=True)
+
+    def invalidate(self, *urls):
+        with self._lock:
+            for url in urls:
+                if url:
+                    self._entries.pop(url, None)
+                    self._last_forced.pop(url, None)
+
+    def invalidate_provider(self, provider):
+        """Drop the cached discovery document and JWKS of a provider"""
+        entry = self._entries.get(provider.discovery_url)
+        jwks_uri = entry['data'].get('jwks_uri') if entry and entry['data'] else None
+        self.invalidate(provider.discovery_url, jwks_uri)
+
+    def warm(self, providers):
+        """Fetch discovery documents and JWKS for providers, returns the number warmed"""
+        warmed = 0
+        for provider in providers:
+            discovery = self.get_discovery(provider.discovery_url)
+            if discovery and discovery.get('jwks_uri') and self.get_key_set(discovery['jwks_uri']) is not None:
+                warmed += 1
+        return warmed
+
+
+# Shared instance
+oidc_metadata = OIDCMetadataCache()
@@ -0,0 +1,247 @@
+"""
+OTS Group Sync Service
+
+Synchronizes the local ots_groups table with the groups defined in OpenTAK
+Server (OTS).
+
+OTS API: /api/groups
+- GET: List groups (paginated with page/page_size)
+
+The sync works in three steps:
+1. Page through every OTS group
+2. Diff against all local groups, prefetched into a dict keyed by name
+3. Apply the creates/updates/deactivations in a single transaction
+
+Local groups that no longer exist in OTS are deactivated rather than deleted
+so that onboarding code and user associations are kept. Deactivation only
+happens when every OTS page was fetched, so a partial fetch never hides groups.
+An error status or a page without a group list aborts the sync.
+
+The time of the last successful sync (the watermark) and its statistics are
+stored as system settings in the 'sync' category.
+"""
+
+import json
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from app.models import OTSGroupModel, SystemSettingsModel, db
+from app.ots import otsClient
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGES = 1000
+# Rows per IN (...) clause when stamping synced_at
+STAMP_CHUNK_SIZE = 500
+
+WATERMARK_SETTING = 'ots_group_sync_watermark'
+STATS_SETTING = 'ots_group_sync_stats'
+
+
+class OTSGroupSyncService:
+    """Service for syncing OTS groups into the local database"""
+
+    @staticmethod
+    def _parse_groups_page(response):
+        """
+        Extract the group list and total page count from an OTS response.
+        Returns (groups, total_pages) - total_pages is None if OTS did not say.
+        Raises ConnectionError for an error status or a payload without a
+        group list, so a failed call is never mistaken for "no groups".
+        """
+        if not isinstance(response, dict):
+            raise ConnectionError('Unexpected response from OTS when listing groups')
+        status_code = response.get('status_code')
+        if status_code is not None and not 200 <= status_code < 300:
+            raise ConnectionError(f'OTS returned HTTP {status_code} when listing groups')
+
+        data = response.get('response')
+        total_pages = None
+        if isinstance(data, dict):
+            total_pages = data.get('total_pages')
+            for key in ('results', 'groups', 'response'):
+                if isinstance(data.get(key), list):
+                    data = data[key]
+                    break
+        if not isinstance(data, list):
+            raise ConnectionError('OTS group listing has no group list')
+        return data, total_pages
+
+    @staticmethod
+    def fetch_ots_groups(page_size=DEFAULT_PAGE_SIZE):
+        """
+        Page through all OTS groups.
+        Returns (groups_by_name, pages_fetched, complete). Each value is a
+        dict with description and active. complete is False if MAX_PAGES was
+        reached before OTS ran out of results. Raises ConnectionError when a
+        page cannot be fetched.
+        """
+        groups = {}
+        page = 1
+        while page <= MAX_PAGES:
+            response = otsClient.get_groups(page=page, page_size=page_size, fresh=True)
+            results, total_pages = OTSGroupSyncService._parse_groups_page(response)
+
+            new_names = 0
+            for ots_group in results:
+                name = ots_group.get('name') if isinstance(ots_group, dict) else str(ots_group)
+                if not name:
+                    continue
+                if name not in groups:
+                    new_names += 1
+                groups[name] = {
+                    'description': ots_group.get('description', '') if isinstance(ots_group, dict) else '',
+                    'active': ots_group.get('active', True) if isinstance(ots_group, dict) else True
+                }
+
+            if total_pages is not None:
+                if page >= total_pages:
+                    return groups, page, True
+            # Older OTS versions ignore paging and return everything each time
+            elif len(results) < page_size or new_names == 0:
+                return groups, page, True
+            page += 1
+
+        current_app.logger.warning(f"OTS group sync stopped after {MAX_PAGES} pages")
+        return groups, MAX_PAGES, False
+
+    @staticmethod
+    def compute_diff(ots_groups, local_groups, detect_removed=True):
+        """
+        Compare OTS groups with local groups (both keyed by name).
+        Returns dict of create/update/deactivate/unchanged lists. Local groups
+        missing from OTS are only deactivated when detect_removed is True.
+        """
+        diff = {'create': [], 'update': [], 'deactivate': [], 'unchanged': []}
+
+        for name, ots_group in ots_groups.items():
+            local = local_groups.get(name)
+            if local is None:
+                diff['create'].append(name)
+                continue
+
+            changes = {}
+            if ots_group['description'] and ots_group['description'] != local.description:
+                changes['description'] = ots_group['description']
+            if bool(ots_group['active']) != bool(local.active):
+                changes['active'] = bool(ots_group['active'])
+
+            if changes:
+                diff['update'].append((name, changes))
+            else:
+                diff['unchanged'].append(name)
+
+        for name, local in local_groups.items():
+            if detect_removed and name not in ots_groups and local.active:
+                diff['deactivate'].append(name)
+
+        return diff
+
+    @staticmethod
+    def sync(page_size=DEFAULT_PAGE_SIZE, dry_run=False):
+        """
+        Sync groups from OTS.
+        Returns a stats dict with counts, page count and duration. With
+        dry_run the diff is computed and returned but nothing is written.
+        Raises ConnectionError if OTS cannot be reached.
+        """
+        started = time.monotonic()
+        ots_groups, pages, complete = OTSGroupSyncService.fetch_ots_groups(page_size)
+        fetched_ms = int((time.monotonic() - started) * 1000)
+
+        local_groups = {g.name: g for g in OTSGroupModel.query.all()}
+        diff = OTSGroupSyncService.compute_diff(ots_groups, local_groups, detect_removed=complete)
+
+        stats = {
+            'fetched': len(ots_groups),
+            'pages': pages,
+            'created': len(diff['create']),
+            'updated': len(diff['update']),
+            'deactivated': len(diff['deactivate']),
+            'unchanged': len(diff['unchanged']),
+            'complete': complete,
+            'fetch_ms': fetched_ms,
+        }
+
+        if dry_run:
+            stats['dry_run'] = True
+            stats['diff'] = {
+                'create': diff['create'],
+                'update': [{'name': name, 'changes': changes} for name, changes in diff['update']],
+                'deactivate': diff['deactivate'],
+            }
+            stats['duration_ms'] = int((time.monotonic() - started) * 1000)
+            return stats
+
+        now = datetime.utcnow()
+        try:
+            db.session.add_all([
+                OTSGroupModel(
+                    name=name,
+                    display_name=name.replace('_', ' ').title(),
+                    description=ots_groups[name]['description'],
+                    active=ots_groups[name]['active'],
+                    synced_at=now
+                )
+                for name in diff['create']
+            ])
+
+            for name, changes in diff['update']:
+                local = local_groups[name]
+                for field, value in changes.items():
+                    setattr(local, field, value)
+
+            for name in diff['deactivate']:
+                local_groups[name].active = False
+
+            # Stamp every group confirmed by OTS with set-based UPDATEs
+            seen = [name for name in ots_groups if name in local_groups]
+            for i in range(0, len(seen), STAMP_CHUNK_SIZE):
+                OTSGroupModel.query.filter(
+                    OTSGroupModel.name.in_(seen[i:i + STAMP_CHUNK_SIZE])
+                ).update({'synced_at': now}, synchronize_session=False)
+
+            stats['duration_ms'] = int((time.monotonic() - started) * 1000)
+            OTSGroupSyncService._record_watermark(now, stats)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        current_app.logger.info(
+            f"OTS group sync complete in {stats['duration_ms']}ms: {stats['fetched']} fetched over "
+            f"{stats['pages']} page(s), {stats['created']} created, {stats['updated']} updated, "
+            f"{stats['deactivated']} deactivated"
+        )
+        return stats
+
+    @staticmethod
+    def _record_watermark(synced_at, stats):
+        """Store the sync watermark and stats in the current transaction"""
+        values = {
+            WATERMARK_SETTING: (synced_at.isoformat(), 'Time of the last successful OTS group sync'),
+            STATS_SETTING: (json.dumps(stats), 'Statistics of the last successful OTS group sync'),
+        }
+        for key, (value, description) in values.items():
+            setting = SystemSettingsModel.query.filter_by(key=key).first()
+            if setting:
+                setting.value = value
+                setting.updated_at = datetime.now()
+            else:
+                db.session.add(SystemSettingsModel(key=key, value=value, category='sync', description=description))
+
+    @staticmethod
+    def get_last_sync():
+        """Return (watermark ISO string or None, stats dict or None)"""
+        watermark = SystemSettingsModel.get_setting(WATERMARK_SETTING)
+        stats = SystemSettingsModel.get_setting(STATS_SETTING)
+        try:
+            stats = json.loads(stats) if stats else None
+        except (ValueError, TypeError):
+            stats = None
+        return watermark or None, stats
+
+
+# Convenience instance
+ots_group_sync = OTSGroupSyncService()
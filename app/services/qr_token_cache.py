@@ -0,0 +1,295 @@
+"""
+QR Token Cache
+
+Caches ATAK enrollment QR strings so that repeated dashboard loads do not
+ask OTS for a token every time.
+
+Backends (selected with the QR_CACHE_BACKEND setting):
+- memory:   bounded LRU cache local to the worker process (default)
+- database: qr_token_cache table, shared by every worker using the same database
+
+Every entry carries a fingerprint of the qr_token_expiry_minutes and
+qr_token_max_uses settings it was generated with. An entry whose fingerprint
+no longer matches the current settings is treated as a miss, so workers that
+did not see the settings change still pick up the new values.
+
+Token generation for a single user is serialized with single_flight(), which
+holds a per-key lock in the process and, for the database backend, a short
+lease row so that other workers wait for the first one instead of racing
+OTS delete/create calls.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app.models import QRTokenCacheModel, db
+
+# Settings that change the shape of generated tokens - updating any of them
+# invalidates the whole cache
+QR_TOKEN_SETTING_KEYS = ('qr_token_expiry_minutes', 'qr_token_max_uses')
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_LEASE_SECONDS = 30
+LEASE_POLL_INTERVAL = 0.2
+
+
+class MemoryBackend:
+    """Bounded, per-process LRU store"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [k for k, e in self._entries.items() if e['expires_at'] <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def acquire_lease(self, key, seconds):
+        # A process-local lock in single_flight() is all the memory backend needs
+        return True
+
+    def release_lease(self, key):
+        pass
+
+
+class DatabaseBackend:
+    """Store shared by all workers through the qr_token_cache table"""
+
+    def get(self, key):
+        row = QRTokenCacheModel.query.filter_by(cache_key=key).first()
+        if not row or not row.qr_string or row.expires_at <= int(time.time()):
+            return None
+        return row.to_entry()
+
+    def set(self, key, entry):
+        try:
+            row = QRTokenCacheModel.query.filter_by(cache_key=key).first()
+            if not row:
+                row = QRTokenCacheModel(cache_key=key)
+                db.session.add(row)
+            row.qr_string = entry['qr_string']
+            row.max_uses = entry.get('max_uses')
+            row.total_uses = entry.get('total_uses')
+            row.fingerprint = entry['fingerprint']
+            row.cached_at = entry['cached_at']
+            row.expires_at = int(entry['expires_at'])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Failed to store QR token cache entry {key}: {e}")
+
+    def delete(self, key):
+        try:
+            QRTokenCacheModel.query.filter_by(cache_key=key).update(
+                {'qr_string': None, 'expires_at': 0}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Failed to invalidate QR token cache entry {key}: {e}")
+
+    def clear(self):
+        try:
+            QRTokenCacheModel.query.delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Failed to clear QR token cache: {e}")
+
+    def sweep(self):
+        now = int(time.time())
+        try:
+            removed = QRTokenCacheModel.query.filter(
+                QRTokenCacheModel.expires_at <= now,
+                db.or_(QRTokenCacheModel.lease_until.is_(None), QRTokenCacheModel.lease_until <= now)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            return removed
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Failed to sweep QR token cache: {e}")
+            return 0
+
+    def acquire_lease(self, key, seconds):
+        """
+        Try to take the generation lease for a key.
+        Uses a conditional UPDATE so only one worker can win, inserting an
+        empty placeholder row first if the key has never been cached.
+        """
+        now = int(time.time())
+        for _ in range(2):
+            try:
+                acquired = QRTokenCacheModel.query.filter(
+                    QRTokenCacheModel.cache_key == key,
+                    db.or_(QRTokenCacheModel.lease_until.is_(None), QRTokenCacheModel.lease_until <= now)
+                ).update({'lease_until': now + seconds}, synchronize_session=False)
+                db.session.commit()
+                if acquired:
+                    return True
+                if QRTokenCacheModel.query.filter_by(cache_key=key).first():
+                    return False
+                db.session.add(QRTokenCacheModel(cache_key=key, expires_at=0))
+                db.session.commit()
+            except IntegrityError:
+                # Another worker inserted the placeholder first - retry the update
+                db.session.rollback()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning(f"Failed to acquire QR token lease {key}: {e}")
+                return True
+        return False
+
+    def release_lease(self, key):
+        try:
+            QRTokenCacheModel.query.filter_by(cache_key=key).update(
+                {'lease_until': None}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Failed to release QR token lease {key}: {e}")
+
+
+class QRTokenCache:
+    """Expiring QR token cache with per-key single-flight generation"""
+
+    def __init__(self):
+        self._backend = None
+        self._backend_lock = threading.Lock()
+        self._key_locks = {}
+        self._key_locks_guard = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    @staticmethod
+    def _create_backend():
+        backend = str(current_app.config.get('QR_CACHE_BACKEND', 'memory')).lower()
+        if backend == 'database':
+            return DatabaseBackend()
+        if backend != 'memory':
+            current_app.logger.warning(f"Unknown QR_CACHE_BACKEND '{backend}', using memory")
+        max_entries = int(current_app.config.get('QR_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        return MemoryBackend(max_entries=max_entries)
+
+    @staticmethod
+    def make_key(username, token_type):
+        return f"{username}:{token_type}"
+
+    def get(self, key, fingerprint=None):
+        """
+        Return the cached token dict for key, or None if missing, expired or
+        generated with different token settings.
+        """
+        entry = self.backend.get(key)
+        if not entry:
+            return None
+        if fingerprint is not None and entry.get('fingerprint') != fingerprint:
+            return None
+        return entry
+
+    def set(self, key, qr_string, expires_at, fingerprint, max_uses=None, total_uses=0):
+        """Cache a token until expires_at (unix epoch seconds)"""
+        if not qr_string or not expires_at or expires_at <= time.time():
+            return
+        self.backend.set(key, {
+            'qr_string': qr_string,
+            'expires_at': int(expires_at),
+            'max_uses': max_uses,
+            'total_uses': total_uses,
+            'fingerprint': fingerprint,
+            'cached_at': time.time()
+        })
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def sweep(self):
+        """Drop expired entries, returns the number removed"""
+        return self.backend.sweep()
+
+    @contextmanager
+    def single_flight(self, key, timeout=DEFAULT_LEASE_SECONDS):
+        """
+        Serialize token generation for one key.
+
+        Waits for the in-process lock, then for the backend lease held by any
+        other worker. If the lease is not released within timeout the caller
+        proceeds anyway - a duplicate OTS call is better than a failed request.
+        """
+        with self._key_locks_guard:
+            lock, waiters = self._key_locks.get(key, (threading.Lock(), 0))
+            self._key_locks[key] = (lock, waiters + 1)
+
+        try:
+            with lock:
+                deadline = time.time() + timeout
+                leased = self.backend.acquire_lease(key, timeout)
+                while not leased and time.time() < deadline:
+                    time.sleep(LEASE_POLL_INTERVAL)
+                    leased = self.backend.acquire_lease(key, timeout)
+                try:
+                    yield
+                finally:
+                    if leased:
+                        self.backend.release_lease(key)
+        finally:
+            with self._key_locks_guard:
+                lock, waiters = self._key_locks[key]
+                if waiters <= 1:
+                    del self._key_locks[key]
+                else:
+                    self._key_locks[key] = (lock, waiters - 1)
+
+
+def settings_fingerprint(expiry_seconds, max_uses):
+    """Fingerprint of the token settings an entry was generated with"""
+    return f"{expiry_seconds}:{max_uses}"
+
+
+# Shared instance
+qr_token_cache = QRTokenCache()
@@ -0,0 +1,548 @@
+"""
+User Import Service
+
+Pre-provisions accounts from a CSV or XLSX file. The import is a bulk user
+job (operation 'import', polled through GET /users/bulk/<id>) with one
+user_import_rows record per row.
+
+1. The file is read row by row and every row is validated before anything
+   is written: required fields, username/email format, role and group names,
+   and duplicate usernames/emails within the file and against existing users
+   and pending registrations (prefetched in chunks of PREFETCH_CHUNK_SIZE)
+2. Valid rows are stored and the job runs in a background thread, in batches
+   of USER_IMPORT_CHUNK_SIZE:
+   a. OTS accounts are created USER_IMPORT_OTS_CONCURRENCY at a time, each
+      retried up to USER_IMPORT_OTS_RETRIES times on connection errors
+   b. Local users, role and group memberships are bulk-inserted and committed
+   c. OTS group memberships are added and welcome emails sent if requested
+
+Each row's status records how far it got, so POST /users/import/<id>/resume
+continues an interrupted job and retries failed rows without creating
+anything twice.
+
+Columns (header names are case-insensitive, "first_name" works too):
+username, email, firstName, lastName, callsign, password (optional),
+roles (names separated by ';'), groups ('name' or 'name:IN|OUT|BOTH'
+separated by ';'), expiryDate (ISO 8601, optional).
+
+Rows without a password get a random OTS password, generated when the
+account is created and never stored, and has_password=False: the welcome
+email sends them a login link, or a link to set their password when magic
+link login is disabled. Supplied passwords are kept only until the row's
+OTS account exists and are cleared when the job finishes (or by the
+expired-record cleanup for jobs that never did).
+"""
+
+import csv
+import io
+import json
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app.exceptions import AuthorizationError, BadRequestError
+from app.models import (
+    BulkUserJobModel, GroupUserAssociation, OTSGroupModel, PendingRegistrationModel, UserImportRowModel,
+    UserModel, UserRoleModel, db, user_role_association
+)
+from app.ots import otsClient
+from app.services.entitlements import entitlements
+from app.services.group_membership import DIRECTIONS, GroupMembershipService, MembershipOperation, expand_direction
+
+DEFAULT_CHUNK_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 3
+DEFAULT_MAX_ROWS = 5000
+RETRY_BACKOFF_SECONDS = 0.5
+SET_PASSWORD_LINK_HOURS = 72
+LOCAL_FAILURE = 'Local user creation failed'
+PREFETCH_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+USERNAME_PATTERN = re.compile(r'^[a-z0-9]+$')
+REQUIRED_COLUMNS = ('username', 'email', 'firstname', 'lastname', 'callsign')
+ADMIN_ROLE_NAMES = ('administrator', 'admin')
+
+
+def _column_key(header):
+    return re.sub(r'[\s_\-]', '', str(header or '')).lower()
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def iter_csv_rows(stream):
+    """Yield (row_number, {column: value}) from a CSV byte stream"""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    header = [_column_key(h) for h in next(reader, [])]
+    for row_number, values in enumerate(reader, start=2):
+        if any(v.strip() for v in values):
+            yield row_number, {key: _cell(v) for key, v in zip(header, values)}
+
+
+def iter_xlsx_rows(stream):
+    """Yield (row_number, {column: value}) from the first sheet of an XLSX file"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('XLSX import requires the openpyxl package, upload a CSV file instead')
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_column_key(h) for h in next(rows, ())]
+        for row_number, values in enumerate(rows, start=2):
+            if any(_cell(v) for v in values):
+                yield row_number, {key: _cell(v) for key, v in zip(header, values)}
+    finally:
+        workbook.close()
+
+
+def iter_rows(filename, stream):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return iter_csv_rows(stream)
+    if name.endswith('.xlsx'):
+        return iter_xlsx_rows(stream)
+    raise ValueError('File must be a .csv or .xlsx file')
+
+
+class UserImportService:
+    """Validated, resumable bulk account provisioning"""
+
+    @staticmethod
+    def validate(rows, max_rows=None):
+        """
+        Validate (row_number, columns) pairs.
+        Returns (valid_rows, errors) - errors is a list of {row, errors}.
+        """
+        max_rows = max_rows or int(current_app.config.get('USER_IMPORT_MAX_ROWS', DEFAULT_MAX_ROWS))
+        roles = {role.name.lower(): role for role in UserRoleModel.query.all()}
+        groups = {group.name.lower(): group for group in OTSGroupModel.query.all()}
+
+        parsed, errors = [], []
+        seen_usernames, seen_emails = set(), set()
+        for row_number, columns in rows:
+            if len(parsed) + len(errors) >= max_rows:
+                errors.append({'row': row_number, 'errors': [f'Imports are limited to {max_rows} rows']})
+                break
+            row, row_errors = UserImportService._parse_row(columns, roles, groups)
+            if row['username'] and row['username'] in seen_usernames:
+                row_errors.append(f"Duplicate username '{row['username']}' in file")
+            if row['email'] and row['email'] in seen_emails:
+                row_errors.append(f"Duplicate email '{row['email']}' in file")
+            seen_usernames.add(row['username'])
+            seen_emails.add(row['email'])
+            row['row_number'] = row_number
+            if row_errors:
+                errors.append({'row': row_number, 'errors': row_errors})
+            else:
+                parsed.append(row)
+
+        taken_usernames, taken_emails = UserImportService._taken(seen_usernames, seen_emails)
+        valid = []
+        for row in parsed:
+            row_errors = []
+            if row['username'] in taken_usernames:
+                row_errors.append(f"Username '{row['username']}' already exists")
+            if row['email'] in taken_emails:
+                row_errors.append(f"Email '{row['email']}' already registered")
+            if row_errors:
+                errors.append({'row': row['row_number'], 'errors': row_errors})
+            else:
+                valid.append(row)
+        errors.sort(key=lambda e: e['row'])
+        return valid, errors
+
+    @staticmethod
+    def _parse_row(columns, roles, groups):
+        errors = [f'{key} is required' for key in REQUIRED_COLUMNS if not columns.get(key)]
+        username = columns.get('username', '').lower().replace(' ', '')
+        email = columns.get('email', '').lower()
+        if username and not USERNAME_PATTERN.match(username):
+            errors.append('Username can only contain letters and numbers (no spaces, underscores, or periods)')
+        elif username and not 3 <= len(username) <= 32:
+            errors.append('Username must be between 3 and 32 characters')
+        if email and ('@' not in email or '.' not in email):
+            errors.append('Invalid email format')
+
+        role_ids = []
+        for name in filter(None, (n.strip() for n in columns.get('roles', '').split(';'))):
+            role = roles.get(name.lower())
+            if role:
+                role_ids.append(role.id)
+            else:
+                errors.append(f"Unknown role '{name}'")
+
+        group_directions = {}
+        for entry in filter(None, (e.strip() for e in columns.get('groups', '').split(';'))):
+            name, _, direction = entry.partition(':')
+            direction = direction.strip().upper() or 'BOTH'
+            group = groups.get(name.strip().lower())
+            if not group:
+                errors.append(f"Unknown group '{name.strip()}'")
+            elif direction not in DIRECTIONS:
+                errors.append(f"Direction of group '{name.strip()}' must be IN, OUT, or BOTH")
+            else:
+                group_directions[group.id] = direction
+
+        expiry = None
+        if columns.get('expirydate'):
+            try:
+                expiry = datetime.fromisoformat(columns['expirydate'].replace('Z', '+00:00'))
+            except ValueError:
+                errors.append('expiryDate must be an ISO 8601 date')
+
+        password = columns.get('password') or None
+        if password and len(password) < 8:
+            errors.append('Password must be at least 8 characters')
+
+        return {
+            'username': username,
+            'email': email,
+            'first_name': columns.get('firstname'),
+            'last_name': columns.get('lastname'),
+            'callsign': columns.get('callsign'),
+            'password': password,
+            'has_password': password is not None,
+            'role_ids': role_ids,
+            'groups': group_directions,
+            'expiry_date': expiry,
+        }, errors
+
+    @staticmethod
+    def _taken(usernames, emails):
+        """Usernames and emails of the file already used by users or pending registrations"""
+        taken_usernames, taken_emails = set(), set()
+        for model in (UserModel, PendingRegistrationModel):
+            for values, column, taken in ((usernames, model.username, taken_usernames),
+                                          (emails, model.email, taken_emails)):
+                values = sorted(values)
+                for start in range(0, len(values), PREFETCH_CHUNK_SIZE):
+                    chunk = values[start:start + PREFETCH_CHUNK_SIZE]
+                    taken.update(value.lower() for (value,) in db.session.execute(
+                        select(column).where(func.lower(column).in_(chunk))
+                    ) if value)
+        return taken_usernames, taken_emails
+
+    @staticmethod
+    def create_job(filename, rows, send_welcome_email=False, actor_id=None):
+        """Store the validated rows as a queued import job; actor_id becomes the users' onboardedBy"""
+        params = {'filename': filename, 'sendWelcomeEmail': bool(send_welcome_email), 'onboardedBy': actor_id}
+        creator = db.session.get(UserModel, actor_id) if actor_id else None
+        job = BulkUserJobModel.create_job('import', params, [], created_by=creator.username if creator else None)
+        if not job:
+            raise ValueError('Failed to create import job')
+        job.total = len(rows)
+        records = [{
+            'job_id': job.id,
+            'row_number': row['row_number'],
+            'username': row['username'],
+            'email': row['email'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'callsign': row['callsign'],
+            'password': row['password'],
+            'has_password': row['has_password'],
+            'role_ids': json.dumps(row['role_ids']),
+            'groups': json.dumps(row['groups']),
+            'expiry_date': row['expiry_date'],
+            'status': 'pending',
+            'attempts': 0,
+        } for row in rows]
+        for start in range(0, len(records), PREFETCH_CHUNK_SIZE):
+            db.session.execute(UserImportRowModel.__table__.insert(), records[start:start + PREFETCH_CHUNK_SIZE])
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def resume(job):
+        """Queue a finished or interrupted import again; failed rows are retried"""
+        if job.operation != 'import':
+            raise ValueError('Only import jobs can be resumed')
+        if job.status == 'queued':
+            raise ValueError('Import is already queued')
+        # Rows that failed after provisioning already have their OTS account
+        UserImportRowModel.query.filter(
+            UserImportRowModel.job_id == job.id, UserImportRowModel.status == 'failed',
+            UserImportRowModel.error.like(f'{LOCAL_FAILURE}%')
+        ).update({'status': 'provisioned', 'error': None}, synchronize_session=False)
+        UserImportRowModel.query.filter(
+            UserImportRowModel.job_id == job.id, UserImportRowModel.status == 'failed'
+        ).update({'status': 'pending', 'error': None}, synchronize_session=False)
+        job.status = 'queued'
+        job.finished_at = None
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def start(job):
+        """Run the import in a background thread"""
+        app = current_app._get_current_object()
+
+        def run_in_background(job_id):
+            with app.app_context():
+                UserImportService.run(job_id)
+
+        thread = threading.Thread(target=run_in_background, args=(job.id,))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    @staticmethod
+    def run(job_id, chunk_size=None):
+        """Process the pending rows of a queued import job and return it"""
+        chunk_size = chunk_size or int(current_app.config.get('USER_IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+        job = BulkUserJobModel.get_by_id(job_id)
+        if not job or job.operation != 'import' or job.status != 'queued':
+            return job
+
+        job.status = 'running'
+        job.started_at = job.started_at or datetime.now()
+        db.session.commit()
+        params = job.get_params()
+
+        try:
+            while True:
+                rows = UserImportRowModel.get_for_job(job_id, ['pending', 'provisioned'], limit=chunk_size)
+                if not rows:
+                    break
+                UserImportService._provision([r for r in rows if r.status == 'pending'])
+                provisioned = [r for r in rows if r.status == 'provisioned']
+                try:
+                    UserImportService._create_local(provisioned, params.get('onboardedBy'))
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"Import job {job_id}: creating local users failed: {e}")
+                    for row in provisioned:
+                        row.status, row.error = 'failed', f'{LOCAL_FAILURE}: {str(e)[:450]}'
+                    db.session.commit()
+                    provisioned = []
+                if params.get('sendWelcomeEmail'):
+                    UserImportService._send_welcome_emails(provisioned)
+                UserImportService._record_progress(job)
+            job.status = 'completed'
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Import job {job_id} failed: {e}")
+            job.status = 'failed'
+
+        job.finished_at = datetime.now()
+        UserImportService._clear_passwords(job_id)
+        UserImportService._record_progress(job)
+        current_app.logger.info(
+            f"Import job {job_id} {job.status}: {job.succeeded} users created, {job.failed} failed"
+        )
+        return job
+
+    @staticmethod
+    def _record_progress(job):
+        counts = UserImportRowModel.count_by_status(job.id)
+        job.succeeded = counts.get('completed', 0)
+        job.failed = counts.get('failed', 0)
+        job.processed = job.succeeded + job.failed
+        failed_rows = UserImportRowModel.get_for_job(job.id, ['failed'], limit=MAX_REPORTED_ERRORS)
+        job.errors = json.dumps([
+            {'row': r.row_number, 'userId': r.user_id, 'username': r.username, 'error': r.error} for r in failed_rows
+        ])
+        db.session.commit()
+
+    @staticmethod
+    def _clear_passwords(job_id):
+        """Drop the supplied passwords of rows that never got an OTS account; a resume gives them a random one"""
+        UserImportRowModel.query.filter(
+            UserImportRowModel.job_id == job_id, UserImportRowModel.password.isnot(None)
+        ).update({'password': None, 'has_password': False}, synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def _provision(rows):
+        """Create the rows' OTS accounts; sets each row to 'provisioned' or 'failed'"""
+        if not rows:
+            return
+        admin_ids = {r.id for r in UserRoleModel.query.filter(func.lower(UserRoleModel.name).in_(ADMIN_ROLE_NAMES))}
+        jobs = [(row.id, row.username, row.password or secrets.token_urlsafe(24),
+                 ['administrator'] if admin_ids & set(json.loads(row.role_ids)) else ['user']) for row in rows]
+
+        # Log in once up front rather than from every worker thread
+        if not otsClient.auth_token:
+            try:
+                otsClient.login()
+            except Exception as e:
+                for row in rows:
+                    row.status, row.error = 'failed', f'OTS login failed: {str(e)[:450]}'
+                db.session.commit()
+                return
+
+        app = current_app._get_current_object()
+        concurrency = int(current_app.config.get('USER_IMPORT_OTS_CONCURRENCY', DEFAULT_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(jobs)))) as pool:
+            results = {row_id: (attempts, error) for row_id, attempts, error in
+                       pool.map(lambda job: UserImportService._create_in_ots(app, *job), jobs)}
+
+        for row in rows:
+            attempts, error = results[row.id]
+            row.attempts += attempts
+            if error is None:
+                row.status, row.password, row.error = 'provisioned', None, None
+            else:
+                current_app.logger.warning(f"Import: failed to create OTS user '{row.username}': {error}")
+                row.status, row.error = 'failed', f'OTS: {str(error)[:480]}'
+        db.session.commit()
+
+    @staticmethod
+    def _create_in_ots(app, row_id, username, password, roles):
+        """Returns (row_id, attempts, error) - connection errors are retried with backoff"""
+        retries = max(1, int(app.config.get('USER_IMPORT_OTS_RETRIES', DEFAULT_RETRIES)))
+        with app.app_context():
+            for attempt in range(1, retries + 1):
+                try:
+                    otsClient.create_user(username, password, roles)
+                    return row_id, attempt, None
+                except (BadRequestError, AuthorizationError) as e:
+                    # Rejected by OTS, retrying will not help
+                    return row_id, attempt, e
+                except Exception as e:
+                    if attempt == retries:
+                        return row_id, attempt, e
+                    time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+    @staticmethod
+    def _create_local(rows, onboarded_by=None):
+        """Bulk-insert users and their role/group memberships, then add the OTS group memberships"""
+        if not rows:
+            return
+        # Users left over from an interrupted run are reused
+        existing = dict(db.session.execute(
+            select(UserModel.username, UserModel.id).where(UserModel.username.in_([r.username for r in rows]))
+        ).all())
+        new_users = [{
+            'username': row.username,
+            'email': row.email,
+            'firstName': row.first_name,
+            'lastName': row.last_name,
+            'callsign': row.callsign,
+            'expiryDate': row.expiry_date,
+            'onboardedBy': onboarded_by,
+            'emailVerified': False,
+            'language': 'en',
+            'has_password': row.has_password,
+        } for row in rows if row.username not in existing]
+        if new_users:
+            db.session.execute(UserModel.__table__.insert(), new_users)
+            existing.update(db.session.execute(
+                select(UserModel.username, UserModel.id).where(UserModel.username.in_([u['username'] for u in new_users]))
+            ).all())
+        for row in rows:
+            row.user_id = existing[row.username]
+        user_ids = [row.user_id for row in rows]
+
+        has_role = set(db.session.execute(
+            select(user_role_association.c.user_id, user_role_association.c.role_id).where(
+                user_role_association.c.user_id.in_(user_ids))
+        ).all())
+        role_rows = [{'user_id': row.user_id, 'role_id': role_id}
+                     for row in rows for role_id in json.loads(row.role_ids) if (row.user_id, role_id) not in has_role]
+        if role_rows:
+            db.session.execute(user_role_association.insert(), role_rows)
+            # Core statements bypass the entitlement cache's flush listener
+            entitlements.clear()
+
+        in_group = set(db.session.execute(
+            select(GroupUserAssociation.user_id, GroupUserAssociation.group_id).where(
+                GroupUserAssociation.user_id.in_(user_ids))
+        ).all())
+        wanted = {row.id: {int(gid): d for gid, d in json.loads(row.groups).items()} for row in rows}
+        group_rows = [{'user_id': row.user_id, 'group_id': gid, 'direction': direction}
+                      for row in rows for gid, direction in wanted[row.id].items() if (row.user_id, gid) not in in_group]
+        if group_rows:
+            db.session.execute(GroupUserAssociation.__table__.insert(), group_rows)
+        db.session.commit()
+
+        group_names = {g.id: g.name for g in OTSGroupModel.query.filter(
+            OTSGroupModel.id.in_({gid for groups in wanted.values() for gid in groups})
+        ).all()}
+        calls = [(row.username, MembershipOperation('add', group_names[gid], d))
+                 for row in rows for gid, direction in wanted[row.id].items() if gid in group_names
+                 for d in sorted(expand_direction(direction))]
+        concurrency = int(current_app.config.get('USER_IMPORT_OTS_CONCURRENCY', DEFAULT_CONCURRENCY))
+        failures = {}
+        for username, op, error in (GroupMembershipService.run_operations(calls, concurrency) if calls else []):
+            failures.setdefault(username, []).append(f'{op.group_name} ({op.direction}): {str(error)[:200]}')
+
+        for row in rows:
+            row.status = 'completed'
+            # The account exists; a missing OTS group membership is reported but not retried
+            row.error = f"OTS group membership failed: {'; '.join(failures[row.username])}" if row.username in failures else None
+        db.session.commit()
+
+    @staticmethod
+    def _send_welcome_emails(rows):
+        from app.email import send_html_email
+        from app.models import OneTimeTokenModel, SystemSettingsModel
+        from app.notifications import get_frontend_url_safe
+
+        if not rows:
+            return
+        try:
+            brand_name = SystemSettingsModel.get_setting('brand_name_value', 'OpenTAK Portal')
+            frontend_url = get_frontend_url_safe()
+            magic_links = SystemSettingsModel.get_setting('magic_link_login_enabled', False) in [True, 'true', 'True']
+        except Exception as e:
+            current_app.logger.error(f"Import: not sending welcome emails: {e}")
+            return
+
+        # Without magic links, users without a password get a link to set one
+        set_password_tokens = {}
+        if not magic_links:
+            expires_at = datetime.utcnow() + timedelta(hours=SET_PASSWORD_LINK_HOURS)
+            for row in rows:
+                if not row.has_password:
+                    set_password_tokens[row.id] = secrets.token_urlsafe(48)
+                    db.session.add(OneTimeTokenModel(user_id=row.user_id, token=set_password_tokens[row.id],
+                                                     token_type='password_reset', expires_at=expires_at))
+            db.session.commit()
+
+        for row in rows:
+            link_url, link_title = f"{frontend_url}/login", 'Login Now'
+            if row.has_password:
+                how = 'Sign in with the password you were given.'
+            elif row.id in set_password_tokens:
+                link_url = f"{frontend_url}/reset-password?token={set_password_tokens[row.id]}"
+                link_title = 'Set Password'
+                how = f'Choose your password with the link below, it expires in {SET_PASSWORD_LINK_HOURS} hours.'
+            else:
+                how = 'Sign in with a login link sent to this address, then choose your password.'
+            message = f"""Hello {row.first_name or row.username},
+
+An account has been created for you on {brand_name}.
+
+Username: {row.username}
+Callsign: {row.callsign}
+
+{how}"""
+            try:
+                send_html_email(
+                    subject=f'Welcome to {brand_name}',
+                    recipients=[row.email],
+                    message=message,
+                    title=f'Welcome to {brand_name}',
+                    link_url=link_url,
+                    link_title=link_title
+                )
+            except Exception as e:
+                current_app.logger.error(f"Import: failed to send welcome email to {row.email}: {e}")
+
+
+# Convenience instance
+user_import = UserImportService()
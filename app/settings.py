@@ -36,4 +36,91 @@ TESTING = strtobool(environ.get('TESTING', 'False'))
 FRONTEND_URL = str(environ.get('FRONTEND_URL', 'http://localhost:5000'))
 
 # CORS origins for API
-CORS_ORIGINS = str(environ.get('CORS_ORIGINS', '*'))
\ No newline at end of file
+CORS_ORIGINS = str(environ.get('CORS_ORIGINS', '*'))
+
+# QR token cache backend: 'memory' (per worker) or 'database' (shared by all workers)
+QR_CACHE_BACKEND = str(environ.get('QR_CACHE_BACKEND', 'memory'))
+QR_CACHE_MAX_ENTRIES = int(environ.get('QR_CACHE_MAX_ENTRIES', 1024))
+# Seconds a cached QR token's usage counts are served before OTS is asked again
+QR_USAGE_TTL_SECONDS = int(environ.get('QR_USAGE_TTL_SECONDS', 15))
+
+# Minutes between scheduled OTS group syncs (0 disables the scheduled sync)
+OTS_GROUP_SYNC_INTERVAL_MINUTES = int(environ.get('OTS_GROUP_SYNC_INTERVAL_MINUTES', 60))
+
+# Cache read-mostly OTS responses (groups, group members, meshtastic channels, status)
+OTS_CACHE_ENABLED = strtobool(environ.get('OTS_CACHE_ENABLED', 'False'))
+
+# OTS request timeouts in seconds. The read timeout is lowered automatically for
+# endpoints with a latency history, but never below OTS_MIN_READ_TIMEOUT
+OTS_CONNECT_TIMEOUT = float(environ.get('OTS_CONNECT_TIMEOUT', 5))
+OTS_READ_TIMEOUT = float(environ.get('OTS_READ_TIMEOUT', 30))
+OTS_MIN_READ_TIMEOUT = float(environ.get('OTS_MIN_READ_TIMEOUT', 5))
+
+# Circuit breaker: stop calling OTS after this many consecutive failures and
+# retry with a single probe request after the recovery period
+OTS_BREAKER_FAILURE_THRESHOLD = int(environ.get('OTS_BREAKER_FAILURE_THRESHOLD', 5))
+OTS_BREAKER_RECOVERY_SECONDS = float(environ.get('OTS_BREAKER_RECOVERY_SECONDS', 30))
+
+# Kiosk status long-poll: longest time a status request is held open, and how
+# many requests may wait at once per worker process (each holds a gunicorn
+# thread). KIOSK_EVENTS_BACKEND selects the notification backend
+KIOSK_LONG_POLL_SECONDS = float(environ.get('KIOSK_LONG_POLL_SECONDS', 25))
+KIOSK_LONG_POLL_MAX_WAITERS = int(environ.get('KIOSK_LONG_POLL_MAX_WAITERS', 4))
+KIOSK_EVENTS_BACKEND = str(environ.get('KIOSK_EVENTS_BACKEND', 'memory'))
+
+# OIDC discovery document / JWKS cache lifetime in seconds. The provider's
+# Cache-Control max-age is used when present, clamped to the min/max
+OIDC_CACHE_DEFAULT_SECONDS = int(environ.get('OIDC_CACHE_DEFAULT_SECONDS', 3600))
+OIDC_CACHE_MIN_SECONDS = int(environ.get('OIDC_CACHE_MIN_SECONDS', 60))
+OIDC_CACHE_MAX_SECONDS = int(environ.get('OIDC_CACHE_MAX_SECONDS', 86400))
+
+# Expired account removal: the nightly job that deletes accounts past their
+# expiry date from OTS and the portal is off unless enabled; users handled per
+# committed batch, and how many OTS delete calls run at the same time
+ACCOUNT_EXPIRY_ENABLED = strtobool(environ.get('ACCOUNT_EXPIRY_ENABLED', 'False'))
+ACCOUNT_EXPIRY_CHUNK_SIZE = int(environ.get('ACCOUNT_EXPIRY_CHUNK_SIZE', 100))
+ACCOUNT_EXPIRY_OTS_CONCURRENCY = int(environ.get('ACCOUNT_EXPIRY_OTS_CONCURRENCY', 4))
+
+# How many OTS group add/remove calls a membership change runs at the same time
+GROUP_MEMBERSHIP_OTS_CONCURRENCY = int(environ.get('GROUP_MEMBERSHIP_OTS_CONCURRENCY', 4))
+
+# Bulk user operations (POST /api/v1/users/bulk): users handled per committed
+# batch, and how many OTS calls run at the same time
+BULK_USER_CHUNK_SIZE = int(environ.get('BULK_USER_CHUNK_SIZE', 100))
+BULK_USER_OTS_CONCURRENCY = int(environ.get('BULK_USER_OTS_CONCURRENCY', 4))
+
+# User import from CSV/XLSX (POST /api/v1/users/import): rows per import,
+# rows per committed batch, concurrent OTS calls and OTS create attempts per user
+USER_IMPORT_MAX_ROWS = int(environ.get('USER_IMPORT_MAX_ROWS', 5000))
+USER_IMPORT_CHUNK_SIZE = int(environ.get('USER_IMPORT_CHUNK_SIZE', 100))
+USER_IMPORT_OTS_CONCURRENCY = int(environ.get('USER_IMPORT_OTS_CONCURRENCY', 4))
+USER_IMPORT_OTS_RETRIES = int(environ.get('USER_IMPORT_OTS_RETRIES', 3))
+
+# TAK profile data packages: largest upload, limits checked while extracting
+# (total and per-file size, entries, compression ratio) and how long an
+# unfinished chunked upload is kept
+DATAPACKAGE_MAX_UPLOAD_BYTES = int(environ.get('DATAPACKAGE_MAX_UPLOAD_BYTES', 2 * 1024 ** 3))
+DATAPACKAGE_MAX_EXTRACTED_BYTES = int(environ.get('DATAPACKAGE_MAX_EXTRACTED_BYTES', 4 * 1024 ** 3))
+DATAPACKAGE_MAX_FILE_BYTES = int(environ.get('DATAPACKAGE_MAX_FILE_BYTES', 1024 ** 3))
+DATAPACKAGE_MAX_ENTRIES = int(environ.get('DATAPACKAGE_MAX_ENTRIES', 20000))
+DATAPACKAGE_MAX_COMPRESSION_RATIO = int(environ.get('DATAPACKAGE_MAX_COMPRESSION_RATIO', 100))
+DATAPACKAGE_UPLOAD_EXPIRY_HOURS = int(environ.get('DATAPACKAGE_UPLOAD_EXPIRY_HOURS', 24))
+# Hardlink identical data package files to one copy in the content-addressed store
+DATAPACKAGE_DEDUPLICATION = strtobool(environ.get('DATAPACKAGE_DEDUPLICATION', 'True'))
+
+# Prometheus metrics at /metrics, which requires "Authorization: Bearer <token>"
+# from the scraper. Metrics stay off until METRICS_TOKEN is set
+METRICS_ENABLED = strtobool(environ.get('METRICS_ENABLED', 'True'))
+METRICS_TOKEN = environ.get('METRICS_TOKEN') or None
+
+# Development/CI query profiling: adds X-Query-* headers to every response and
+# logs requests with repeated statements (N+1 suspects) or more than
+# QUERY_BUDGET queries (0 disables the budget)
+QUERY_PROFILING_ENABLED = strtobool(environ.get('QUERY_PROFILING_ENABLED', 'False'))
+QUERY_PROFILING_N1_THRESHOLD = int(environ.get('QUERY_PROFILING_N1_THRESHOLD', 5))
+QUERY_BUDGET = int(environ.get('QUERY_BUDGET', 0))
+
+# How long each worker caches the set of TAK profiles / Meshtastic channels /
+# channel groups a user can see. Changes made through a worker take effect
+# there immediately, in other workers within this many seconds. 0 disables
+ENTITLEMENT_CACHE_SECONDS = float(environ.get('ENTITLEMENT_CACHE_SECONDS', 60))
@@ -0,0 +1,41 @@
+"""
+Pagination helpers for list endpoints.
+"""
+
+from flask import request
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+
+def get_pagination_args(default_per_page=DEFAULT_PER_PAGE):
+    """
+    Read page/per_page from the query string.
+
+    Returns (page, per_page), or None when the client asked for neither so
+    endpoints that historically returned everything can keep doing so.
+    """
+    if 'page' not in request.args and 'per_page' not in request.args:
+        return None
+    page = max(1, request.args.get('page', 1, type=int) or 1)
+    per_page = request.args.get('per_page', default_per_page, type=int) or default_per_page
+    return page, max(1, min(per_page, MAX_PER_PAGE))
+
+
+def paginate(query, pagination):
+    """
+    Apply get_pagination_args() output to a query.
+    Returns (items, meta) where meta is a dict of total/page/per_page to merge
+    into the response, empty when not paginating.
+    """
+    if pagination is None:
+        return query.all(), {}
+    page, per_page = pagination
+    total = query.enable_eagerloads(False).order_by(None).count()
+    items = query.offset((page - 1) * per_page).limit(per_page).all()
+    return items, {'total': total, 'page': page, 'per_page': per_page}
+
+
+def is_compact():
+    """True when the client asked for the compact list projection (?compact=true)"""
+    return request.args.get('compact', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,226 @@
+"""
+Local OTS stand-in for benchmarks
+
+Emulates the OpenTAK Server API endpoints the portal calls, with in-memory
+state and a configurable response latency, so load tests measure the portal
+rather than a real TAK server.
+
+    python -m benchmarks.fake_ots --port 8081 --latency-ms 40 --jitter-ms 20
+
+Point the portal at it with OTS_URL=http://127.0.0.1:8081. Every username
+and password is accepted: the first login of an unknown user creates it.
+"""
+
+import argparse
+import random
+import secrets
+import threading
+import time
+
+from flask import Flask, jsonify, request
+
+
+class FakeOTSState:
+    """Users, groups, QR tokens and Meshtastic channels held in memory"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = {}
+        self.tokens = {}
+        self.groups = {'__ANON__': set()}
+        self.qr_strings = {}
+        self.channels = {}
+
+    def ensure_user(self, username, roles=('user',)):
+        with self.lock:
+            return self.users.setdefault(username, {'username': username, 'roles': list(roles), 'active': True})
+
+    def issue_token(self, username):
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.tokens[token] = username
+        return token
+
+    def user_for_token(self, token):
+        with self.lock:
+            return self.tokens.get(token)
+
+
+def create_fake_ots(latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None):
+    """
+    Build the fake OTS app. Each request sleeps latency_ms plus up to
+    jitter_ms, and fails with a 500 with probability error_rate.
+    """
+    app = Flask(__name__)
+    state = FakeOTSState()
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    app.config['FAKE_OTS_STATE'] = state
+
+    @app.before_request
+    def simulate_latency():
+        with rng_lock:
+            delay = latency_ms + rng.uniform(0, jitter_ms)
+            fail = rng.random() < error_rate
+        if delay:
+            time.sleep(delay / 1000.0)
+        if fail:
+            return jsonify({'success': False, 'error': 'Simulated OTS failure'}), 500
+
+    def current_username():
+        return state.user_for_token(request.args.get('auth_token', ''))
+
+    def user_profile(username):
+        user = state.ensure_user(username)
+        with state.lock:
+            groups = [name for name, members in state.groups.items() if username in members]
+        return {
+            'username': username,
+            'email': f'{username}@example.com',
+            'firstName': username,
+            'lastName': 'Bench',
+            'callsign': username.upper(),
+            'roles': [{'name': role} for role in user['roles']],
+            'groups': [{'name': name} for name in groups],
+        }
+
+    @app.route('/api/login', methods=['GET', 'POST'])
+    def login():
+        if request.method == 'GET':
+            return jsonify({'response': {'csrf_token': secrets.token_hex(8)}})
+        username = (request.get_json(silent=True) or {}).get('username')
+        if not username:
+            return jsonify({'success': False, 'error': 'Username is required'}), 400
+        state.ensure_user(username)
+        return jsonify({'response': {'user': {'authentication_token': state.issue_token(username)}}})
+
+    @app.route('/api/me')
+    def me():
+        username = current_username()
+        if not username:
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        return jsonify(user_profile(username))
+
+    @app.route('/api/status')
+    def status():
+        return jsonify({'version': 'fake-ots', 'uptime': time.monotonic()})
+
+    @app.route('/api/user/add', methods=['POST'])
+    def user_add():
+        body = request.get_json(silent=True) or {}
+        username = body.get('username')
+        if not username or not username.isalnum():
+            return jsonify({'success': False, 'error': 'Usernames can contain only letters and numbers'}), 400
+        with state.lock:
+            if username in state.users:
+                return jsonify({'success': False, 'error': f'User {username} already exists'}), 400
+        state.ensure_user(username, body.get('roles') or ['user'])
+        return jsonify({'success': True})
+
+    @app.route('/api/user/delete', methods=['POST'])
+    def user_delete():
+        username = (request.get_json(silent=True) or {}).get('username')
+        with state.lock:
+            if state.users.pop(username, None) is None:
+                return jsonify({'success': False, 'error': f'User {username} does not exist'}), 400
+            for members in state.groups.values():
+                members.discard(username)
+        return jsonify({'success': True})
+
+    @app.route('/api/user/password/reset', methods=['POST'])
+    @app.route('/api/user/activate', methods=['POST'])
+    @app.route('/api/user/deactivate', methods=['POST'])
+    def user_update():
+        return jsonify({'success': True})
+
+    @app.route('/api/users')
+    def users():
+        with state.lock:
+            results = [dict(user, roles=[{'name': r} for r in user['roles']]) for user in state.users.values()]
+        return jsonify({'results': results, 'total': len(results)})
+
+    @app.route('/api/groups', methods=['GET', 'POST', 'PUT'])
+    def groups():
+        body = request.get_json(silent=True) or {}
+        if request.method == 'POST':
+            with state.lock:
+                state.groups.setdefault(body.get('name'), set())
+            return jsonify({'success': True})
+        if request.method == 'PUT':
+            with state.lock:
+                members = state.groups.setdefault(body.get('group_name'), set())
+                members.update(body.get('users') or [])
+            return jsonify({'success': True})
+        with state.lock:
+            results = [{'name': name, 'active': True, 'description': None} for name in sorted(state.groups)]
+        return jsonify({'results': results, 'total': len(results)})
+
+    @app.route('/api/groups/members', methods=['GET', 'DELETE'])
+    def group_members():
+        if request.method == 'DELETE':
+            with state.lock:
+                state.groups.get(request.args.get('group_name'), set()).discard(request.args.get('username'))
+            return jsonify({'success': True})
+        with state.lock:
+            members = sorted(state.groups.get(request.args.get('name'), set()))
+        return jsonify({'results': [{'username': m, 'direction': 'BOTH'} for m in members]})
+
+    def qr_string_endpoint(kind):
+        def handler():
+            username = request.args.get('username') or (request.get_json(silent=True) or {}).get('username')
+            key = (kind, username)
+            if request.method == 'DELETE':
+                with state.lock:
+                    state.qr_strings.pop(key, None)
+                return jsonify({'success': True})
+            with state.lock:
+                if request.method == 'POST' or key not in state.qr_strings:
+                    token = secrets.token_urlsafe(24)
+                    state.qr_strings[key] = f'tak://com.atakmap.app/enroll?host=fake-ots&username={username}&token={token}'
+                qr_string = state.qr_strings[key]
+            return jsonify({'success': True, 'qr_string': qr_string})
+        handler.__name__ = f'{kind}_qr_string'
+        return handler
+
+    app.add_url_rule('/api/atak_qr_string', view_func=qr_string_endpoint('atak'), methods=['GET', 'POST', 'DELETE'])
+    app.add_url_rule('/api/itak_qr_string', view_func=qr_string_endpoint('itak'), methods=['GET', 'POST', 'DELETE'])
+
+    @app.route('/api/meshtastic/channel', methods=['GET', 'POST', 'DELETE'])
+    def meshtastic_channel():
+        if request.method == 'POST':
+            body = request.get_json(silent=True) or {}
+            with state.lock:
+                channel_id = len(state.channels) + 1
+                state.channels[body.get('url')] = {'id': channel_id, 'name': body.get('name'), 'url': body.get('url')}
+            return jsonify({'success': True, 'id': channel_id})
+        if request.method == 'DELETE':
+            with state.lock:
+                state.channels.pop(request.args.get('url'), None)
+            return jsonify({'success': True})
+        with state.lock:
+            results = list(state.channels.values())
+        return jsonify({'results': results, 'total': len(results)})
+
+    @app.route('/api/meshtastic/generate_psk')
+    def generate_psk():
+        return jsonify({'psk': secrets.token_urlsafe(32)})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local OTS stand-in for benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Base latency added to every response')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Random extra latency, up to this many ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for latency jitter and injected errors')
+    args = parser.parse_args()
+
+    app = create_fake_ots(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Database query benchmark
+
+Times the association-table lookups behind RBAC and entitlement checks
+directly against the database, without HTTP in the way. Useful for schema
+and index changes: run it against a seeded database before and after a
+migration and compare.
+
+    python -m benchmarks.queries --prefix seed --iterations 500 --output before.json
+    flask db upgrade
+    python -m benchmarks.queries --prefix seed --iterations 500 --compare before.json
+"""
+
+import argparse
+import json
+import random
+import time
+
+from sqlalchemy import select
+
+from benchmarks.run import print_report, summarize
+
+
+def _queries(prefix, rng):
+    """(name, callable(i)) pairs, each running one query for a random seeded user, role or resource"""
+    from app.models import (
+        GroupUserAssociation, TakProfileModel, UserModel, UserRoleModel, db, user_role_association
+    )
+    from app.services.entitlements import visible_ids_select
+
+    user_ids = [i for (i,) in db.session.execute(select(UserModel.id).where(UserModel.username.like(f'{prefix}user%')))]
+    role_ids = [i for (i,) in db.session.execute(select(UserRoleModel.id).where(UserRoleModel.name.like(f'{prefix}_role_%')))]
+    profile_ids = [i for (i,) in db.session.execute(select(TakProfileModel.id))]
+    if not user_ids or not role_ids:
+        raise SystemExit(f"No seeded data with prefix '{prefix}', run 'flask seed dataset --prefix {prefix}' first")
+
+    def run(statement):
+        db.session.execute(statement).all()
+
+    return [
+        ('user_roles', lambda i: run(
+            select(user_role_association.c.role_id).where(user_role_association.c.user_id == rng.choice(user_ids)))),
+        ('role_members', lambda i: run(
+            select(user_role_association.c.user_id).where(user_role_association.c.role_id == rng.choice(role_ids)))),
+        ('user_ots_groups', lambda i: run(
+            select(GroupUserAssociation.group_id).where(GroupUserAssociation.user_id == rng.choice(user_ids)))),
+        ('visible_tak_profiles', lambda i: run(visible_ids_select(rng.choice(user_ids), 'tak_profile'))),
+        ('visible_channels', lambda i: run(visible_ids_select(rng.choice(user_ids), 'meshtastic'))),
+        ('visible_channel_groups', lambda i: run(visible_ids_select(rng.choice(user_ids), 'meshtastic_group'))),
+        ('profile_access_check', lambda i: TakProfileModel.can_access_profile(
+            rng.choice(user_ids), rng.choice(profile_ids) if profile_ids else 0)),
+    ]
+
+
+def run_queries(prefix, iterations, seed=1):
+    rng = random.Random(seed)
+    results = {}
+    for name, query in _queries(prefix, rng):
+        query(0)  # warm up
+        latencies = []
+        started = time.perf_counter()
+        for i in range(iterations):
+            t = time.perf_counter()
+            query(i)
+            latencies.append(time.perf_counter() - t)
+        results[name] = summarize(latencies, [], 0, time.perf_counter() - started)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time RBAC and entitlement queries against the database')
+    parser.add_argument('--prefix', default='seed', help='Prefix of the seeded dataset')
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Results JSON of an earlier run to compare against')
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        results = run_queries(args.prefix, args.iterations)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get('scenarios')
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'prefix': args.prefix, 'iterations': args.iterations, 'scenarios': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark runner
+
+Runs scenarios against a portal instance and reports throughput and latency
+percentiles. Results can be saved and compared with an earlier run, e.g.
+the previous release:
+
+    python -m benchmarks.run --scenario all --requests 1000 --concurrency 20 \\
+        --output results-1.5.json --compare results-1.4.json
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.seed import DEFAULT_MANIFEST
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, statuses, errors, elapsed):
+    ordered = sorted(latencies)
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    failed = errors + sum(count for status, count in status_counts.items() if not status.startswith(('2', '3')))
+    return {
+        'requests': len(latencies) + errors,
+        'failed': failed,
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        'status_codes': status_counts,
+    }
+
+
+def run_scenario(scenario, base_url, manifest, total, concurrency, timeout=60):
+    setup_session = requests.Session()
+    scenario.setup(setup_session, base_url, manifest)
+
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, statuses = [], []
+    errors = [0]
+
+    def one(i):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        method, path, kwargs = scenario.request(i)
+        started = time.perf_counter()
+        try:
+            response = local.session.request(method, base_url + path, timeout=timeout, **kwargs)
+            response.content  # include the body transfer in the timing
+        except requests.RequestException:
+            with lock:
+                errors[0] += 1
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses.append(response.status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return summarize(latencies, statuses, errors[0], time.perf_counter() - started)
+
+
+def _portal_version(base_url):
+    try:
+        return requests.get(f'{base_url}/api/v1/version', timeout=5).json()
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def print_report(results, baseline=None):
+    header = f"{'scenario':<24}{'reqs':>7}{'fail':>6}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, stats in results.items():
+        print(f"{name:<24}{stats['requests']:>7}{stats['failed']:>6}{stats['throughput_rps']:>10.1f}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            def change(key):
+                before = previous.get(key) or 0
+                return f"{(stats[key] - before) / before * 100:+.1f}%" if before else 'n/a'
+            print(f"{'  vs baseline':<24}{'':>13}{change('throughput_rps'):>10}{change('p50_ms'):>9}"
+                  f"{change('p95_ms'):>9}{change('p99_ms'):>9}{change('max_ms'):>9}")
+    print('latencies in ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run portal load-test scenarios')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS) + ['all'],
+                        help='Scenario to run, may be repeated (default: all)')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST, help='Dataset manifest written by benchmarks.seed')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Results JSON of an earlier run to compare against')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.manifest):
+        sys.exit(f"No dataset manifest at {args.manifest}, run 'python -m benchmarks.seed' first")
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    names = args.scenario or ['all']
+    names = sorted(SCENARIOS) if 'all' in names else names
+    base_url = args.base_url.rstrip('/')
+
+    results = {}
+    for name in names:
+        print(f"Running {name} ({args.requests} requests, concurrency {args.concurrency})...", file=sys.stderr)
+        results[name] = run_scenario(SCENARIOS[name](), base_url, manifest, args.requests, args.concurrency)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get('scenarios')
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'run_at': datetime.now().isoformat(),
+                'base_url': base_url,
+                'version': _portal_version(base_url),
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'dataset': {key: manifest.get(key) for key in ('prefix', 'seed', 'users')},
+                'scenarios': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
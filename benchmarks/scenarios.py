@@ -0,0 +1,118 @@
+"""
+Benchmark scenarios
+
+Each scenario prepares what it needs once (setup) and then describes the
+i-th request of the run. The runner in benchmarks.run issues the requests
+concurrently and times them.
+"""
+
+import itertools
+import secrets
+import threading
+
+
+class Scenario:
+    name = None
+    description = None
+
+    def setup(self, session, base_url, manifest):
+        """Prepare state for the run, e.g. log users in"""
+
+    def request(self, i):
+        """Return (method, path, kwargs) for the i-th request"""
+        raise NotImplementedError
+
+
+def _login(session, base_url, username, password):
+    response = session.post(f'{base_url}/api/v1/auth/login', json={'username': username, 'password': password})
+    response.raise_for_status()
+    return response.json()['access_token']
+
+
+class _LoggedInScenario(Scenario):
+    """Logs a pool of seeded users in up front and rotates through their tokens"""
+
+    token_pool_size = 50
+
+    def setup(self, session, base_url, manifest):
+        usernames = manifest['usernames'][:self.token_pool_size]
+        self.tokens = [_login(session, base_url, username, manifest['password']) for username in usernames]
+        self.manifest = manifest
+
+    def auth(self, i):
+        return {'headers': {'Authorization': f'Bearer {self.tokens[i % len(self.tokens)]}'}}
+
+
+class LoginStorm(Scenario):
+    name = 'login_storm'
+    description = 'Seeded users logging in, each login authenticates against OTS'
+
+    def setup(self, session, base_url, manifest):
+        self.usernames = manifest['usernames']
+        self.password = manifest['password']
+
+    def request(self, i):
+        username = self.usernames[i % len(self.usernames)]
+        return 'POST', '/api/v1/auth/login', {'json': {'username': username, 'password': self.password}}
+
+
+class RegistrationBurst(Scenario):
+    name = 'registration_burst'
+    description = 'New users registering with an auto-approve onboarding code'
+
+    def setup(self, session, base_url, manifest):
+        self.code = manifest['onboarding_code']
+        # Unique per run so the scenario can be repeated against the same database
+        self.run_id = secrets.token_hex(3)
+        self.prefix = manifest['prefix']
+
+    def request(self, i):
+        username = f'{self.prefix}reg{self.run_id}{i}'
+        return 'POST', '/api/v1/auth/register', {'json': {
+            'username': username,
+            'password': 'Benchmark-password-1',
+            'email': f'{username}@example.com',
+            'firstName': 'Bench',
+            'lastName': 'Registration',
+            'callsign': username.upper(),
+            'onboardingCode': self.code,
+        }}
+
+
+class ProfileDownloadBurst(_LoggedInScenario):
+    name = 'profile_download_burst'
+    description = 'Logged-in users downloading the callsign-injected TAK profile'
+
+    def request(self, i):
+        return 'GET', f"/api/v1/tak-profiles/{self.manifest['profile_id']}/download", self.auth(i)
+
+
+class SettingsPolling(Scenario):
+    name = 'settings_polling'
+    description = 'Anonymous clients polling the public settings endpoint'
+
+    def request(self, i):
+        return 'GET', '/api/v1/settings', {}
+
+
+class HomePage(_LoggedInScenario):
+    name = 'home_page'
+    description = 'The calls the home page makes for a logged-in user'
+
+    paths = ('/api/v1/tak-profiles', '/api/v1/meshtastic', '/api/v1/meshtastic/groups',
+             '/api/v1/announcements/unread-count')
+
+    def setup(self, session, base_url, manifest):
+        super().setup(session, base_url, manifest)
+        self._paths = itertools.cycle(self.paths)
+        self._lock = threading.Lock()
+
+    def request(self, i):
+        with self._lock:
+            path = next(self._paths)
+        return 'GET', path, self.auth(i)
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (
+    LoginStorm, RegistrationBurst, ProfileDownloadBurst, SettingsPolling, HomePage
+)}
@@ -0,0 +1,101 @@
+"""
+Seeded benchmark dataset
+
+Generates the scale dataset with app.seed (the same generator as
+`flask seed dataset`) and adds what the load-test scenarios need on top: a
+public TAK profile with a template on disk and an auto-approve onboarding
+code.
+
+    python -m benchmarks.seed --users 5000 --seed 42
+
+The names the scenarios need (usernames, profile id, onboarding code) are
+written to a manifest that benchmarks.run reads.
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(__file__), 'dataset.json')
+BENCH_PASSWORD = 'benchmark-password'
+
+PREF_TEMPLATE = """<?xml version='1.0' standalone='yes'?>
+<preferences>
+  <preference version="1" name="com.atakmap.app.civ_preferences">
+    <entry key="locationCallsign" class="class java.lang.String">CALLSIGN</entry>
+  </preference>
+</preferences>
+"""
+
+
+def seed_dataset(users=1000, roles=10, groups=20, radios=500, announcements=50, prefix='bench', seed=42):
+    """Insert the dataset inside the current app context and return its manifest"""
+    from flask import current_app
+    from app.models import (
+        OnboardingCodeModel, TakProfileModel, UserRoleModel, db, role_onboardingcode_association,
+        role_takprofile_association
+    )
+    from app.seed import generate_dataset
+
+    generate_dataset(
+        users=users, roles=roles, groups=groups, radios=radios, announcements=announcements,
+        profiles=20, channels=200, channel_groups=40, pending=100, prefix=prefix, seed=seed
+    )
+    user_role = UserRoleModel.get_role_by_name('user')
+
+    # A public profile with a template on disk for the download scenario
+    template = os.path.join(current_app.config['DATAPACKAGE_UPLOAD_FOLDER'], f'{prefix}_profile')
+    os.makedirs(template, exist_ok=True)
+    with open(os.path.join(template, 'prefs.pref'), 'w') as f:
+        f.write(PREF_TEMPLATE)
+    profile = TakProfileModel(
+        name=f'{prefix} profile', description='Benchmark profile', isPublic=True,
+        takTemplateFolderLocation=template, takPrefFileLocation='prefs.pref', injectCallsign=True
+    )
+    code = OnboardingCodeModel(
+        name=f'{prefix} code', description='Benchmark auto-approve code',
+        onboardingCode=f'{prefix.upper()}-CODE', uses=0, autoApprove=True, requireApproval=False
+    )
+    db.session.add_all([profile, code])
+    db.session.flush()
+    db.session.execute(role_takprofile_association.insert(), [{'role_id': user_role.id, 'takprofile_id': profile.id}])
+    db.session.execute(role_onboardingcode_association.insert(), [{'role_id': user_role.id, 'onboardingcode_id': code.id}])
+    db.session.commit()
+
+    return {
+        'prefix': prefix,
+        'seed': seed,
+        'users': users,
+        'password': BENCH_PASSWORD,
+        'usernames': [f'{prefix}user{i}' for i in range(users)],
+        'profile_id': profile.id,
+        'onboarding_code': code.onboardingCode,
+        'created_at': datetime.now().isoformat(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed the portal database with a benchmark dataset')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--roles', type=int, default=10)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--radios', type=int, default=500)
+    parser.add_argument('--announcements', type=int, default=50)
+    parser.add_argument('--prefix', default='bench', help='Lowercase alphanumeric prefix for generated names')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        manifest = seed_dataset(args.users, args.roles, args.groups, args.radios, args.announcements,
+                                args.prefix, args.seed)
+    with open(args.manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Seeded {args.users} users, {args.radios} radios, {args.announcements} announcements; "
+          f"manifest written to {args.manifest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -22,4 +22,6 @@ fi
 
 # Start the application with gunicorn
 echo "Starting gunicorn..."
-exec gunicorn -w 1 -t 50 app:app -b 0.0.0.0:5000
+# Threads let kiosk long-poll requests wait without blocking other requests;
+# KIOSK_LONG_POLL_MAX_WAITERS keeps them from taking every thread
+exec gunicorn -w 1 --threads 8 -t 50 app:app -b 0.0.0.0:5000
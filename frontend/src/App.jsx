@@ -56,7 +56,14 @@ const queryClient = new QueryClient({
   },
 });
 
-// Document title component - sets page title from settings
+// Favicon links for the custom logo's generated variants
+const LOGO_ICONS = [
+  { rel: 'icon', sizes: '32x32', variant: 'favicon-32' },
+  { rel: 'icon', sizes: '192x192', variant: 'favicon-192' },
+  { rel: 'apple-touch-icon', sizes: '180x180', variant: 'favicon-180' },
+];
+
+// Document title component - sets page title and favicons from settings
 const DocumentTitle = () => {
   const { data: settings } = useQuery({
     queryKey: ['settings'],
@@ -73,6 +80,29 @@ const DocumentTitle = () => {
     }
   }, [settings?.brand_name]);
 
+  const logoVariants = settings?.custom_logo_variants;
+  useEffect(() => {
+    if (!logoVariants) {
+      return;
+    }
+    LOGO_ICONS.forEach(({ rel, sizes, variant }) => {
+      if (!logoVariants[variant]) {
+        return;
+      }
+      let link = document.head.querySelector(`link[rel="${rel}"][sizes="${sizes}"]`);
+      if (!link) {
+        link = document.createElement('link');
+        link.setAttribute('rel', rel);
+        link.setAttribute('sizes', sizes);
+        document.head.appendChild(link);
+      }
+      link.setAttribute('type', 'image/png');
+      link.setAttribute('href', logoVariants[variant]);
+    });
+    // The custom icons replace the default one
+    document.head.querySelector('link[rel="icon"]:not([sizes])')?.remove();
+  }, [logoVariants]);
+
   return null;
 };
 
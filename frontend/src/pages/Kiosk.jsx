@@ -141,9 +141,16 @@ function Kiosk() {
   useEffect(() => {
     if (state !== 'qr' || !sessionId) return;
 
+    // Long-poll: the server answers as soon as the phone authenticates
+    let cancelled = false;
+    pollRef.current = () => { cancelled = true; };
+
     const poll = async () => {
+      const started = Date.now();
+      let delay = 0;
       try {
-        const res = await kioskAPI.getSessionStatus(sessionId);
+        const res = await kioskAPI.getSessionStatus(sessionId, 25);
+        if (cancelled) return;
         if (res.data.status === 'authenticated') {
           const token = res.data.access_token;
           const refresh = res.data.refresh_token;
@@ -167,17 +174,29 @@ function Kiosk() {
           setKioskUser(user);
           expiryTimeRef.current = expiry;
           setState('authenticated');
+          return;
         } else if (res.data.status === 'expired') {
           // Session expired, create a new one
           createNewSession();
+          return;
+        }
+        // Still pending: the server did not wait (long-polling off or too many kiosks waiting),
+        // so follow its retryAfter hint, or back off when it answered almost immediately
+        if (res.data.retryAfter) {
+          delay = res.data.retryAfter * 1000;
+        } else if (Date.now() - started < 1000) {
+          delay = 2500;
         }
       } catch {
-        // Ignore poll errors
+        // Back off briefly on errors
+        delay = 2500;
       }
+      if (delay) await new Promise((resolve) => setTimeout(resolve, delay));
+      if (!cancelled) poll();
     };
 
-    pollRef.current = setInterval(poll, 2500);
-    return () => clearInterval(pollRef.current);
+    poll();
+    return () => { cancelled = true; };
   }, [state, sessionId]);
 
   // When authenticated, fetch QR codes and radios, start countdown
@@ -238,7 +257,7 @@ function Kiosk() {
 
   const handleSignOut = () => {
     clearInterval(timerRef.current);
-    clearInterval(pollRef.current);
+    if (pollRef.current) pollRef.current();
     clearKioskSession();
     expiryTimeRef.current = null;
     setAccessToken(null);
@@ -579,8 +579,9 @@ export const kioskAPI = {
   createSession: () =>
     axios.post(`${API_BASE_URL}/api/v1/kiosk/session`),
 
-  getSessionStatus: (sessionId) =>
-    axios.get(`${API_BASE_URL}/api/v1/kiosk/session/${sessionId}/status`),
+  // wait: seconds the server may hold the request open while the session is pending
+  getSessionStatus: (sessionId, wait = 0) =>
+    axios.get(`${API_BASE_URL}/api/v1/kiosk/session/${sessionId}/status`, { params: wait ? { wait } : {} }),
 
   authenticateSession: (sessionId) =>
     api.post(`/kiosk/session/${sessionId}/authenticate`),
@@ -0,0 +1,46 @@
+"""add datapackage_uploads table and takprofiles content manifest
+
+Revision ID: a4c8e2d95b61
+Revises: f7b2d6e18a93
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c8e2d95b61'
+down_revision = 'f7b2d6e18a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('takprofiles', sa.Column('contentHash', sa.String(length=64), nullable=True))
+    op.add_column('takprofiles', sa.Column('contentManifest', sa.Text(), nullable=True))
+    op.create_table('datapackage_uploads',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('profile_id', sa.Integer(), nullable=True),
+    sa.Column('filename', sa.String(), nullable=False),
+    sa.Column('total_size', sa.BigInteger(), nullable=False),
+    sa.Column('received', sa.BigInteger(), nullable=False),
+    sa.Column('options', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('created_by', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['profile_id'], ['takprofiles.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_datapackage_uploads_updated_at'), 'datapackage_uploads', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_datapackage_uploads_updated_at'), table_name='datapackage_uploads')
+    op.drop_table('datapackage_uploads')
+    op.drop_column('takprofiles', 'contentManifest')
+    op.drop_column('takprofiles', 'contentHash')
@@ -0,0 +1,25 @@
+"""add approver work queue indexes
+
+Revision ID: a7c3e9f21b64
+Revises: cab33216ca47
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f21b64'
+down_revision = 'cab33216ca47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_onboardingcodes_approver_role', 'onboardingcodes', ['approverRoleId', 'requireApproval'], unique=False)
+    op.create_index('ix_pending_registrations_code_status', 'pending_registrations', ['onboarding_code_id', 'approval_status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_pending_registrations_code_status', table_name='pending_registrations')
+    op.drop_index('ix_onboardingcodes_approver_role', table_name='onboardingcodes')
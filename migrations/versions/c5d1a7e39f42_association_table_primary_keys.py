@@ -0,0 +1,67 @@
+"""composite primary keys and reverse indexes on association tables
+
+Revision ID: c5d1a7e39f42
+Revises: d41e8b2c7a95
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d1a7e39f42'
+down_revision = 'd41e8b2c7a95'
+branch_labels = None
+depends_on = None
+
+# table, primary key columns (in order), reverse index name
+ASSOCIATION_TABLES = [
+    ('role_onboardingcode_association', ['role_id', 'onboardingcode_id'], 'ix_role_onboardingcode_association_onboardingcode_id'),
+    ('user_onboardingcode_association', ['user_id', 'onboardingcode_id'], 'ix_user_onboardingcode_association_onboardingcode_id'),
+    ('user_takprofile_association', ['user_id', 'takprofile_id'], 'ix_user_takprofile_association_takprofile_id'),
+    ('role_takprofile_association', ['role_id', 'takprofile_id'], 'ix_role_takprofile_profile_role'),
+    ('user_role_association', ['user_id', 'role_id'], 'ix_user_role_association_role_id'),
+    ('user_meshtastic_association', ['user_id', 'meshtastic_id'], 'ix_user_meshtastic_association_meshtastic_id'),
+    ('role_meshtastic_association', ['role_id', 'meshtastic_id'], 'ix_role_meshtastic_association_meshtastic_id'),
+    ('role_meshtastic_group_association', ['role_id', 'group_id'], 'ix_role_meshtastic_group_association_group_id'),
+    ('user_meshtastic_group_association', ['user_id', 'group_id'], 'ix_user_meshtastic_group_association_group_id'),
+    ('announcement_role_association', ['announcement_id', 'role_id'], 'ix_announcement_role_association_role_id'),
+    ('announcement_user_association', ['announcement_id', 'user_id'], 'ix_announcement_user_association_user_id'),
+]
+
+
+def _dedupe(table, columns):
+    """Keep one copy of every pair and drop rows with a NULL side (portable across SQLite and PostgreSQL)"""
+    cols = ', '.join(columns)
+    not_null = ' AND '.join(f'{c} IS NOT NULL' for c in columns)
+    op.execute(f'CREATE TABLE tmp_{table} AS SELECT DISTINCT {cols} FROM {table} WHERE {not_null}')
+    op.execute(f'DELETE FROM {table}')
+    op.execute(f'INSERT INTO {table} ({cols}) SELECT {cols} FROM tmp_{table}')
+    op.execute(f'DROP TABLE tmp_{table}')
+
+
+def upgrade():
+    for table, columns, reverse_index in ASSOCIATION_TABLES:
+        _dedupe(table, columns)
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, existing_type=sa.Integer(), nullable=False)
+            batch_op.create_primary_key(f'pk_{table}', columns)
+        op.create_index(reverse_index, table, list(reversed(columns)), unique=False)
+
+    op.create_index('ix_group_user_association_user_id', 'group_user_association', ['user_id', 'group_id'], unique=False)
+    op.create_index('ix_group_onboardingcode_association_onboardingcode_id', 'group_onboardingcode_association',
+                    ['onboardingcode_id', 'group_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_group_onboardingcode_association_onboardingcode_id', table_name='group_onboardingcode_association')
+    op.drop_index('ix_group_user_association_user_id', table_name='group_user_association')
+
+    for table, columns, reverse_index in reversed(ASSOCIATION_TABLES):
+        op.drop_index(reverse_index, table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f'pk_{table}', type_='primary')
+            for column in columns:
+                batch_op.alter_column(column, existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,38 @@
+"""add qr_token_cache table
+
+Revision ID: cab33216ca47
+Revises: 4b754g491aa1
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cab33216ca47'
+down_revision = '4b754g491aa1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('qr_token_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('cache_key', sa.String(), nullable=False),
+        sa.Column('qr_string', sa.String(), nullable=True),
+        sa.Column('max_uses', sa.Integer(), nullable=True),
+        sa.Column('total_uses', sa.Integer(), nullable=True),
+        sa.Column('fingerprint', sa.String(), nullable=True),
+        sa.Column('cached_at', sa.Float(), nullable=True),
+        sa.Column('expires_at', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('lease_until', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('cache_key')
+    )
+    op.create_index('ix_qr_token_cache_expires_at', 'qr_token_cache', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_qr_token_cache_expires_at', table_name='qr_token_cache')
+    op.drop_table('qr_token_cache')
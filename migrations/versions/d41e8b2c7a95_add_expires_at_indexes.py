@@ -0,0 +1,27 @@
+"""add expires_at indexes for expiry cleanup
+
+Revision ID: d41e8b2c7a95
+Revises: a7c3e9f21b64
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41e8b2c7a95'
+down_revision = 'a7c3e9f21b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_one_time_tokens_expires_at', 'one_time_tokens', ['expires_at'], unique=False)
+    op.create_index('ix_kiosk_sessions_expires_at', 'kiosk_sessions', ['expires_at'], unique=False)
+    op.create_index('ix_pending_registrations_expires_at', 'pending_registrations', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_pending_registrations_expires_at', table_name='pending_registrations')
+    op.drop_index('ix_kiosk_sessions_expires_at', table_name='kiosk_sessions')
+    op.drop_index('ix_one_time_tokens_expires_at', table_name='one_time_tokens')
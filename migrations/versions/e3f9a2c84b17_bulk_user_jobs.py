@@ -0,0 +1,42 @@
+"""add bulk_user_jobs table
+
+Revision ID: e3f9a2c84b17
+Revises: c5d1a7e39f42
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3f9a2c84b17'
+down_revision = 'c5d1a7e39f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bulk_user_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=32), nullable=False),
+    sa.Column('params', sa.Text(), nullable=False),
+    sa.Column('user_ids', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('succeeded', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('errors', sa.Text(), nullable=False),
+    sa.Column('created_by', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_bulk_user_jobs_created_at', 'bulk_user_jobs', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_bulk_user_jobs_created_at', table_name='bulk_user_jobs')
+    op.drop_table('bulk_user_jobs')
@@ -0,0 +1,31 @@
+"""make announcements and api_keys created_by nullable
+
+Revision ID: e6b1f4c83d27
+Revises: a4c8e2d95b61
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b1f4c83d27'
+down_revision = 'a4c8e2d95b61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Removing a user keeps the announcements and API keys they created
+    with op.batch_alter_table('announcements') as batch_op:
+        batch_op.alter_column('created_by', existing_type=sa.Integer(), nullable=True)
+    with op.batch_alter_table('api_keys') as batch_op:
+        batch_op.alter_column('created_by', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('api_keys') as batch_op:
+        batch_op.alter_column('created_by', existing_type=sa.Integer(), nullable=False)
+    with op.batch_alter_table('announcements') as batch_op:
+        batch_op.alter_column('created_by', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,47 @@
+"""add user_import_rows table
+
+Revision ID: f7b2d6e18a93
+Revises: e3f9a2c84b17
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7b2d6e18a93'
+down_revision = 'e3f9a2c84b17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_import_rows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('row_number', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('first_name', sa.String(), nullable=True),
+    sa.Column('last_name', sa.String(), nullable=True),
+    sa.Column('callsign', sa.String(), nullable=True),
+    sa.Column('password', sa.String(), nullable=True),
+    sa.Column('has_password', sa.Boolean(), nullable=False),
+    sa.Column('role_ids', sa.Text(), nullable=False),
+    sa.Column('groups', sa.Text(), nullable=False),
+    sa.Column('expiry_date', sa.DateTime(), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['bulk_user_jobs.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_user_import_rows_job_status', 'user_import_rows', ['job_id', 'status', 'row_number'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_import_rows_job_status', table_name='user_import_rows')
+    op.drop_table('user_import_rows')
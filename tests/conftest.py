@@ -11,6 +11,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app import create_app
 from app.models import db as _db
 
+# max_queries fixture and marker for SQL query budgets
+pytest_plugins = ['tests.query_budget']
+
 
 @pytest.fixture(scope='session')
 def app():
@@ -214,3 +217,77 @@ def sample_role(db):
         else:
             db.session.commit()
     return role
+
+
+BUDGET_DATASET_SIZE = 12
+
+
+@pytest.fixture
+def budget_dataset(db, auth_headers):
+    """
+    Several users with roles and group memberships, pending approvals,
+    announcements and TAK profiles, for query budgets that catch N+1 loops.
+    Registrations wait for the administrator role, so testuser can approve them.
+    """
+    import datetime
+    from app.models import (
+        AnnouncementModel, AnnouncementReadModel, GroupUserAssociation, OnboardingCodeModel, OTSGroupModel,
+        PendingRegistrationModel, TakProfileModel, UserModel, UserRoleModel
+    )
+
+    if UserModel.query.filter_by(username='budgetuser0').first():
+        return BUDGET_DATASET_SIZE
+
+    admin_role = UserRoleModel.query.filter_by(name='administrator').first()
+    creator = UserModel.query.filter_by(username='testuser').first()
+    roles = []
+    for i in range(3):
+        role = UserRoleModel(name=f'budgetrole{i}')
+        db.session.add(role)
+        roles.append(role)
+    groups = []
+    for i in range(2):
+        group = OTSGroupModel(name=f'budgetgroup{i}', active=True)
+        db.session.add(group)
+        groups.append(group)
+    db.session.commit()
+
+    users = []
+    for i in range(BUDGET_DATASET_SIZE):
+        user = UserModel(username=f'budgetuser{i}', email=f'budgetuser{i}@example.com', callsign=f'BUDGET{i}')
+        db.session.add(user)
+        db.session.commit()
+        user.roles.extend([roles[i % 3], roles[(i + 1) % 3]])
+        for group in groups:
+            db.session.add(GroupUserAssociation(user_id=user.id, group_id=group.id, direction='BOTH'))
+        users.append(user)
+    db.session.commit()
+
+    code = OnboardingCodeModel(name='budgetcode', onboardingCode='BUDGETCODE', requireApproval=True,
+                               approverRoleId=admin_role.id)
+    db.session.add(code)
+    db.session.commit()
+    for i in range(BUDGET_DATASET_SIZE):
+        db.session.add(PendingRegistrationModel(
+            username=f'budgetpending{i}', email=f'budgetpending{i}@example.com', password='unused',
+            onboarding_code_id=code.id, verification_token=f'budget-verification-{i}',
+            expires_at=datetime.datetime.now() + datetime.timedelta(days=1), approval_status='pending_approval'
+        ))
+
+    for i in range(BUDGET_DATASET_SIZE):
+        announcement = AnnouncementModel(title=f'Budget {i}', content='Content', target_type=('all', 'roles', 'users')[i % 3],
+                                         created_by=creator.id)
+        db.session.add(announcement)
+        db.session.commit()
+        announcement.target_roles.extend(roles[:2])
+        announcement.target_users.extend(users[:2])
+        db.session.add(AnnouncementReadModel(announcement_id=announcement.id, user_id=users[0].id))
+
+    for i in range(BUDGET_DATASET_SIZE):
+        profile = TakProfileModel(name=f'budgetprofile{i}', description='Budget profile', isPublic=False)
+        db.session.add(profile)
+        db.session.commit()
+        profile.roles.append(roles[i % 3])
+        profile.users.append(users[i])
+    db.session.commit()
+    return BUDGET_DATASET_SIZE
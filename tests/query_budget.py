@@ -0,0 +1,54 @@
+"""
+Pytest plugin for SQL query budgets
+
+Fails a test when the code under test issues more queries than allowed,
+printing the statements grouped by shape so N+1 loops are easy to spot.
+
+Usage:
+    def test_get_roles(self, client, auth_headers, max_queries):
+        with max_queries(5):
+            client.get('/api/v1/roles', headers=auth_headers)
+
+or for the whole test body:
+    @pytest.mark.max_queries(5)
+    def test_get_roles(self, client, auth_headers):
+        ...
+
+Enabled from tests/conftest.py through pytest_plugins.
+"""
+from contextlib import contextmanager
+
+import pytest
+
+from app.query_profiler import profile_queries
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'max_queries(n): fail the test if it issues more than n SQL queries'
+    )
+
+
+@pytest.fixture
+def max_queries():
+    """Context manager factory asserting the block issues at most n queries"""
+    @contextmanager
+    def budget(n):
+        with profile_queries() as profile:
+            yield profile
+        assert profile.count <= n, f"Query budget of {n} exceeded:\n{profile.report()}"
+    return budget
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker('max_queries')
+    if marker is None:
+        yield
+        return
+
+    limit = marker.args[0]
+    with profile_queries() as profile:
+        outcome = yield
+    if outcome.excinfo is None and profile.count > limit:
+        outcome.force_exception(AssertionError(f"Query budget of {limit} exceeded:\n{profile.report()}"))
@@ -0,0 +1,40 @@
+"""
+Query budgets of list endpoints, measured against budget_dataset so that
+per-row queries show up as exceeded budgets
+"""
+
+
+class TestListQueryBudgets:
+    """Test list endpoints issue a constant number of queries"""
+
+    def test_approvals_query_budget(self, client, auth_headers, budget_dataset, max_queries):
+        """Test the approvals list stays within its query budget"""
+        with max_queries(5):
+            response = client.get('/api/v1/approvals', headers=auth_headers)
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['is_approver'] is True
+        assert len([p for p in data['pending_approvals'] if p['username'].startswith('budgetpending')]) == budget_dataset
+
+    def test_announcements_query_budget(self, client, auth_headers, budget_dataset, max_queries):
+        """Test the admin announcements list stays within its query budget"""
+        with max_queries(11):
+            response = client.get('/api/v1/admin/announcements', headers=auth_headers)
+
+        assert response.status_code == 200
+        announcements = {a['title']: a for a in response.get_json()['announcements']}
+        assert announcements['Budget 0']['readCount'] == 1
+        # 'roles': budgetrole0 and budgetrole1 together cover every budget user
+        assert announcements['Budget 1']['totalTargeted'] == budget_dataset
+        assert announcements['Budget 2']['totalTargeted'] == 2
+        assert announcements['Budget 2']['createdBy']['username'] == 'testuser'
+
+    def test_tak_profiles_query_budget(self, client, auth_headers, budget_dataset, max_queries):
+        """Test the TAK profile list stays within its query budget"""
+        with max_queries(3):
+            response = client.get('/api/v1/tak-profiles', headers=auth_headers)
+
+        assert response.status_code == 200
+        names = [p['name'] for p in response.get_json()['profiles']]
+        assert len([n for n in names if n.startswith('budgetprofile')]) == budget_dataset
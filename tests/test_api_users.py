@@ -17,6 +17,17 @@ class TestUsersEndpoints:
         assert 'total' in data
         assert isinstance(data['users'], list)
 
+    def test_get_users_query_budget(self, client, auth_headers, budget_dataset, max_queries):
+        """Test users list with roles and groups stays within its query budget"""
+        with max_queries(8):
+            response = client.get('/api/v1/users', headers=auth_headers)
+
+        assert response.status_code == 200
+        users = {u['username']: u for u in response.get_json()['users']}
+        assert len([name for name in users if name.startswith('budgetuser')]) == budget_dataset
+        assert len(users['budgetuser0']['roles']) == 2
+        assert len(users['budgetuser0']['groups']) == 2
+
     def test_get_users_no_auth(self, client):
         """Test getting users without authentication"""
         response = client.get('/api/v1/users')
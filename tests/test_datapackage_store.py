@@ -0,0 +1,166 @@
+"""
+Tests for the data package blob store
+"""
+import hashlib
+import json
+import os
+import time
+import zipfile
+
+import pytest
+
+from app.services.datapackage_store import ARCHIVES_DIR, BLOBS_DIR, DatapackageStoreService
+
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def store(app, tmp_path, monkeypatch):
+    """Empty upload folder"""
+    monkeypatch.setitem(app.config, 'DATAPACKAGE_UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def write_blob(root, data, age=0):
+    digest = sha(data)
+    path = root / BLOBS_DIR / digest[:2] / digest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if age:
+        then = time.time() - age
+        os.utime(path, (then, then))
+    return path
+
+
+def write_archive(root, name, age):
+    path = root / ARCHIVES_DIR / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'zip')
+    then = time.time() - age
+    os.utime(path, (then, then))
+    return path
+
+
+@pytest.fixture
+def referencing_profile(db):
+    """TAK profile whose manifest references the blob of b'referenced'"""
+    from app.models import TakProfileModel
+
+    profile = TakProfileModel.query.filter_by(name='gcprofile').first()
+    if not profile:
+        profile = TakProfileModel(name='gcprofile', description='Garbage collection profile', isPublic=False)
+        db.session.add(profile)
+    profile.contentHash = 'gc-content-hash'
+    profile.takPrefFileLocation = 'prefs/gc.pref'
+    profile.contentManifest = json.dumps({'files': {
+        'prefs/gc.pref': {'size': 10, 'mtime': None, 'sha256': sha(b'referenced')},
+    }, 'dirs': ['prefs']})
+    db.session.commit()
+    return profile
+
+
+class TestCollectGarbage:
+    """Test DatapackageStoreService.collect_garbage"""
+
+    def test_blobs(self, app, db, store, referencing_profile):
+        """Test only old blobs that nothing references or links are removed"""
+        referenced = write_blob(store, b'referenced', age=7200)
+        orphan = write_blob(store, b'orphan', age=7200)
+        young = write_blob(store, b'young')
+        linked = write_blob(store, b'linked', age=7200)
+        os.link(linked, store / 'profile-file')
+
+        removed = DatapackageStoreService.collect_garbage(grace_seconds=3600)
+
+        assert removed['blobs'] == 1
+        assert not orphan.exists()
+        assert referenced.exists() and young.exists() and linked.exists()
+
+    def test_archives(self, app, db, store, referencing_profile):
+        """Test old archives of package versions no profile uses are removed"""
+        full = DatapackageStoreService.archive_key('gc-content-hash')
+        personal = DatapackageStoreService.archive_key('gc-content-hash', 'prefs/gc.pref')
+        kept = [write_archive(store, f'{full}.zip', 7200), write_archive(store, f'{personal}.zip', 7200),
+                write_archive(store, 'building.tmp', 60)]
+        stale = [write_archive(store, f'{"0" * 32}.zip', 7200), write_archive(store, 'interrupted.tmp', 7200)]
+
+        removed = DatapackageStoreService.collect_garbage(grace_seconds=3600)
+
+        assert removed == {'blobs': 0, 'archives': 2, 'bytes': 6}
+        assert all(path.exists() for path in kept)
+        assert not any(path.exists() for path in stale)
+
+    def test_reports_freed_bytes(self, app, db, store):
+        """Test the removed blob sizes are added up"""
+        write_blob(store, b'a' * 100, age=7200)
+        write_blob(store, b'b' * 50, age=7200)
+
+        assert DatapackageStoreService.collect_garbage(grace_seconds=3600) == {'blobs': 2, 'archives': 0, 'bytes': 150}
+
+
+@pytest.fixture
+def packaged_profile(db, store):
+    """TAK profile with an extracted folder and a matching manifest"""
+    from app.models import TakProfileModel
+
+    folder = store / 'archived'
+    (folder / 'prefs').mkdir(parents=True)
+    (folder / 'prefs' / 'a.pref').write_bytes(b'original')
+    (folder / 'map.kml').write_bytes(b'<kml/>')
+
+    profile = TakProfileModel.query.filter_by(name='archiveprofile').first()
+    if not profile:
+        profile = TakProfileModel(name='archiveprofile', description='Archive profile', isPublic=False)
+        db.session.add(profile)
+    profile.takTemplateFolderLocation = 'archived'
+    db.session.commit()
+    DatapackageStoreService.refresh_manifest(profile)
+    return profile, folder
+
+
+def archive_contents(path):
+    with zipfile.ZipFile(path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+class TestBaseArchive:
+    """Test DatapackageStoreService.base_archive"""
+
+    def test_reused_while_folder_unchanged(self, app, db, packaged_profile):
+        """Test the cached archive is served again when nothing changed on disk"""
+        profile, folder = packaged_profile
+
+        first = DatapackageStoreService.base_archive(profile)
+        second = DatapackageStoreService.base_archive(profile)
+
+        assert first == second
+        assert archive_contents(first) == {'map.kml': b'<kml/>', 'prefs/a.pref': b'original'}
+
+    def test_file_edited_after_archive_was_built(self, app, db, packaged_profile):
+        """Test an in-place edit on disk refreshes the manifest and the archive"""
+        profile, folder = packaged_profile
+        first = DatapackageStoreService.base_archive(profile)
+        old_hash = profile.contentHash
+
+        edited = folder / 'prefs' / 'a.pref'
+        edited.write_bytes(b'replaced')
+        later = os.path.getmtime(first) + 10
+        os.utime(edited, (later, later))
+
+        path = DatapackageStoreService.base_archive(profile)
+
+        assert profile.contentHash != old_hash
+        assert path != first
+        assert archive_contents(path)['prefs/a.pref'] == b'replaced'
+
+    def test_folder_differs_from_manifest(self, app, db, packaged_profile):
+        """Test files added on disk before the first download are included"""
+        profile, folder = packaged_profile
+        (folder / 'extra.txt').write_bytes(b'new')
+
+        path = DatapackageStoreService.base_archive(profile, exclude='prefs/a.pref')
+
+        assert archive_contents(path) == {'extra.txt': b'new', 'map.kml': b'<kml/>'}
+        assert 'extra.txt' in profile.get_content_manifest()['files']
@@ -0,0 +1,101 @@
+"""
+Tests for data package extraction
+"""
+import hashlib
+import io
+import stat
+import zipfile
+
+import pytest
+
+from app.services.datapackage_upload import ExtractionLimits, PackageError, extract_package
+
+
+def make_zip(entries, compression=zipfile.ZIP_DEFLATED):
+    """ZIP archive of (name, data) pairs; a ZipInfo may stand in for the name"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+class TestExtractPackage:
+    """Test extract_package"""
+
+    def test_extracts_files_and_manifest(self, tmp_path):
+        """Test files are written and described by the manifest"""
+        archive = make_zip([('MANIFEST/manifest.xml', b'<x/>'), ('prefs/a.pref', b'pref'), ('maps/', b'')])
+
+        files, dirs = extract_package(archive, str(tmp_path))
+
+        assert sorted(files) == ['MANIFEST/manifest.xml', 'prefs/a.pref']
+        assert files['prefs/a.pref']['size'] == 4
+        assert files['prefs/a.pref']['sha256'] == hashlib.sha256(b'pref').hexdigest()
+        assert dirs == ['maps']
+        assert (tmp_path / 'prefs' / 'a.pref').read_bytes() == b'pref'
+        assert (tmp_path / 'maps').is_dir()
+
+    @pytest.mark.parametrize('name', ['../evil.txt', 'prefs/../../evil.txt', '/etc/evil', 'C:/evil.txt'])
+    def test_rejects_unsafe_paths(self, tmp_path, name):
+        """Test entries escaping the destination are rejected"""
+        archive = make_zip([('ok.txt', b'ok'), (name, b'evil')])
+
+        with pytest.raises(PackageError, match='Unsafe path'):
+            extract_package(archive, str(tmp_path / 'dest'))
+        assert not (tmp_path / 'evil.txt').exists()
+
+    def test_rejects_symlinks(self, tmp_path):
+        """Test symbolic link entries are rejected"""
+        link = zipfile.ZipInfo('link')
+        link.external_attr = (stat.S_IFLNK | 0o777) << 16
+        archive = make_zip([(link, '/etc/passwd')])
+
+        with pytest.raises(PackageError, match='Symbolic links'):
+            extract_package(archive, str(tmp_path))
+
+    def test_rejects_duplicate_entries(self, tmp_path):
+        """Test a second entry cannot overwrite an earlier file"""
+        with pytest.warns(UserWarning):
+            archive = make_zip([('a.txt', b'first'), ('a.txt', b'second')])
+
+        with pytest.raises(PackageError, match='duplicate'):
+            extract_package(archive, str(tmp_path))
+        assert (tmp_path / 'a.txt').read_bytes() == b'first'
+
+    def test_entry_limit(self, tmp_path):
+        """Test archives with too many entries are rejected before extracting"""
+        archive = make_zip([(f'{i}.txt', b'x') for i in range(3)])
+
+        with pytest.raises(PackageError, match='3 entries'):
+            extract_package(archive, str(tmp_path), ExtractionLimits(max_entries=2))
+        assert not list(tmp_path.iterdir())
+
+    def test_file_size_limit(self, tmp_path):
+        """Test a single file over the per-file limit is rejected"""
+        archive = make_zip([('small.txt', b'x' * 10), ('big.txt', b'x' * 101)])
+
+        with pytest.raises(PackageError, match='big.txt is larger than 100 bytes'):
+            extract_package(archive, str(tmp_path), ExtractionLimits(max_file_bytes=100))
+
+    def test_total_size_limit(self, tmp_path):
+        """Test the files together may not exceed the extracted size limit"""
+        archive = make_zip([(f'{i}.txt', b'x' * 60) for i in range(3)])
+
+        with pytest.raises(PackageError, match='more than 150 bytes'):
+            extract_package(archive, str(tmp_path), ExtractionLimits(max_extracted_bytes=150))
+
+    def test_compression_ratio_limit(self, tmp_path):
+        """Test highly compressed files (zip bombs) are stopped while extracting"""
+        archive = make_zip([('bomb.bin', b'\0' * (4 * 1024 * 1024))])
+
+        with pytest.raises(PackageError, match='compression ratio of 10'):
+            extract_package(archive, str(tmp_path), ExtractionLimits(max_ratio=10))
+
+    def test_rejects_invalid_and_empty_archives(self, tmp_path):
+        """Test non-ZIP data and archives without files are rejected"""
+        with pytest.raises(PackageError, match='Invalid ZIP'):
+            extract_package(io.BytesIO(b'not a zip'), str(tmp_path))
+        with pytest.raises(PackageError, match='no files'):
+            extract_package(make_zip([('empty/', b'')]), str(tmp_path))
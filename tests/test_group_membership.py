@@ -0,0 +1,161 @@
+"""
+Tests for OTS group membership reconciliation
+"""
+import pytest
+
+from app.services.group_membership import GroupMembershipService, MembershipOperation
+
+
+class FakeOTS:
+    """Records group membership calls and fails those for failing groups"""
+
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def call(self, action):
+        def record(username, group_name, direction=None):
+            self.calls.append((action, username, group_name, direction))
+            if group_name in self.failing:
+                raise RuntimeError('OTS unavailable')
+        return record
+
+
+@pytest.fixture
+def ots(app, monkeypatch):
+    from app.ots import otsClient
+
+    fake = FakeOTS()
+    monkeypatch.setattr(otsClient, 'add_user_to_group', fake.call('add'))
+    monkeypatch.setattr(otsClient, 'remove_user_from_group', fake.call('remove'))
+    monkeypatch.setitem(app.config, 'GROUP_MEMBERSHIP_OTS_CONCURRENCY', 1)
+    return fake
+
+
+@pytest.fixture
+def member(db):
+    """User in groupa (IN) and groupb (BOTH), with groupc available"""
+    from app.models import GroupUserAssociation, OTSGroupModel, UserModel
+
+    groups = {}
+    for name in ('groupa', 'groupb', 'groupc'):
+        group = OTSGroupModel.query.filter_by(name=name).first()
+        if not group:
+            group = OTSGroupModel(name=name, active=True)
+            db.session.add(group)
+            db.session.commit()
+        groups[name] = group
+
+    user = UserModel.query.filter_by(username='groupmember').first()
+    if not user:
+        user = UserModel(username='groupmember', email='groupmember@example.com', callsign='MEMBER')
+        db.session.add(user)
+        db.session.commit()
+    GroupUserAssociation.query.filter_by(user_id=user.id).delete()
+    db.session.add(GroupUserAssociation(group_id=groups['groupa'].id, user_id=user.id, direction='IN'))
+    db.session.add(GroupUserAssociation(group_id=groups['groupb'].id, user_id=user.id, direction='BOTH'))
+    db.session.commit()
+    return user, groups
+
+
+def directions(user):
+    from app.models import GroupUserAssociation
+
+    return {assoc.group.name: assoc.direction
+            for assoc in GroupUserAssociation.query.filter_by(user_id=user.id).all()}
+
+
+class TestReconcile:
+    """Test GroupMembershipService.reconcile"""
+
+    def test_applies_only_the_differences(self, app, db, ots, member):
+        """Test additions, direction changes and removals become the minimal OTS operations"""
+        user, groups = member
+
+        changes = GroupMembershipService.reconcile(
+            'groupmember', {groups['groupa'].id: 'BOTH', groups['groupc'].id: 'OUT'}, user=user
+        )
+
+        assert changes.added == [groups['groupc'].id]
+        assert changes.updated == [groups['groupa'].id]
+        assert changes.removed == [groups['groupb'].id]
+        assert sorted(changes.operations, key=repr) == sorted([
+            MembershipOperation('add', 'groupa', 'OUT'),
+            MembershipOperation('remove', 'groupb', 'IN'),
+            MembershipOperation('remove', 'groupb', 'OUT'),
+            MembershipOperation('add', 'groupc', 'OUT'),
+        ], key=repr)
+        assert sorted(ots.calls) == sorted([
+            ('add', 'groupmember', 'groupa', 'OUT'),
+            ('remove', 'groupmember', 'groupb', 'IN'),
+            ('remove', 'groupmember', 'groupb', 'OUT'),
+            ('add', 'groupmember', 'groupc', 'OUT'),
+        ])
+        assert changes.errors == []
+        db.session.flush()
+        assert directions(user) == {'groupa': 'BOTH', 'groupc': 'OUT'}
+
+    def test_unchanged_memberships_make_no_calls(self, app, db, ots, member):
+        """Test reconciling to the current state does nothing"""
+        user, groups = member
+
+        changes = GroupMembershipService.reconcile(
+            'groupmember', {groups['groupa'].id: 'IN', groups['groupb'].id: 'BOTH'}, user=user
+        )
+
+        assert (changes.added, changes.updated, changes.removed, changes.operations) == ([], [], [], [])
+        assert ots.calls == []
+
+    def test_keep_missing_groups(self, app, db, ots, member):
+        """Test remove_missing=False leaves groups not in desired alone"""
+        user, groups = member
+
+        changes = GroupMembershipService.reconcile(
+            'groupmember', {groups['groupa'].id: 'OUT'}, user=user, remove_missing=False
+        )
+
+        assert changes.updated == [groups['groupa'].id]
+        assert changes.removed == []
+        assert sorted(ots.calls) == [('add', 'groupmember', 'groupa', 'OUT'),
+                                     ('remove', 'groupmember', 'groupa', 'IN')]
+        db.session.flush()
+        assert directions(user) == {'groupa': 'OUT', 'groupb': 'BOTH'}
+
+    def test_unknown_groups_are_ignored(self, app, db, ots, member):
+        """Test group ids that do not exist neither change anything nor call OTS"""
+        user, groups = member
+
+        changes = GroupMembershipService.reconcile('groupmember', {999999: 'IN'}, user=user, remove_missing=False)
+
+        assert (changes.added, changes.operations) == ([], [])
+        assert ots.calls == []
+
+    def test_invalid_direction(self, app, db, ots, member):
+        """Test an invalid direction is rejected before anything changes"""
+        user, groups = member
+
+        with pytest.raises(ValueError):
+            GroupMembershipService.reconcile('groupmember', {groups['groupc'].id: 'SIDEWAYS'}, user=user)
+        assert ots.calls == []
+
+    def test_without_local_user(self, app, db, ots, member):
+        """Test without a local user only OTS is changed"""
+        user, groups = member
+
+        changes = GroupMembershipService.reconcile('otsonly', {groups['groupc'].id: 'BOTH'})
+
+        assert changes.added == [groups['groupc'].id]
+        assert sorted(ots.calls) == [('add', 'otsonly', 'groupc', 'IN'), ('add', 'otsonly', 'groupc', 'OUT')]
+        assert directions(user) == {'groupa': 'IN', 'groupb': 'BOTH'}
+
+    def test_ots_failures_are_returned(self, app, db, ots, member):
+        """Test failed OTS calls are reported in errors instead of raised"""
+        user, groups = member
+        ots.failing.add('groupc')
+
+        changes = GroupMembershipService.reconcile(
+            'groupmember', {groups['groupa'].id: 'IN', groups['groupc'].id: 'IN'}, user=user, remove_missing=False
+        )
+
+        assert [op for op, _ in changes.failed('add')] == [MembershipOperation('add', 'groupc', 'IN')]
+        assert isinstance(changes.errors[0][1], RuntimeError)
@@ -0,0 +1,31 @@
+"""
+Tests for notification helpers
+"""
+
+
+class TestFrontendUrl:
+    """Test get_frontend_url_safe"""
+
+    def test_configured_url_outside_request(self, app):
+        """Test the configured FRONTEND_URL is returned without a request context"""
+        from app.notifications import get_frontend_url_safe
+
+        original = app.config.get('FRONTEND_URL')
+        app.config['FRONTEND_URL'] = 'https://portal.example.com/'
+        try:
+            assert get_frontend_url_safe() == 'https://portal.example.com'
+        finally:
+            app.config['FRONTEND_URL'] = original
+
+    def test_localhost_url_detected_from_request(self, app):
+        """Test a localhost FRONTEND_URL is replaced by the request's forwarded host"""
+        from app.notifications import get_frontend_url_safe
+
+        original = app.config.get('FRONTEND_URL')
+        app.config['FRONTEND_URL'] = 'http://localhost:5000'
+        try:
+            with app.test_request_context(headers={'X-Forwarded-Proto': 'https',
+                                                   'X-Forwarded-Host': 'tak.example.com'}):
+                assert get_frontend_url_safe() == 'https://tak.example.com'
+        finally:
+            app.config['FRONTEND_URL'] = original
@@ -0,0 +1,50 @@
+"""
+Tests for the OIDC metadata cache
+"""
+import pytest
+import requests
+
+from app.services.oidc_metadata import OIDCMetadataCache
+
+DISCOVERY_URL = 'https://idp.example.com/.well-known/openid-configuration'
+
+
+class FakeResponse:
+    headers = {'Cache-Control': 'max-age=0'}
+
+    def __init__(self, doc):
+        self.doc = doc
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.doc
+
+
+@pytest.fixture
+def cache(app, monkeypatch):
+    """Cache holding an expired discovery document for an unreachable provider"""
+    import app.services.oidc_metadata as oidc_metadata
+
+    cache = OIDCMetadataCache()
+    monkeypatch.setattr(oidc_metadata.http_requests, 'get', lambda url, timeout: FakeResponse({'issuer': 'x'}))
+    monkeypatch.setitem(app.config, 'OIDC_CACHE_MIN_SECONDS', 0)
+    assert cache.get_discovery(DISCOVERY_URL) == {'issuer': 'x'}
+
+    def unreachable(url, timeout):
+        raise requests.ConnectionError('unreachable')
+    monkeypatch.setattr(oidc_metadata.http_requests, 'get', unreachable)
+    return cache
+
+
+class TestGetDiscovery:
+    """Test OIDCMetadataCache.get_discovery"""
+
+    def test_cached_copy_served_when_refresh_fails(self, app, cache):
+        """Test logins keep working from the cached copy while the provider is down"""
+        assert cache.get_discovery(DISCOVERY_URL, force=True) == {'issuer': 'x'}
+
+    def test_strict_fetch_fails_despite_cached_copy(self, app, cache):
+        """Test validating a provider URL does not pass on a cached copy"""
+        assert cache.get_discovery(DISCOVERY_URL, strict=True) is None
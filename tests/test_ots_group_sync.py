@@ -0,0 +1,65 @@
+"""
+Tests for the OTS group sync
+"""
+import pytest
+
+from app.services.ots_group_sync import OTSGroupSyncService
+
+
+@pytest.fixture
+def local_group(db):
+    """Active local group that OTS no longer lists"""
+    from app.models import OTSGroupModel
+
+    group = OTSGroupModel.query.filter_by(name='syncedgroup').first()
+    if not group:
+        group = OTSGroupModel(name='syncedgroup', active=True)
+        db.session.add(group)
+    group.active = True
+    db.session.commit()
+    return group
+
+
+def serve_groups(monkeypatch, response):
+    from app.ots import otsClient
+
+    monkeypatch.setattr(otsClient, 'get_groups', lambda **kwargs: response)
+
+
+class TestSync:
+    """Test OTSGroupSyncService.sync"""
+
+    @pytest.mark.parametrize('response', [
+        {'response': {'message': 'Internal Server Error'}, 'status_code': 500},
+        {'response': {}, 'status_code': 503},
+        {'response': {}, 'status_code': 200},
+        {'response': {'message': 'unexpected'}, 'status_code': 200},
+    ])
+    def test_failed_listing_deactivates_nothing(self, app, db, monkeypatch, local_group, response):
+        """Test error statuses and unrecognised payloads abort the sync"""
+        serve_groups(monkeypatch, response)
+
+        with pytest.raises(ConnectionError):
+            OTSGroupSyncService.sync()
+        db.session.refresh(local_group)
+        assert local_group.active is True
+
+    def test_explicit_empty_listing_deactivates(self, app, db, monkeypatch, local_group):
+        """Test an explicit empty result list is a complete listing"""
+        serve_groups(monkeypatch, {'response': {'results': [], 'total_pages': 1}, 'status_code': 200})
+
+        stats = OTSGroupSyncService.sync()
+
+        assert stats['complete'] is True
+        db.session.refresh(local_group)
+        assert local_group.active is False
+
+    def test_listed_group_is_kept(self, app, db, monkeypatch, local_group):
+        """Test groups OTS lists stay active"""
+        serve_groups(monkeypatch, {'response': {'results': [{'name': 'syncedgroup'}]}, 'status_code': 200})
+
+        stats = OTSGroupSyncService.sync()
+
+        assert stats['deactivated'] == 0
+        db.session.refresh(local_group)
+        assert local_group.active is True
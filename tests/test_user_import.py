@@ -0,0 +1,134 @@
+"""
+Tests for bulk user import validation
+"""
+import pytest
+
+from app.services.user_import import UserImportService
+
+
+@pytest.fixture
+def import_group(db):
+    """OTS group referenced by import rows"""
+    from app.models import OTSGroupModel
+
+    group = OTSGroupModel.query.filter_by(name='importgroup').first()
+    if not group:
+        group = OTSGroupModel(name='importgroup', active=True)
+        db.session.add(group)
+        db.session.commit()
+    return group
+
+
+def columns(username, **overrides):
+    """Import row columns, keyed like iter_rows keys them"""
+    values = {
+        'username': username,
+        'email': f'{username}@example.com',
+        'firstname': 'Import',
+        'lastname': 'User',
+        'callsign': username.upper(),
+    }
+    values.update(overrides)
+    return values
+
+
+class TestValidate:
+    """Test UserImportService.validate"""
+
+    def test_valid_row(self, app, db, sample_role, import_group):
+        """Test a valid row is normalized and its roles and groups resolved"""
+        valid, errors = UserImportService.validate([
+            (2, columns('ImportOne', roles='TEST_ROLE', groups='importgroup:in', expirydate='2030-01-01')),
+        ])
+
+        assert errors == []
+        assert len(valid) == 1
+        row = valid[0]
+        assert row['username'] == 'importone'
+        assert row['row_number'] == 2
+        assert row['role_ids'] == [sample_role.id]
+        assert row['groups'] == {import_group.id: 'IN'}
+        assert row['expiry_date'].year == 2030
+        assert row['password'] is None
+        assert row['has_password'] is False
+
+    def test_group_direction_defaults_to_both(self, app, db, import_group):
+        """Test a group without a direction is joined in both directions"""
+        valid, errors = UserImportService.validate([(2, columns('importboth', groups='importgroup'))])
+
+        assert errors == []
+        assert valid[0]['groups'] == {import_group.id: 'BOTH'}
+
+    def test_field_errors(self, app, db, import_group):
+        """Test missing, malformed and unknown values are reported per row"""
+        valid, errors = UserImportService.validate([
+            (2, columns('importmissing', callsign='')),
+            (3, columns('import_user')),
+            (4, columns('importbademail', email='not-an-email')),
+            (5, columns('importbadrole', roles='nosuchrole')),
+            (6, columns('importbadgroup', groups='nosuchgroup;importgroup:sideways')),
+            (7, columns('importshort', password='short')),
+            (8, columns('importdate', expirydate='someday')),
+        ])
+
+        assert valid == []
+        by_row = {e['row']: e['errors'] for e in errors}
+        assert by_row[2] == ['callsign is required']
+        assert 'letters and numbers' in by_row[3][0]
+        assert by_row[4] == ['Invalid email format']
+        assert by_row[5] == ["Unknown role 'nosuchrole'"]
+        assert by_row[6] == ["Unknown group 'nosuchgroup'",
+                             "Direction of group 'importgroup' must be IN, OUT, or BOTH"]
+        assert by_row[7] == ['Password must be at least 8 characters']
+        assert by_row[8] == ['expiryDate must be an ISO 8601 date']
+
+    def test_password_is_kept(self, app, db):
+        """Test a supplied password is passed through for provisioning"""
+        valid, errors = UserImportService.validate([(2, columns('importpassword', password='longenough'))])
+
+        assert errors == []
+        assert valid[0]['password'] == 'longenough'
+        assert valid[0]['has_password'] is True
+
+    def test_duplicates_in_file(self, app, db):
+        """Test repeated usernames and emails in the file are rejected after the first"""
+        valid, errors = UserImportService.validate([
+            (2, columns('importdup')),
+            (3, columns('IMPORTDUP', email='other@example.com')),
+            (4, columns('importdup2', email='importdup@example.com')),
+        ])
+
+        assert [row['row_number'] for row in valid] == [2]
+        assert errors == [
+            {'row': 3, 'errors': ["Duplicate username 'importdup' in file"]},
+            {'row': 4, 'errors': ["Duplicate email 'importdup@example.com' in file"]},
+        ]
+
+    def test_existing_accounts(self, app, db):
+        """Test usernames and emails already in use are rejected"""
+        from app.models import UserModel
+
+        if not UserModel.query.filter_by(username='importexisting').first():
+            db.session.add(UserModel(username='importexisting', email='importexisting@example.com',
+                                     callsign='EXISTING'))
+            db.session.commit()
+
+        valid, errors = UserImportService.validate([
+            (2, columns('ImportExisting', email='new@example.com')),
+            (3, columns('importnew', email='ImportExisting@Example.com')),
+        ])
+
+        assert valid == []
+        assert errors == [
+            {'row': 2, 'errors': ["Username 'importexisting' already exists"]},
+            {'row': 3, 'errors': ["Email 'importexisting@example.com' already registered"]},
+        ]
+
+    def test_row_limit(self, app, db):
+        """Test validation stops at the row limit"""
+        valid, errors = UserImportService.validate(
+            [(n, columns(f'importlimit{n}')) for n in range(2, 6)], max_rows=2
+        )
+
+        assert len(valid) == 2
+        assert errors == [{'row': 4, 'errors': ['Imports are limited to 2 rows']}]